@@ -1,55 +1,29 @@
 import streamlit as st
-import json
-import folium
-import pandas as pd
-from streamlit_folium import folium_static
-from folium.features import DivIcon
-from api_utils import fetch_clients, fetch_sites, fetch_building, fetch_levels, fetch_GeoJson
-
-@st.cache_data
-def fetch_clients_data(token):
-    return fetch_clients(token)
-
-@st.cache_data
-def fetch_sites_data(client_id, token):
-    return fetch_sites(client_id, token)
-
-@st.cache_data
-def fetch_building_data(site_id, token):
-    return fetch_building(site_id, token)
-
-@st.cache_data
-def fetch_levels_data(building_id, token):
-    return fetch_levels(building_id, token)
-
-@st.cache_data
-def fetch_geojson_data(level_id, token):
-    return fetch_GeoJson(level_id, token)
-
-def extract_beacons_from_geojson(placed_beacons):
-    return [
-        {"uuid": beacon["uuid"].upper(), "major": int(beacon["major"]), "minor": int(beacon["minor"]), "coordinates": beacon["coordinates"]}
-        for beacon in placed_beacons
-    ]
-
-def extract_beacons_from_json(data):
-    return [
-        {"uuid": beacon["uuid"].upper(), "major": int(beacon["major"]), "minor": int(beacon["minor"])}
-        for beacon in data.get("beaconData", [])
-    ]
-
-token = st.session_state.get('token')
+import auth
+from map_utils import build_unheard_map, render_map, MARKER_CLUSTER_THRESHOLD
+from geometry import prepare_level_geometry
+from lookups import name_index
+from prefetch import fetch_clients, fetch_sites, fetch_building, prefetch_site, get_levels, get_geojson, get_geojsons
+from ingest import sync_audit_with_progress
+from recording_reader import RECORDING_FILE_TYPES
+from unheard_audit import index_placed_beacons, RunningAudit, UNHEARD_COLUMNS
+from beacon_stats import WEAK_RSSI_THRESHOLD
+from spatial_index import PlacedBeaconIndex, DEAD_ZONE_LINK_FACTOR, DEAD_ZONE_MIN_BEACONS
+from styles import display_table
+
+ALL_LEVELS = "All levels"
+
+token = auth.current_token()
 if not token:
     st.write("Please log in to access the map view.")
 else:
     if 'clients' not in st.session_state:
         with st.spinner("Loading clients..."):
-            st.session_state.clients = fetch_clients_data(token)
+            st.session_state.clients = fetch_clients(token)
     
     clients = st.session_state.clients
     if clients:
-        client_id_name = {client["name"]: client["_id"] for client in clients}
-        client_names = sorted(client_id_name.keys())
+        client_id_name, client_names = name_index(clients)
 
         col1, col2 = st.columns([2, 2])
         with col1:
@@ -59,12 +33,11 @@ else:
         if 'sites' not in st.session_state or st.session_state.selected_client_id != selected_client_id:
             with st.spinner("Loading sites..."):
                 st.session_state.selected_client_id = selected_client_id
-                st.session_state.sites = fetch_sites_data(selected_client_id, token)
+                st.session_state.sites = fetch_sites(selected_client_id, token)
         
         sites = st.session_state.sites
         if sites:
-            site_id_name = {site["name"]: site["_id"] for site in sites}
-            site_names = sorted(site_id_name.keys())
+            site_id_name, site_names = name_index(sites)
 
             with col2:
                 selected_site_name = st.selectbox("Select Site", site_names, key='client_selectbox_site')
@@ -73,134 +46,162 @@ else:
             if 'buildings' not in st.session_state or st.session_state.selected_site_id != selected_site_id:
                 with st.spinner("Loading buildings..."):
                     st.session_state.selected_site_id = selected_site_id
-                    st.session_state.buildings = fetch_building_data(selected_site_id, token)
+                    st.session_state.buildings = fetch_building(selected_site_id, token)
             
             buildings = st.session_state.buildings
             if buildings:
-                building_id_name = {building["name"]: building["_id"] for building in buildings}
-                building_names = sorted(building_id_name.keys())
+                building_id_name, building_names = name_index(buildings)
 
                 selected_building_name = st.selectbox("Select Building", building_names, key='client_selectbox_building')
                 selected_building_id = building_id_name[selected_building_name]
 
+                # Load every building's levels (and optionally every level map) in the background
+                prefetch_geojson = st.sidebar.checkbox("Prefetch all level maps of the site", key='prefetch_geojson')
+                cluster_threshold = st.sidebar.number_input(
+                    "Cluster markers above this many unheard beacons per level",
+                    min_value=0, value=MARKER_CLUSTER_THRESHOLD, step=50, key='cluster_threshold'
+                )
+                weak_threshold = st.sidebar.number_input(
+                    "Flag heard beacons with a mean RSSI below (dBm)",
+                    max_value=0, value=WEAK_RSSI_THRESHOLD, step=1, key='weak_rssi_threshold'
+                )
+                zone_min_beacons = st.sidebar.number_input(
+                    "Dead zone: at least this many neighbouring unheard beacons",
+                    min_value=2, value=DEAD_ZONE_MIN_BEACONS, step=1, key='dead_zone_min_beacons'
+                )
+                zone_link_factor = st.sidebar.number_input(
+                    "Dead zone: join unheard beacons within this many beacon spacings",
+                    min_value=1.0, max_value=5.0, value=DEAD_ZONE_LINK_FACTOR, step=0.25, key='dead_zone_link_factor'
+                )
+                prefetch_site(buildings, token, first_building_id=selected_building_id, include_geojson=prefetch_geojson)
+
                 if 'levels' not in st.session_state or st.session_state.selected_building_id != selected_building_id:
                     with st.spinner("Loading levels..."):
                         st.session_state.selected_building_id = selected_building_id
-                        st.session_state.levels = fetch_levels_data(selected_building_id, token)
+                        st.session_state.levels = get_levels(selected_building_id, token)
                 
                 levels = st.session_state.levels
                 if levels:
-                    level_display = {f"{level['shortName']} ({level['longName']})": level["_id"] for level in levels}
-                    level_names = sorted(level_display.keys())
+                    level_display, sorted_level_names = name_index(levels, "{shortName} ({longName})")
+                    level_names = [ALL_LEVELS] + sorted_level_names
 
                     col3, col4 = st.columns([2, 2])
                     with col3:
                         selected_level_name = st.selectbox("Select Level", level_names, key='level_selectbox')
-                        selected_level_id = level_display[selected_level_name]
 
-                    if 'geojson' not in st.session_state or st.session_state.selected_level_id != selected_level_id:
-                        with st.spinner("Loading data..."):
-                            st.session_state.selected_level_id = selected_level_id
-                            st.session_state.levelGeoJson = fetch_geojson_data(selected_level_id, token)
-                    
-                    levelGeoJson = st.session_state.levelGeoJson
-                    if levelGeoJson:
-                        placed_beacons = levelGeoJson.get("placedBeacons", [])
-                        geojson_beacons = extract_beacons_from_geojson(placed_beacons)
+                    if selected_level_name == ALL_LEVELS:
+                        selected_level_names = level_names[1:]
+                        all_levels_key = (selected_building_id, tuple(selected_level_names))
+                        if st.session_state.get('all_levels_key') != all_levels_key:
+                            # Download every level of the building concurrently
+                            with st.spinner("Loading all levels..."):
+                                st.session_state.all_level_geojsons = get_geojsons([level_display[name] for name in selected_level_names], token)
+                            # Levels that failed to load are fetched again on the next rerun
+                            st.session_state.all_levels_key = all_levels_key if all(st.session_state.all_level_geojsons) else None
+                        level_geojsons = st.session_state.all_level_geojsons
+                        selected_levels = [
+                            (level_name, level_display[level_name], level_geojson)
+                            for level_name, level_geojson in zip(selected_level_names, level_geojsons)
+                            if level_geojson
+                        ]
+                    else:
+                        selected_level_id = level_display[selected_level_name]
+                        if 'levelGeoJson' not in st.session_state or st.session_state.selected_level_id != selected_level_id:
+                            with st.spinner("Loading data..."):
+                                st.session_state.selected_level_id = selected_level_id
+                                st.session_state.levelGeoJson = get_geojson(selected_level_id, token)
+                        levelGeoJson = st.session_state.levelGeoJson
+                        selected_levels = [(selected_level_name, selected_level_id, levelGeoJson)] if levelGeoJson else []
+
+                    if selected_levels:
+                        # Index the placed beacons of the shown levels once, not per button press; keyed by
+                        # the levels that loaded, so a level fetched again after failing is audited too
+                        placed_index_key = (selected_building_id, tuple(level_id for _, level_id, _ in selected_levels))
+                        if st.session_state.get('map_placed_index_key') != placed_index_key:
+                            st.session_state.map_placed_index = index_placed_beacons(
+                                (level_name, level_geojson.get("placedBeacons", [])) for level_name, _, level_geojson in selected_levels
+                            )
+                            st.session_state.map_placed_index_key = placed_index_key
+                        # Neighbour pairs of the placed beacons, found once per set of levels and spacing factor
+                        spatial_index_key = (placed_index_key, zone_link_factor)
+                        if st.session_state.get('map_spatial_index_key') != spatial_index_key:
+                            st.session_state.map_spatial_index = PlacedBeaconIndex(st.session_state.map_placed_index, zone_link_factor)
+                            st.session_state.map_spatial_index_key = spatial_index_key
 
                         st.markdown("##### Upload Recordings")
-                        uploaded_files = st.file_uploader("Choose Multiple JSON Recordings if you have:", type="json", accept_multiple_files=True)
+                        uploaded_files = st.file_uploader("Choose Multiple Recordings (JSON or converted .opsrec) if you have:", type=RECORDING_FILE_TYPES, accept_multiple_files=True)
+
+                        # The audit keeps its heard set across reruns: once started, adding or removing
+                        # a recording only processes that recording
+                        if 'map_audit' not in st.session_state:
+                            st.session_state.map_audit = RunningAudit()
+                        audit = st.session_state.map_audit
+                        audit.set_placed_index(st.session_state.map_placed_index)
 
                         col5, col6 = st.columns([3, 1])
                         with col5:
                             if st.button("Check for Missing Beacons"):
-                                if uploaded_files:
-                                    uploaded_beacons_set = set(
-                                        (beacon["uuid"], beacon["major"], beacon["minor"])
-                                        for uploaded_file in uploaded_files
-                                        for beacon in extract_beacons_from_json(json.loads(uploaded_file.read()))
-                                    )
-                                    
-                                    missing_beacons = [
-                                        beacon for beacon in geojson_beacons
-                                        if (beacon["uuid"], beacon["major"], beacon["minor"]) not in uploaded_beacons_set
-                                    ]
-                                    
-                                    if missing_beacons:
-                                        updated_placed_beacons = [
-                                            beacon for beacon in geojson_beacons
-                                            if (beacon["uuid"], beacon["major"], beacon["minor"]) not in uploaded_beacons_set
+                                st.session_state.map_audit_started = True
+                        if st.session_state.get('map_audit_started'):
+                            sync_audit_with_progress(audit, uploaded_files or [])
+                            if uploaded_files:
+                                missing_beacons = audit.unheard()
+
+                                if not missing_beacons.empty:
+                                    # Rebuilt only when the unheard set or the shown levels changed
+                                    map_key = (audit.version, spatial_index_key, cluster_threshold, zone_min_beacons)
+                                    if st.session_state.get('unheard_map_key') != map_key:
+                                        # Contiguous groups of unheard beacons, e.g. a gateway or power circuit gone dark
+                                        st.session_state.dead_zones = st.session_state.map_spatial_index.dead_zones(audit.unheard_mask, zone_min_beacons)
+                                        missing_by_level = dict(tuple(missing_beacons.groupby("Level", sort=False)))
+                                        level_results = [
+                                            (
+                                                level_name,
+                                                # Simplified once per level and reused across reruns
+                                                prepare_level_geometry(level_id, level_geojson.get("geoJson", {})),
+                                                missing_by_level.get(level_name, missing_beacons.iloc[:0]),
+                                            )
+                                            for level_name, level_id, level_geojson in selected_levels
                                         ]
-                                        updated_geojson = levelGeoJson.copy()
-                                        updated_geojson["placedBeacons"] = updated_placed_beacons
-
-                                        mapbox_token = "your_mapbox_token_here"
-                                        m = folium.Map(
-                                            location=[0, 0],
-                                            zoom_start=15,
-                                            tiles=f"https://api.mapbox.com/styles/v1/mapbox/streets-v11/tiles/{{z}}/{{x}}/{{y}}?access_token={mapbox_token}",
-                                            attr="Mapbox"
+                                        st.session_state.unheard_map = build_unheard_map(
+                                            level_results, cluster_threshold=cluster_threshold, dead_zones=st.session_state.dead_zones
+                                        )
+                                        st.session_state.unheard_map_csv = missing_beacons[UNHEARD_COLUMNS].to_csv(index=False)
+                                        st.session_state.dead_zones = display_table(st.session_state.dead_zones.drop(columns=["Hull"]))
+                                        st.session_state.unheard_map_key = map_key
+                                    m, bounds = st.session_state.unheard_map
+                                    if not bounds:
+                                        st.error("The fetched GeoJSON data does not contain valid geometries.")
+
+                                    st.write(f"### Unheard Beacons in {selected_level_name}")
+                                    st.caption(f"{len(audit.recording_ids)} recordings, {len(missing_beacons)} placed beacons unheard")
+                                    render_map(m, width=800, height=600)
+
+                                    dead_zones = st.session_state.dead_zones
+                                    if dead_zones.num_rows:
+                                        st.write(f"### Dead Zones ({dead_zones.num_rows})")
+                                        st.dataframe(dead_zones, hide_index=True)
+
+                                    with col6:
+                                        st.download_button(
+                                            label="Download Missing Beacons",
+                                            data=st.session_state.unheard_map_csv,
+                                            file_name="missing_beacons.csv",
+                                            mime="text/csv"
                                         )
-
-                                        geojson_features = updated_geojson.get("geoJson", {})
-                                        if "features" in geojson_features:
-                                            folium.GeoJson(geojson_features).add_to(m)
-
-                                            bounds = []
-                                            for feature in geojson_features["features"]:
-                                                geometry_type = feature["geometry"]["type"]
-                                                coordinates = feature["geometry"]["coordinates"]
-
-                                                if geometry_type == "Point":
-                                                    bounds.append((coordinates[1], coordinates[0]))
-                                                elif geometry_type == "LineString":
-                                                    bounds.extend([(coord[1], coord[0]) for coord in coordinates])
-                                                elif geometry_type == "Polygon":
-                                                    for ring in coordinates:
-                                                        bounds.extend([(coord[1], coord[0]) for coord in ring])
-                                            if bounds:
-                                                m.fit_bounds(bounds)
-                                            else:
-                                                st.error("The fetched GeoJSON data does not contain valid geometries.")
-
-                                        for beacon in updated_geojson["placedBeacons"]:
-                                            folium.Marker(
-                                                location=[beacon["coordinates"][1], beacon["coordinates"][0]],
-                                                icon=folium.DivIcon(
-                                                    html=f"""
-                                                    <div style="
-                                                        background-color: yellow; 
-                                                        border-radius: 50%; 
-                                                        width: 20px; 
-                                                        height: 20px; 
-                                                        border: 2px solid red;
-                                                    "></div>
-                                                    """,
-                                                    icon_size=(10, 10)
-                                                ),
-                                                popup=folium.Popup(
-                                                    f"UUID: {beacon['uuid']}<br>Major: {beacon['major']}<br>Minor: {beacon['minor']}",
-                                                    max_width=300
-                                                )
-                                            ).add_to(m)
-
-                                        st.write(f"### Unheard Beacons in {selected_level_name}")
-                                        folium_static(m, width=800, height=600)
-                                        
-                                        df = pd.DataFrame(missing_beacons)
-                                        csv = df.to_csv(index=False)
-                                        
-                                        with col6:
-                                            st.download_button(
-                                                label="Download Missing Beacons",
-                                                data=csv,
-                                                file_name="missing_beacons.csv",
-                                                mime="text/csv"
-                                            )
-                                    else:
-                                        st.write("No beacons are missing.")
                                 else:
-                                    st.write("Please upload one or more JSON files.")
+                                    st.write("No beacons are missing.")
+
+                                weak_key = (audit.version, weak_threshold)
+                                if st.session_state.get('weak_beacons_key') != weak_key:
+                                    st.session_state.weak_beacons = display_table(audit.weak(weak_threshold).drop(columns=["Key"]))
+                                    st.session_state.weak_beacons_key = weak_key
+                                weak_beacons = st.session_state.weak_beacons
+                                if weak_beacons.num_rows:
+                                    st.write(f"### Heard but Weak (mean RSSI below {weak_threshold} dBm)")
+                                    st.dataframe(weak_beacons, hide_index=True)
+                            else:
+                                st.write("Please upload one or more JSON files.")
                     else:
                         st.write("No GeoJSON data found for the selected level.")
                 else:
@@ -0,0 +1,101 @@
+# api_cache.py
+
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+CACHE_DIR = os.environ.get("OPSTOOLKIT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "opstoolkit"))
+API_CACHE_PATH = os.path.join(CACHE_DIR, "planner_api.sqlite3")
+API_CACHE_MAX_BYTES = int(os.environ.get("OPSTOOLKIT_API_CACHE_MB", "512")) * 1024 * 1024
+
+# Reads only bump the LRU clock this often, to keep lookups from turning into writes
+ACCESS_RESOLUTION = 60
+
+CacheEntry = namedtuple("CacheEntry", ["body", "etag", "last_modified", "expires_at"])
+
+_local = threading.local()
+
+def _connection():
+    """Return this thread's connection to the on-disk cache, creating the schema on first use."""
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        connection = sqlite3.connect(API_CACHE_PATH, timeout=10, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        _local.connection = connection
+    return connection
+
+def is_fresh(entry):
+    return entry is not None and entry.expires_at > time.time()
+
+def get(key):
+    """Return the cached CacheEntry for key, fresh or stale, or None."""
+    try:
+        connection = _connection()
+        row = connection.execute(
+            "SELECT body, etag, last_modified, expires_at, accessed_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[4] > ACCESS_RESOLUTION:
+            connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return CacheEntry(*row[:4])
+    except sqlite3.Error:
+        return None
+
+def put(key, body, ttl, etag=None, last_modified=None):
+    """Store a response body for ttl seconds and evict least recently used entries above the size cap."""
+    now = time.time()
+    try:
+        connection = _connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, body, etag, last_modified, expires_at, accessed_at, size) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, body, etag, last_modified, now + ttl, now, len(body)),
+        )
+        _evict(connection)
+    except sqlite3.Error:
+        pass
+
+def refresh(key, ttl):
+    """Extend a revalidated (304 Not Modified) entry for another ttl seconds."""
+    now = time.time()
+    try:
+        _connection().execute(
+            "UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?", (now + ttl, now, key)
+        )
+    except sqlite3.Error:
+        pass
+
+def clear():
+    try:
+        _connection().execute("DELETE FROM responses")
+    except sqlite3.Error:
+        pass
+
+def _evict(connection):
+    total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= API_CACHE_MAX_BYTES:
+        return
+    victims = []
+    for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+        if total <= API_CACHE_MAX_BYTES:
+            break
+        victims.append((key,))
+        total -= size
+    connection.executemany("DELETE FROM responses WHERE key = ?", victims)
@@ -1,75 +1,179 @@
 # api_utils.py
 
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
 import requests
-import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import api_cache
+import perf
 
-def fetch_clients(token):
-    api_url = "https://planner.pointr.tech/api/clients"
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        #st.write("START client API call")
-        response = requests.get(api_url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.error(f"An error occurred while fetching clients: {str(e)}")
-        return []
+# Overridable so the tool can be pointed at a staging planner or the benchmark stub
+PLANNER_BASE_URL = os.environ.get("OPSTOOLKIT_PLANNER_URL", "https://planner.pointr.tech")
 
-def fetch_sites(client_id, token):
-    api_site_url = f"https://planner.pointr.tech/api/client/{client_id}/sites"
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        #st.write("Start sites API")
-        response = requests.get(api_site_url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.error(f"An error occurred while fetching sites: {str(e)}")
-        return []
+LOGIN_PATH = "/login-api/login"
 
-def fetch_building(site_id, token):
-    api_building_url = f"https://planner.pointr.tech/api/site/{site_id}/buildings"
-    headers = {"Authorization": f"Bearer {token}"}
-    try:
-        #st.write("Start building API")
-        response = requests.get(api_building_url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.error(f"An error occurred while fetching buildings: {str(e)}")
-        return []
+CLIENTS_PATH = "/api/clients"
+SITES_PATH = "/api/client/{client_id}/sites"
+BUILDINGS_PATH = "/api/site/{site_id}/buildings"
+LEVELS_PATH = "/api/building/{building_id}/levels"
+GEOJSON_PATH = "/api/level/{level_id}/geoJson"
+BEACON_TYPES_PATH = "/api/site/{site_id}/beacon-types"
 
-def fetch_levels(building_id, token):
-    api_level_url = f"https://planner.pointr.tech/api/building/{building_id}/levels"
-    headers = {"Authorization": f"Bearer {token}"}
+# Cache lifetimes in seconds per endpoint; levels carry placedBeacons, which ops edit most often
+DEFAULT_CACHE_TTL = 15 * 60
+CACHE_TTLS = {
+    CLIENTS_PATH: 12 * 3600,
+    SITES_PATH: 6 * 3600,
+    BUILDINGS_PATH: 6 * 3600,
+    LEVELS_PATH: 15 * 60,
+    GEOJSON_PATH: 60 * 60,
+    BEACON_TYPES_PATH: 12 * 3600,
+}
+_ENDPOINT_PATTERNS = [
+    (re.compile("^" + re.sub(r"\\\{\w+\\\}", "[^/]+", re.escape(template)) + "$"), template, ttl)
+    for template, ttl in CACHE_TTLS.items()
+]
+
+# (connect, read) timeouts in seconds; level GeoJSON can be several MB
+DEFAULT_TIMEOUT = (5, 30)
+GEOJSON_TIMEOUT = (5, 120)
+
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_MAXSIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+_token_users = {}
+
+class PlannerAuthError(Exception):
+    """The planner rejected the token (expired or revoked)."""
+
+def token_claims(token):
+    """Return the payload claims of a JWT without verifying it, or {} for opaque tokens."""
     try:
-        #st.write("Start level API")
-        response = requests.get(api_level_url, headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.error(f"An error occurred while fetching levels: {str(e)}")
-        return []
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return claims if isinstance(claims, dict) else {}
+    except (AttributeError, IndexError, ValueError):
+        return {}
+
+def register_token(token, user):
+    """Remember which user a token belongs to, so cached responses follow the user across logins."""
+    with _session_lock:
+        _token_users[token] = user
+
+def cache_scope(token):
+    """Return the cache namespace of a token: its user, never the token itself.
+
+    Responses stay cached across re-logins of the same user but are never shared
+    between users. Tokens of unknown owner get a namespace of their own.
+    """
+    with _session_lock:
+        user = _token_users.get(token)
+    if user is None:
+        claims = token_claims(token)
+        user = claims.get("email") or claims.get("sub") or claims.get("userId")
+    if user is None:
+        return "token:" + hashlib.blake2b(str(token).encode(), digest_size=8).hexdigest()
+    return f"user:{str(user).lower()}"
+
+def get_session():
+    """Return the process-wide planner session with keep-alive pooling and bounded retries."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=RETRY_TOTAL,
+                backoff_factor=RETRY_BACKOFF_FACTOR,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset({"GET"}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+            _session = session
+    return _session
+
+def cache_ttl(path):
+    """Return the cache lifetime in seconds for a planner API path."""
+    for pattern, _, ttl in _ENDPOINT_PATTERNS:
+        if pattern.match(path):
+            return ttl
+    return DEFAULT_CACHE_TTL
+
+def endpoint(path):
+    """Return the path template a planner API path belongs to, or the path itself."""
+    for pattern, template, _ in _ENDPOINT_PATTERNS:
+        if pattern.match(path):
+            return template
+    return path
 
+def planner_get(path, token, timeout=DEFAULT_TIMEOUT):
+    """GET a planner API path through the shared session and return the decoded JSON.
+
+    Responses are cached on disk by user and URL (see cache_scope; the token is not
+    part of the key) for the endpoint's TTL and revalidated with ETag /
+    If-Modified-Since once they expire. A rejected token raises PlannerAuthError.
+    Every call is timed
+    as an "api GET <endpoint>" stage with its payload size and cache outcome.
+    """
+    return planner_get_sized(path, token, timeout)[0]
+
+def planner_get_sized(path, token, timeout=DEFAULT_TIMEOUT):
+    """planner_get returning (data, size of the response body in bytes), for callers that budget memory."""
+    with perf.timed(f"api GET {endpoint(path)}", label=path) as span:
+        data = _planner_get(path, token, timeout, span)
+        return data, span.bytes
+
+def _planner_get(path, token, timeout, span):
+    url = f"{PLANNER_BASE_URL}{path}"
+    key = f"{cache_scope(token)} {url}"
+    entry = api_cache.get(key)
+    if api_cache.is_fresh(entry):
+        span.cache, span.bytes = "hit", len(entry.body)
+        return json.loads(entry.body)
 
-def fetch_GeoJson(levelId,token): 
-    api_geoJson_url=f"https://planner.pointr.tech/api/level/{levelId}/geoJson"
     headers = {"Authorization": f"Bearer {token}"}
-    try:
-        response= requests.get(api_geoJson_url,headers=headers)
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        st.error(f"An error occured: {str(e)}")
-        return[]
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
 
-def fetch_beaconsType(site_id,token):
-    api_fetchBeaconType_url=f"https://planner.pointr.tech/api/site/{site_id}/beacon-types"
-    headers= {"Authorization": f"Bearer {token}"}
-    try:
-        response=requests.get(api_fetchBeaconType_url,headers=headers)
+    response = get_session().get(url, headers=headers, timeout=timeout)
+    if response.status_code == 304 and entry is not None:
+        api_cache.refresh(key, cache_ttl(path))
+        span.cache, span.bytes = "revalidated", len(entry.body)
+        return json.loads(entry.body)
+    if response.status_code == 401:
+        raise PlannerAuthError("the planner rejected the session token")
+    response.raise_for_status()
+    span.cache, span.bytes = "miss", len(response.content)
+    data = response.json()
+    api_cache.put(
+        key,
+        response.content,
+        cache_ttl(path),
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+    return data
+
+def planner_post(path, payload, timeout=DEFAULT_TIMEOUT):
+    """POST a JSON payload to a planner API path through the shared session."""
+    with perf.timed(f"api POST {endpoint(path)}", label=path) as span:
+        response = get_session().post(f"{PLANNER_BASE_URL}{path}", json=payload, timeout=timeout)
         response.raise_for_status()
+        span.bytes = len(response.content)
         return response.json()
-    except Exception as e:
-        st.error(f"An error occured: {str(e)}")
-        return []
\ No newline at end of file
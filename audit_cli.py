@@ -0,0 +1,230 @@
+# audit_cli.py
+
+"""Headless unheard audit of every level of a client or site.
+
+    python audit_cli.py --client "Client name" [--site "Site name"] RECORDINGS_DIR -o report.csv
+    python audit_cli.py --client "Client name" --before BEFORE_DIR AFTER_DIR -o comparison.csv
+
+The planner token is read from OPSTOOLKIT_TOKEN, or obtained by logging in with
+--email and the OPSTOOLKIT_PASSWORD environment variable. The report format follows
+the output extension: .csv or .parquet (Parquet needs pyarrow).
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pandas as pd
+from api_utils import (
+    planner_get,
+    planner_post,
+    LOGIN_PATH,
+    CLIENTS_PATH,
+    SITES_PATH,
+    BUILDINGS_PATH,
+    LEVELS_PATH,
+    POOL_MAXSIZE,
+    register_token,
+)
+from ingest import ingest_recordings
+from columnar_recording import COLUMNAR_EXTENSION
+from unheard_audit import (
+    index_placed_beacons,
+    compare_heard,
+    BEACON_KEY_COLUMNS,
+    NEWLY_UNHEARD,
+    STILL_UNHEARD,
+    NEWLY_HEARD,
+    STILL_HEARD,
+)
+from beacon_index import contains
+from beacon_stats import WEAK_RSSI_THRESHOLD
+
+RECORDING_PATTERNS = ("*.json", f"*.{COLUMNAR_EXTENSION}")
+SCOPE_COLUMNS = ["Client", "Site", "Building", "Level"]
+REPORT_COLUMNS = SCOPE_COLUMNS + BEACON_KEY_COLUMNS + ["Status", "Readings", "Mean RSSI", "Last Seen", "Coordinates"]
+COMPARISON_REPORT_COLUMNS = SCOPE_COLUMNS + BEACON_KEY_COLUMNS + ["Status", "Coordinates"]
+
+UNHEARD = "unheard"
+WEAK = "weak"
+HEARD = "heard"
+
+class AuditError(Exception):
+    """An audit that cannot run, reported on stderr with exit status 1."""
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def get_token(email=None):
+    """Return the planner token from OPSTOOLKIT_TOKEN, or log in with email and OPSTOOLKIT_PASSWORD."""
+    token = os.environ.get("OPSTOOLKIT_TOKEN")
+    if token:
+        return token
+    password = os.environ.get("OPSTOOLKIT_PASSWORD")
+    if not email or not password:
+        raise AuditError("set OPSTOOLKIT_TOKEN, or pass --email and set OPSTOOLKIT_PASSWORD")
+    token = planner_post(LOGIN_PATH, {"email": email, "password": password}).get("token")
+    if not token:
+        raise AuditError("login failed, check the email and password")
+    # Nightly runs log in afresh; keep hitting the same user's cached responses
+    register_token(token, email)
+    return token
+
+def _select(items, wanted, what):
+    """Return the items whose _id or name (case-insensitive) is wanted; every item if wanted is None."""
+    if wanted is None:
+        return items
+    selected = [item for item in items if item["_id"] == wanted or item["name"].casefold() == wanted.casefold()]
+    if not selected:
+        raise AuditError(f"no {what} named or with id '{wanted}'")
+    return selected
+
+def fetch_scope(token, client, site=None, max_workers=POOL_MAXSIZE):
+    """Fetch every level of every building under a client, or one of its sites, concurrently.
+
+    Returns a list of (client_name, site_name, building_name, levels) per building.
+    """
+    clients = _select(planner_get(CLIENTS_PATH, token), client, "client")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="audit-fetch") as executor:
+        site_lists = executor.map(lambda c: planner_get(SITES_PATH.format(client_id=c["_id"]), token), clients)
+        sites = [
+            (client_item["name"], site_item)
+            for client_item, client_sites in zip(clients, site_lists)
+            for site_item in _select(client_sites, site, "site")
+        ]
+        building_lists = executor.map(lambda s: planner_get(BUILDINGS_PATH.format(site_id=s[1]["_id"]), token), sites)
+        buildings = [
+            (client_name, site_item["name"], building)
+            for (client_name, site_item), site_buildings in zip(sites, building_lists)
+            for building in site_buildings
+        ]
+        level_lists = executor.map(lambda b: planner_get(LEVELS_PATH.format(building_id=b[2]["_id"]), token), buildings)
+        return [
+            (client_name, site_name, building["name"], levels or [])
+            for (client_name, site_name, building), levels in zip(buildings, level_lists)
+        ]
+
+def index_scope(scope):
+    """Index the placed beacons of every level in scope into one table with SCOPE_COLUMNS."""
+    frames = []
+    for client_name, site_name, building_name, levels in scope:
+        placed_index = index_placed_beacons((level["shortName"], level.get("placedBeacons", [])) for level in levels)
+        frames.append(placed_index.assign(Client=client_name, Site=site_name, Building=building_name))
+    return pd.concat(frames, ignore_index=True) if frames else index_placed_beacons([]).assign(Client=None, Site=None, Building=None)
+
+def audit(placed_index, heard_keys, signal_stats, weak_threshold=WEAK_RSSI_THRESHOLD, include_heard=False):
+    """Classify every placed beacon as unheard, weak or heard and return the report table."""
+    report = placed_index.merge(
+        signal_stats[["Key", "Readings", "Mean RSSI", "Last Seen"]], on="Key", how="left"
+    )
+    heard = contains(heard_keys, report["Key"].to_numpy())
+    report["Status"] = HEARD
+    report.loc[~heard, "Status"] = UNHEARD
+    report.loc[heard & (report["Mean RSSI"] < weak_threshold).to_numpy(), "Status"] = WEAK
+    report["Readings"] = report["Readings"].fillna(0).astype("int64")
+    report["Coordinates"] = report["Coordinates"].astype(str)
+    if not include_heard:
+        report = report[report["Status"] != HEARD]
+    return report.sort_values(SCOPE_COLUMNS + ["Status", "UUID", "Major", "Minor"], ignore_index=True)[REPORT_COLUMNS]
+
+def comparison_report(placed_index, before_keys, after_keys, include_heard=False):
+    """Classify every placed beacon as newly unheard, still unheard, newly heard or still heard and return the report table."""
+    report = compare_heard(placed_index, before_keys, after_keys)
+    report["Coordinates"] = report["Coordinates"].astype(str)
+    if not include_heard:
+        report = report[report["Status"] != STILL_HEARD]
+    report = report.sort_values(SCOPE_COLUMNS + ["Status", "UUID", "Major", "Minor"], ignore_index=True)[COMPARISON_REPORT_COLUMNS]
+    report["Status"] = report["Status"].astype(str)
+    return report
+
+def write_report(report, output):
+    """Write the report as CSV or Parquet, chosen by the output's extension."""
+    output = Path(output)
+    if output.suffix.lower() == ".parquet":
+        try:
+            report.to_parquet(output, index=False)
+        except ImportError as e:
+            raise AuditError(f"writing Parquet needs pyarrow: {e}")
+    else:
+        report.to_csv(output, index=False)
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description="Audit every level of a client or site for unheard and weak beacons.")
+    parser.add_argument("recordings", type=Path, help="directory searched recursively for JSON or .opsrec recordings")
+    parser.add_argument("--before", type=Path, help="directory of earlier recordings, e.g. from before a maintenance visit; "
+                        "the report then compares them with RECORDINGS")
+    parser.add_argument("--client", required=True, help="client name or id")
+    parser.add_argument("--site", help="limit the audit to one site (name or id)")
+    parser.add_argument("--email", help="planner login email when OPSTOOLKIT_TOKEN is not set")
+    parser.add_argument("-o", "--output", default="unheard_report.csv", help="report path, .csv or .parquet")
+    parser.add_argument("--weak-threshold", type=float, default=WEAK_RSSI_THRESHOLD, help="mean RSSI (dBm) below which a heard beacon is weak")
+    parser.add_argument("--include-heard", action="store_true", help="also report beacons that were heard normally")
+    parser.add_argument("--fail-on-unheard", action="store_true", help="exit with status 2 when any beacon is unheard (newly unheard with --before)")
+    return parser.parse_args(argv)
+
+def _find_recordings(directory):
+    recordings = sorted(path for pattern in RECORDING_PATTERNS for path in directory.rglob(pattern))
+    if not recordings:
+        raise AuditError(f"no recordings found under {directory}")
+    return recordings
+
+def main(argv=None):
+    args = _parse_args(argv)
+    started = time.perf_counter()
+    try:
+        recordings = _find_recordings(args.recordings)
+        before_recordings = _find_recordings(args.before) if args.before else []
+        token = get_token(args.email)
+
+        # Recordings are parsed by worker processes while the planner is queried here
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-scope") as executor:
+            scope_future = executor.submit(fetch_scope, token, args.client, args.site)
+
+            def report_progress(done, total, name, error):
+                if error is not None:
+                    _log(f"Skipped {name}: {error.splitlines()[0]}")
+                elif done == total or done % 50 == 0:
+                    _log(f"Parsed {done}/{total} recordings")
+
+            heard_keys, signal_stats, errors = ingest_recordings(recordings, on_progress=report_progress)
+            if before_recordings:
+                before_keys, _, before_errors = ingest_recordings(before_recordings, on_progress=report_progress)
+            scope = scope_future.result()
+
+        placed_index = index_scope(scope)
+        if before_recordings:
+            report = comparison_report(placed_index, before_keys, heard_keys, args.include_heard)
+        else:
+            report = audit(placed_index, heard_keys, signal_stats, args.weak_threshold, args.include_heard)
+        write_report(report, args.output)
+    except AuditError as e:
+        _log(f"error: {e}")
+        return 1
+    except Exception as e:
+        _log(f"error: {type(e).__name__}: {e}")
+        return 1
+
+    counts = report["Status"].value_counts()
+    if before_recordings:
+        _log(
+            f"Compared {len(placed_index)} placed beacons of {len(scope)} buildings between "
+            f"{len(before_recordings) - len(before_errors)} recordings before and {len(recordings) - len(errors)} after in "
+            f"{time.perf_counter() - started:.1f}s: {counts.get(NEWLY_UNHEARD, 0)} newly unheard, "
+            f"{counts.get(STILL_UNHEARD, 0)} still unheard, {counts.get(NEWLY_HEARD, 0)} newly heard. "
+            f"Report written to {args.output}"
+        )
+        return 2 if args.fail_on_unheard and counts.get(NEWLY_UNHEARD, 0) else 0
+    _log(
+        f"Audited {len(placed_index)} placed beacons on {sum(len(levels) for *_, levels in scope)} levels "
+        f"of {len(scope)} buildings against {len(recordings) - len(errors)} recordings in "
+        f"{time.perf_counter() - started:.1f}s: {counts.get(UNHEARD, 0)} unheard, {counts.get(WEAK, 0)} weak. "
+        f"Report written to {args.output}"
+    )
+    if args.fail_on_unheard and counts.get(UNHEARD, 0):
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
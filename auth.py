@@ -0,0 +1,96 @@
+# auth.py
+
+from datetime import datetime, timedelta
+import requests
+import streamlit as st
+import api_utils
+
+# Used when the planner token carries no expiry claim
+TOKEN_LIFETIME = timedelta(hours=1)
+# Offer to renew the session this long before the token lapses
+RENEW_MARGIN = timedelta(minutes=10)
+ROLE = "Pointr"
+SESSION_POLL_SECONDS = 30
+
+def login(email, password):
+    """Log in to the planner and return the session token, or None if the credentials are rejected."""
+    try:
+        data = api_utils.planner_post(api_utils.LOGIN_PATH, {"email": email, "password": password})
+        return data.get("token")
+    except requests.RequestException:
+        return None
+
+def token_expiry(token):
+    """Return when a token lapses: its JWT exp claim, or TOKEN_LIFETIME from now."""
+    expires = api_utils.token_claims(token).get("exp")
+    if isinstance(expires, (int, float)):
+        return datetime.fromtimestamp(expires)
+    return datetime.now() + TOKEN_LIFETIME
+
+def start_session(email, token):
+    """Store a fresh token in the session and tie the planner cache to the user, not the token."""
+    api_utils.register_token(token, email)
+    st.session_state.token = token
+    st.session_state.token_expiry = token_expiry(token)
+    st.session_state.user_email = email
+    st.session_state.role = ROLE
+    st.session_state.pop("auth_message", None)
+
+def end_session(message=None):
+    """Forget the token; message is shown on the login page."""
+    st.session_state.pop("token", None)
+    st.session_state.token_expiry = None
+    st.session_state.role = None
+    if message:
+        st.session_state.auth_message = message
+
+def expire_session():
+    """End a session whose token the planner rejected and go back to the login page."""
+    end_session("Your session has expired. Please log in again.")
+    st.rerun()
+
+def time_left():
+    expiry = st.session_state.get("token_expiry")
+    if not isinstance(expiry, datetime):
+        return timedelta(0)
+    return expiry - datetime.now()
+
+def current_token():
+    """Return the session token while it is valid; an expired session is ended instead."""
+    token = st.session_state.get("token")
+    if token and time_left() <= timedelta(0):
+        end_session("Your session has expired. Please log in again.")
+        return None
+    return token
+
+def render_session_status():
+    """Sidebar prompt to renew the session shortly before the token lapses."""
+    remaining = time_left()
+    if not st.session_state.get("token") or remaining > RENEW_MARGIN:
+        return
+    with st.sidebar.form("renew_session"):
+        st.warning(f"Your session expires in {max(1, int(remaining.total_seconds() // 60))} min.")
+        password = st.text_input("Password", type="password")
+        if st.form_submit_button("Stay signed in"):
+            email = st.session_state.get("user_email")
+            token = login(email, password) if email and password else None
+            if token:
+                start_session(email, token)
+                st.rerun()
+            else:
+                st.error("Could not renew the session. Check your password.")
+
+def _session_phase():
+    remaining = time_left()
+    if remaining <= timedelta(0):
+        return "expired"
+    return "renew" if remaining <= RENEW_MARGIN else "active"
+
+@st.fragment(run_every=SESSION_POLL_SECONDS)
+def watch_session():
+    """Rerun the app when the session enters the renewal window or lapses, even while idle."""
+    phase = _session_phase()
+    if st.session_state.get("session_phase", phase) != phase:
+        st.session_state.session_phase = phase
+        st.rerun()
+    st.session_state.session_phase = phase
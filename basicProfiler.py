@@ -1,27 +1,172 @@
+import math
+from datetime import datetime, timedelta, timezone
+import numpy as np
 import streamlit as st
 import pandas as pd
+from recording_reader import iter_records
+import recording_cache
 from utils import (
     upload_file, 
-    group_and_sort_beacon_data, 
+    BEACON_ID_COLUMNS,
+    build_beacon_table, 
+    warn_invalid_readings, 
     create_csv_download_link, 
-    format_timestamp, 
-    get_location_from_coordinates
+    format_timestamp
 )
+from geocoding import lookup_location
+from beacon_stats import extract_signal_stats, signal_stats_table, strongest_readings, WEAK_RSSI_THRESHOLD
+from ingest import SIGNAL_STATS_KIND
+from timeseries import build_streams, GPS_STREAM, SENSOR_STREAM, DOWNSAMPLE_METHODS, DEFAULT_CHART_POINTS
+from geometry import simplify_track, DEFAULT_TRACK_ZOOM
+from map_utils import build_track_map, render_map
+from styles import display_table
+
+GEOCODE_POLL_SECONDS = 1
+DOWNSAMPLE_LABELS = {"lttb": "Shape (LTTB)", "minmax": "Extremes (min/max)"}
+# Position channels are drawn as a track rather than over time by default
+COORDINATE_CHANNELS = ("latitude", "longitude")
+# One line per channel of a timeseries.downsample table, with pan and zoom; a fixed
+# spec spares building and validating an Altair chart on every rerun as st.line_chart does
+STREAM_CHART_SPEC = {
+    "mark": {"type": "line", "tooltip": True},
+    "encoding": {
+        "x": {"field": "Time", "type": "temporal", "axis": {"grid": False}},
+        "y": {"field": "Value", "type": "quantitative"},
+        "color": {"field": "Channel", "type": "nominal"},
+    },
+    "params": [{"name": "zoom", "select": {"type": "interval", "encodings": ["x", "y"]}, "bind": "scales"}],
+}
+
+@st.fragment(run_every=GEOCODE_POLL_SECONDS)
+def wait_for_location(latitude, longitude):
+    """Poll the background reverse geocode and rerun the page once the location is known."""
+    if lookup_location(latitude, longitude) is not None:
+        st.rerun()
+
+def recording_streams(uploaded_file, section, name):
+    """Time-indexed streams of one record section, built once per recording content."""
+    return recording_cache.cached(uploaded_file, ("streams", section), lambda file: build_streams(file, section, name))
+
+def _heard_positions(file, gps):
+    """Strongest reading of every heard beacon, placed on the GPS track at the time it was taken."""
+    heard = strongest_readings(file)
+    latitudes = gps.interpolate(heard["Timestamp"], "latitude")
+    longitudes = gps.interpolate(heard["Timestamp"], "longitude")
+    located = np.isfinite(latitudes) & np.isfinite(longitudes)
+    heard = heard[located].reset_index(drop=True)
+    heard["Coordinates"] = np.column_stack([longitudes[located], latitudes[located]]).tolist()
+    return heard
+
+def gps_track_map(uploaded_file):
+    """Map of the recorded path, simplified once per recording, with each heard beacon where it was heard best."""
+    gps = recording_streams(uploaded_file, "gpsData", GPS_STREAM).get(GPS_STREAM)
+    if gps is None or not {"latitude", "longitude"} <= gps.channels.keys():
+        st.info("The recording has no timestamped GPS positions.")
+        return
+    track = recording_cache.cached(
+        uploaded_file,
+        ("gps_track", DEFAULT_TRACK_ZOOM),
+        lambda file: simplify_track(gps.channels["latitude"], gps.channels["longitude"]),
+    )
+    heard = recording_cache.cached(uploaded_file, "heard_positions", lambda file: _heard_positions(file, gps))
+
+    # The folium map is built once per upload and reused by reruns
+    if st.session_state.get('track_map_file_id') != uploaded_file.file_id:
+        st.session_state.track_map = build_track_map(track, heard)
+        st.session_state.track_map_file_id = uploaded_file.file_id
+    m, bounds = st.session_state.track_map
+    if not bounds:
+        st.info("The recording has no GPS positions to draw.")
+        return
+    st.caption(f"{len(track):,} of {len(gps):,} GPS points drawn after simplification; {len(heard):,} heard beacons placed where they were heard best")
+    render_map(m, width=800, height=600)
+
+def beacon_value_tables(df):
+    """Markdown of the minors of every major, per UUID, of a utils.build_beacon_table table.
+
+    The tables of a UUID are joined into one markdown element per expander.
+    """
+    return [
+        (uuid, "".join(
+            f"""
+                            **Major: {major}**
+                            | Minors |
+                            |--------|
+                            | {minor_str} |
+                        """
+            for major, minor_str in zip(majors["Major"], majors["Minors"])
+        ))
+        for uuid, majors in df.groupby("UUID", sort=False)
+    ]
+
+def _utc(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).replace(tzinfo=None)
+
+@st.fragment
+def stream_charts(uploaded_file):
+    """Charts of the GPS and sensor streams; only the selected window is downsampled and sent to the browser."""
+    streams = recording_streams(uploaded_file, "gpsData", GPS_STREAM) | recording_streams(uploaded_file, "sensorData", SENSOR_STREAM)
+    streams = {name: stream for name, stream in streams.items() if len(stream) and stream.channels}
+    if not streams:
+        st.info("The recording has no timestamped GPS or sensor data.")
+        return
+
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        stream_name = st.selectbox("Stream", list(streams), key='stream_name')
+    with col2:
+        method = st.selectbox("Downsampling", DOWNSAMPLE_METHODS, format_func=DOWNSAMPLE_LABELS.get, key='stream_method')
+    with col3:
+        points = st.number_input("Points per channel", min_value=100, max_value=10000, value=DEFAULT_CHART_POINTS, step=100, key='stream_points')
+    stream = streams[stream_name]
+
+    channel_names = list(stream.channels)
+    channels = st.multiselect(
+        "Channels", channel_names,
+        default=[name for name in channel_names if name not in COORDINATE_CHANNELS] or channel_names,
+        key=f"stream_channels_{stream_name}",
+    )
+    start, end = math.floor(stream.start), math.ceil(stream.end)
+    if end > start:
+        window_start, window_end = st.slider(
+            "Time window (UTC)", min_value=_utc(start), max_value=_utc(end), value=(_utc(start), _utc(end)),
+            step=timedelta(seconds=1), format="HH:mm:ss", key=f"stream_window_{uploaded_file.file_id}_{stream_name}",
+        )
+        start = window_start.replace(tzinfo=timezone.utc).timestamp()
+        end = window_end.replace(tzinfo=timezone.utc).timestamp()
+    if not channels:
+        st.info("Select one or more channels.")
+        return
+
+    # Downsampled once per view; reruns that keep the view send the kept table as is
+    chart_key = (uploaded_file.file_id, stream_name, start, end, points, tuple(channels), method)
+    if st.session_state.get('stream_chart_key') != chart_key:
+        chart = stream.downsample(start, end, points, channels, method)
+        window = stream.window(start, end)
+        st.session_state.stream_chart = (
+            display_table(chart),
+            f"{len(chart):,} of {(window.stop - window.start) * len(channels):,} samples drawn",
+        )
+        st.session_state.stream_chart_key = chart_key
+    chart, caption = st.session_state.stream_chart
+    st.caption(caption)
+    st.vega_lite_chart(chart, STREAM_CHART_SPEC)
  
 st.markdown("#### Basic Beacon Data Viewer") 
 # Inject custom CSS
 #st.markdown(get_styles(), unsafe_allow_html=True)
 
-# File uploader widget
-data = upload_file()  # Call the function to handle file upload
+# File uploader widget; only the header sections and the first GPS point are built,
+# the record arrays are counted while streaming
+uploaded_file, data, counts = upload_file(heads={"gpsData": 1})
 
-if data:
+if uploaded_file is not None:
     try:
         # Extract and process optional notes
         optional_notes = data.get("optionalNotes", "No notes provided") 
         # Extract and process recording info
         recording_info = data.get("recordingInfo", {})
-        gps_data = data.get("gpsData", [])
+        gps_data = data.get("gpsData") or []
         has_gps_data = len(gps_data) > 0
 
         # Get the first GPS location if available
@@ -30,48 +175,58 @@ if data:
             first_gps_point = gps_data[0]
             latitude = first_gps_point['latitude']
             longitude = first_gps_point['longitude']
-            gps_location = get_location_from_coordinates(latitude, longitude)
-
-        # Recording Information DataFrame
-        recording_info_df = pd.DataFrame({
-            "Item": [
-                "Start Time",
-                "End Time",
-                "Duration", 
-                "Device Model",
-                "GPS Location",     # Added GPS Location here
-                "OS",
-                "Manufacturer",
-                "OS Version",
-                "Recorder Version",
-                "Added UUIDs",
-                "Optional Notes" # Added Optional Notes here  
-            ],
-            "Value": [
-                format_timestamp(recording_info.get("recordingStartTime", 0)),
-                format_timestamp(recording_info.get("recordingEndTime", 0)),
-                f"{recording_info.get('recordingDuration', 0):.2f} seconds", 
-                recording_info.get('deviceModel', 'N/A'),
-                gps_location,  # Display the first GPS location
-                recording_info.get('os', 'N/A'),
-                recording_info.get('manufacturer', 'N/A'),
-                recording_info.get('osVersion', 'N/A'),
-                recording_info.get('recorderAppVersion', 'N/A'),
-                ', '.join(recording_info.get('uuids', [])),
-                optional_notes 
-            ]
-        })
+            # Resolved in the background so the page renders at once
+            gps_location = lookup_location(latitude, longitude)
+            if gps_location is None:
+                gps_location = "Resolving location..."
+                wait_for_location(latitude, longitude)
 
         # Extract data counts
-        sensor_data_count = len(data.get("sensorData", []))
-        gps_data_count = len(data.get("gpsData", []))
-        beacon_data_count = len(data.get("beaconData", []))  # Total beacon data readings
+        sensor_data_count = counts.get("sensorData") or 0
+        gps_data_count = counts.get("gpsData") or 0
+        beacon_data_count = counts.get("beaconData") or 0  # Total beacon data readings
 
-        # Data Counts DataFrame
-        data_counts_df = pd.DataFrame({
-            "Data Type": ["Sensor Data", "GPS Data", "Beacon Data"],
-            "Count": [sensor_data_count, gps_data_count, beacon_data_count]
-        })
+        # The summary tables change only with the recording or its resolved location
+        summary_key = (uploaded_file.file_id, gps_location)
+        if st.session_state.get('summary_tables_key') != summary_key:
+            # Recording Information DataFrame
+            recording_info_df = pd.DataFrame({
+                "Item": [
+                    "Start Time",
+                    "End Time",
+                    "Duration", 
+                    "Device Model",
+                    "GPS Location",     # Added GPS Location here
+                    "OS",
+                    "Manufacturer",
+                    "OS Version",
+                    "Recorder Version",
+                    "Added UUIDs",
+                    "Optional Notes" # Added Optional Notes here  
+                ],
+                "Value": [
+                    format_timestamp(recording_info.get("recordingStartTime", 0)),
+                    format_timestamp(recording_info.get("recordingEndTime", 0)),
+                    f"{recording_info.get('recordingDuration', 0):.2f} seconds", 
+                    recording_info.get('deviceModel', 'N/A'),
+                    gps_location,  # Display the first GPS location
+                    recording_info.get('os', 'N/A'),
+                    recording_info.get('manufacturer', 'N/A'),
+                    recording_info.get('osVersion', 'N/A'),
+                    recording_info.get('recorderAppVersion', 'N/A'),
+                    ', '.join(recording_info.get('uuids', [])),
+                    optional_notes 
+                ]
+            })
+
+            # Data Counts DataFrame
+            data_counts_df = pd.DataFrame({
+                "Data Type": ["Sensor Data", "GPS Data", "Beacon Data"],
+                "Count": [sensor_data_count, gps_data_count, beacon_data_count]
+            })
+            st.session_state.summary_tables = (display_table(recording_info_df), display_table(data_counts_df))
+            st.session_state.summary_tables_key = summary_key
+        recording_info_df, data_counts_df = st.session_state.summary_tables
 
         col1, col2 = st.columns([2, 1])
 
@@ -85,43 +240,55 @@ if data:
             st.write("### Data Counts")
             st.dataframe(data_counts_df, use_container_width=True, hide_index=True)
 
-        # Extract and process beacon data
-        beacon_data = data.get("beaconData", [])
+        if gps_data_count and st.toggle("Show GPS track", key='show_gps_track'):
+            st.markdown("### GPS Track")
+            gps_track_map(uploaded_file)
 
-        if not isinstance(beacon_data, list):
+        # Building the time index streams every sample once, so it is only done on request
+        if (sensor_data_count or gps_data_count) and st.toggle("Show sensor and GPS streams", key='show_streams'):
+            st.markdown("### Sensor and GPS Streams")
+            stream_charts(uploaded_file)
+
+        # Extract and process beacon data
+        if "beaconData" in counts and counts["beaconData"] is None:
             st.error("'beaconData' should be a list.")
         else:
-            # Organize and sort beacon data
-            grouped_beacon_data = group_and_sort_beacon_data(beacon_data)
-
-            # Prepare data for DataFrame
-            rows = []
-            for uuid, majors in grouped_beacon_data.items():
-                for major, minors in majors.items():
-                    minor_list = sorted(minors)
-                    minor_str = ", ".join(map(str, minor_list))
-                    rows.append([uuid, major, minor_str])
-
-            # Create DataFrame
-            df = pd.DataFrame(rows, columns=["UUID", "Major", "Minors"])
+            # Organize and sort beacon data, streaming the readings chunk by chunk. The
+            # grouped table is built once per recording content, kept across reruns, and
+            # reused by the expanders and the CSV export.
+            df, invalid_count = recording_cache.cached(
+                uploaded_file,
+                "beacon_table",
+                lambda file: build_beacon_table(iter_records(file, "beaconData", columns=BEACON_ID_COLUMNS)),
+            )
+            warn_invalid_readings(invalid_count)
 
             # Create and display data in an accordion format
             st.markdown("### Captured Beacon Values")
 
-            for uuid, majors in grouped_beacon_data.items():
+            for uuid, major_tables in recording_cache.cached(uploaded_file, "beacon_value_tables", lambda file: beacon_value_tables(df)):
                 with st.expander(f"UUID: {uuid}"):
-                    for major, minors in majors.items():
-                        minor_list = sorted(minors)
-                        minor_str = ", ".join(map(str, minor_list))
-                        st.markdown(f"""
-                            **Major: {major}**
-                            | Minors |
-                            |--------|
-                            | {minor_str} |
-                        """)
+                    st.markdown(major_tables)
+
+            # Per-beacon signal statistics; shared with the unheard pages through the recording cache
+            signal_stats = recording_cache.cached(
+                uploaded_file,
+                "signal_stats_table",
+                lambda file: signal_stats_table(*recording_cache.cached(file, SIGNAL_STATS_KIND, extract_signal_stats)),
+            )
+            if not signal_stats.empty:
+                st.markdown("### Signal Statistics")
+                weak_count = int((signal_stats["Mean RSSI"] < WEAK_RSSI_THRESHOLD).sum())
+                if weak_count:
+                    st.warning(f"{weak_count} beacons have a mean RSSI below {WEAK_RSSI_THRESHOLD} dBm.")
+                # Converted for display once per recording content rather than on every rerun
+                signal_stats_display = recording_cache.cached(
+                    uploaded_file, "signal_stats_display", lambda file: display_table(signal_stats.drop(columns=["Key"]))
+                )
+                st.dataframe(signal_stats_display, use_container_width=True, hide_index=True)
 
-            # Generate CSV download link
-            csv_data = create_csv_download_link(df)
+            # Generate CSV download link, once per recording content
+            csv_data = recording_cache.cached(uploaded_file, "beacon_csv", lambda file: create_csv_download_link(df))
             st.download_button(
                 label="Download CSV",
                 data=csv_data,
@@ -0,0 +1,105 @@
+# beacon_index.py
+
+import threading
+import numpy as np
+import pandas as pd
+
+# A beacon identity packs into one int64: uuid id in the high 32 bits, then major and
+# minor as unsigned 16-bit values (negative recorder values wrap like int16 -> uint16)
+UUID_SHIFT = 32
+MAJOR_SHIFT = 16
+UINT16_MASK = 0xFFFF
+LOW_MASK = (1 << UUID_SHIFT) - 1
+
+EMPTY_KEYS = np.empty(0, dtype=np.int64)
+
+_uuid_ids = {}
+_uuid_lock = threading.Lock()
+
+def intern_uuids(uuids):
+    """Map upper-cased UUID strings to small process-wide integer ids."""
+    ids = np.empty(len(uuids), dtype=np.int64)
+    with _uuid_lock:
+        for position, uuid in enumerate(uuids):
+            uuid_id = _uuid_ids.get(uuid)
+            if uuid_id is None:
+                uuid_id = _uuid_ids[uuid] = len(_uuid_ids)
+            ids[position] = uuid_id
+    return ids
+
+def pack_keys(uuid_ids, majors, minors):
+    uuid_ids = np.asarray(uuid_ids, dtype=np.int64)
+    majors = np.asarray(majors, dtype=np.int64) & UINT16_MASK
+    minors = np.asarray(minors, dtype=np.int64) & UINT16_MASK
+    return (uuid_ids << UUID_SHIFT) | (majors << MAJOR_SHIFT) | minors
+
+def unpack_keys(keys):
+    """Split packed keys into (uuid_ids, majors, minors) arrays."""
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys >> UUID_SHIFT, (keys >> MAJOR_SHIFT) & UINT16_MASK, keys & UINT16_MASK
+
+def factorize_uuids(uuids):
+    """Factorize raw UUID values case-insensitively, upper-casing only the distinct ones.
+
+    Spellings that differ only in case share one code, so rows of the same beacon are
+    never split across codes.
+    """
+    codes, uniques = pd.factorize(np.asarray(uuids, dtype=object))
+    upper_codes, table = pd.factorize(np.asarray([str(uuid).upper() for uuid in uniques], dtype=object))
+    return upper_codes[codes], list(table)
+
+def pack_identities(uuids, majors, minors):
+    """Pack UUID strings and major/minor values into process-wide keys, row for row."""
+    codes, table = factorize_uuids(uuids)
+    return pack_keys(intern_uuids(table)[codes], majors, minors)
+
+def local_key_set(uuids, majors, minors):
+    """Pack identities against a local UUID table instead of the process-wide one.
+
+    Returns (uuid_table, keys) with keys sorted and unique. The pair does not depend on
+    this process' interning state, so it can be returned from worker processes and
+    turned into process-wide keys with to_global_keys.
+    """
+    codes, table = factorize_uuids(uuids)
+    return table, np.unique(pack_keys(codes, majors, minors))
+
+def local_key_set_from_records(beacon_records):
+    """local_key_set of a chunk of beaconData records, skipping readings without uuid/major/minor."""
+    frame = pd.DataFrame(beacon_records, columns=["uuid", "major", "minor"])
+    majors = pd.to_numeric(frame["major"], errors="coerce")
+    minors = pd.to_numeric(frame["minor"], errors="coerce")
+    valid = (frame["uuid"].notna() & majors.notna() & minors.notna()).to_numpy()
+    return local_key_set(frame["uuid"].to_numpy()[valid], majors.to_numpy()[valid], minors.to_numpy()[valid])
+
+def relabel_keys(keys, uuid_ids):
+    """Swap the uuid part of packed keys: local uuid code c becomes uuid_ids[c]."""
+    keys = np.asarray(keys, dtype=np.int64)
+    return (uuid_ids[keys >> UUID_SHIFT] << UUID_SHIFT) | (keys & LOW_MASK)
+
+def table_positions(uuid_table, positions):
+    """Map a local uuid table onto a combined one kept in positions (uuid -> code)."""
+    return np.asarray([positions.setdefault(uuid, len(positions)) for uuid in uuid_table], dtype=np.int64)
+
+def merge_local_key_sets(key_sets):
+    """Merge several (uuid_table, keys) pairs into one against a combined table."""
+    positions, merged = {}, []
+    for uuid_table, keys in key_sets:
+        remap = table_positions(uuid_table, positions)
+        if len(keys):
+            merged.append(relabel_keys(keys, remap))
+    return list(positions), np.unique(np.concatenate(merged)) if merged else EMPTY_KEYS
+
+def to_global_keys(uuid_table, keys):
+    """Turn a (uuid_table, keys) pair into sorted, unique process-wide keys."""
+    if not len(keys):
+        return EMPTY_KEYS
+    return np.unique(relabel_keys(keys, intern_uuids(uuid_table)))
+
+def contains(sorted_keys, keys):
+    """Vectorized membership test of keys in a sorted key array."""
+    keys = np.asarray(keys, dtype=np.int64)
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.searchsorted(sorted_keys, keys)
+    positions[positions == len(sorted_keys)] = 0
+    return sorted_keys[positions] == keys
@@ -0,0 +1,175 @@
+# beacon_stats.py
+
+import numpy as np
+import pandas as pd
+import perf
+from recording_reader import iter_records
+from timeseries import epoch_seconds
+from beacon_index import (
+    factorize_uuids,
+    pack_keys,
+    unpack_keys,
+    relabel_keys,
+    table_positions,
+    intern_uuids,
+)
+
+RSSI_FIELD = "rssi"
+TIMESTAMP_FIELD = "timestamp"
+# Mean RSSI (dBm) below which a heard beacon is reported as weak, e.g. a dying battery
+WEAK_RSSI_THRESHOLD = -85
+
+# Partial aggregates per beacon; they combine across chunks and files without revisiting readings
+PARTIAL_AGGREGATIONS = {
+    "count": "sum",
+    "rssi_count": "sum",
+    "rssi_sum": "sum",
+    "rssi_min": "min",
+    "rssi_max": "max",
+    "first_seen": "min",
+    "last_seen": "max",
+}
+BEACON_RECORD_COLUMNS = ["uuid", "major", "minor", RSSI_FIELD, TIMESTAMP_FIELD]
+STRONGEST_READING_COLUMNS = ["UUID", "Major", "Minor", "RSSI", "Timestamp"]
+SIGNAL_STATS_COLUMNS = [
+    "Key", "UUID", "Major", "Minor", "Readings",
+    "Mean RSSI", "Min RSSI", "Max RSSI", "First Seen", "Last Seen",
+]
+
+def _empty_partial():
+    return pd.DataFrame({column: pd.Series(dtype="float64") for column in PARTIAL_AGGREGATIONS}, index=pd.Index([], dtype="int64"))
+
+def chunk_signal_stats(beacon_records):
+    """Aggregate a chunk of beaconData records per beacon.
+
+    Returns (uuid_table, partial): partial is indexed by keys packed against the local
+    uuid_table (see beacon_index.local_key_set) and holds the PARTIAL_AGGREGATIONS.
+    """
+    frame = pd.DataFrame(beacon_records, columns=BEACON_RECORD_COLUMNS)
+    majors = pd.to_numeric(frame["major"], errors="coerce")
+    minors = pd.to_numeric(frame["minor"], errors="coerce")
+    valid = (frame["uuid"].notna() & majors.notna() & minors.notna()).to_numpy()
+    if not valid.any():
+        return [], _empty_partial()
+
+    codes, uuid_table = factorize_uuids(frame["uuid"].to_numpy()[valid])
+    readings = pd.DataFrame({
+        "key": pack_keys(codes, majors.to_numpy()[valid], minors.to_numpy()[valid]),
+        "rssi": pd.to_numeric(frame[RSSI_FIELD], errors="coerce").to_numpy(dtype=float)[valid],
+        "timestamp": pd.to_numeric(frame[TIMESTAMP_FIELD], errors="coerce").to_numpy(dtype=float)[valid],
+    })
+    partial = readings.groupby("key").agg(
+        count=("rssi", "size"),
+        rssi_count=("rssi", "count"),
+        rssi_sum=("rssi", "sum"),
+        rssi_min=("rssi", "min"),
+        rssi_max=("rssi", "max"),
+        first_seen=("timestamp", "min"),
+        last_seen=("timestamp", "max"),
+    )
+    return uuid_table, partial
+
+def merge_signal_stats(parts):
+    """Combine (uuid_table, partial) pairs from chunks or files into one pair."""
+    positions, frames = {}, []
+    for uuid_table, partial in parts:
+        remap = table_positions(uuid_table, positions)
+        if len(partial):
+            frames.append(partial.set_axis(relabel_keys(partial.index.to_numpy(), remap)))
+    if not frames:
+        return list(positions), _empty_partial()
+    # Grouped even for a single part: relabelling can map several local codes onto one
+    merged = pd.concat(frames).groupby(level=0).agg(PARTIAL_AGGREGATIONS)
+    return list(positions), merged
+
+def extract_signal_stats(file):
+    """Per-beacon partial aggregates of one recording in a single streaming pass over beaconData."""
+    return merge_signal_stats(chunk_signal_stats(chunk) for chunk in iter_records(file, "beaconData", columns=BEACON_RECORD_COLUMNS))
+
+def _to_datetime(timestamps):
+    # Recorders write epoch seconds or milliseconds; anything past 1e11 can only be milliseconds
+    unit = "ms" if np.nanmax(timestamps, initial=0) > 1e11 else "s"
+    return pd.to_datetime(timestamps, unit=unit, errors="coerce")
+
+def signal_stats_table(uuid_table, partial):
+    """Turn merged partial aggregates into the per-beacon table with process-wide keys.
+
+    Columns are SIGNAL_STATS_COLUMNS, sorted by Key; the Key column doubles as the sorted
+    heard-key array of the recordings the aggregates came from.
+    """
+    keys = relabel_keys(partial.index.to_numpy(), intern_uuids(uuid_table)) if len(partial) else np.empty(0, dtype=np.int64)
+    _, majors, minors = unpack_keys(keys)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_rssi = partial["rssi_sum"].to_numpy() / partial["rssi_count"].to_numpy()
+    codes, _, _ = unpack_keys(partial.index.to_numpy())
+    table = pd.DataFrame({
+        "Key": keys,
+        "UUID": np.asarray(uuid_table + [None], dtype=object)[codes],
+        "Major": majors,
+        "Minor": minors,
+        "Readings": partial["count"].to_numpy(dtype=np.int64),
+        "Mean RSSI": np.round(mean_rssi, 1),
+        "Min RSSI": partial["rssi_min"].to_numpy(),
+        "Max RSSI": partial["rssi_max"].to_numpy(),
+        "First Seen": _to_datetime(partial["first_seen"].to_numpy(dtype=float)),
+        "Last Seen": _to_datetime(partial["last_seen"].to_numpy(dtype=float)),
+    }, columns=SIGNAL_STATS_COLUMNS)
+    return table.sort_values("Key", ignore_index=True)
+
+def weak_beacons(signal_stats, threshold=WEAK_RSSI_THRESHOLD):
+    """Rows of a signal stats table whose mean RSSI is below threshold, weakest first."""
+    return signal_stats[signal_stats["Mean RSSI"] < threshold].sort_values("Mean RSSI", ignore_index=True)
+
+def flag_weak(placed_index, signal_stats, threshold=WEAK_RSSI_THRESHOLD):
+    """Placed beacons that were heard, but only weakly, with their signal statistics."""
+    with perf.timed("match weak") as span:
+        weak = weak_beacons(signal_stats, threshold).drop(columns=["UUID", "Major", "Minor"])
+        flagged = placed_index.drop(columns=["Coordinates"]).merge(weak, on="Key").sort_values(["Level", "Mean RSSI"], ignore_index=True)
+        span.rows = len(flagged)
+        return flagged
+
+def _keep_strongest(readings):
+    readings = readings.sort_values("rssi", ascending=False, kind="stable")
+    return readings[~readings.index.duplicated()]
+
+def _chunk_strongest(beacon_records):
+    frame = pd.DataFrame(beacon_records, columns=BEACON_RECORD_COLUMNS)
+    majors = pd.to_numeric(frame["major"], errors="coerce")
+    minors = pd.to_numeric(frame["minor"], errors="coerce")
+    rssi = pd.to_numeric(frame[RSSI_FIELD], errors="coerce")
+    timestamps = pd.to_numeric(frame[TIMESTAMP_FIELD], errors="coerce")
+    valid = (frame["uuid"].notna() & majors.notna() & minors.notna() & rssi.notna() & timestamps.notna()).to_numpy()
+    if not valid.any():
+        return [], pd.DataFrame({"rssi": [], "timestamp": []})
+
+    codes, uuid_table = factorize_uuids(frame["uuid"].to_numpy()[valid])
+    readings = pd.DataFrame(
+        {"rssi": rssi.to_numpy(dtype=float)[valid], "timestamp": timestamps.to_numpy(dtype=float)[valid]},
+        index=pack_keys(codes, majors.to_numpy()[valid], minors.to_numpy()[valid]),
+    )
+    return uuid_table, _keep_strongest(readings)
+
+def strongest_readings(file):
+    """The strongest reading of every beacon heard in a recording, in one streaming pass over beaconData.
+
+    Columns are STRONGEST_READING_COLUMNS, Timestamp in epoch seconds, e.g. to place the
+    beacon on the GPS track where it was heard best.
+    """
+    positions, frames = {}, []
+    for chunk in iter_records(file, "beaconData", columns=BEACON_RECORD_COLUMNS):
+        uuid_table, strongest = _chunk_strongest(chunk)
+        remap = table_positions(uuid_table, positions)
+        if len(strongest):
+            frames.append(strongest.set_axis(relabel_keys(strongest.index.to_numpy(), remap)))
+    if not frames:
+        return pd.DataFrame(columns=STRONGEST_READING_COLUMNS)
+
+    strongest = _keep_strongest(pd.concat(frames)).sort_index()
+    codes, majors, minors = unpack_keys(strongest.index.to_numpy())
+    return pd.DataFrame({
+        "UUID": np.asarray(list(positions), dtype=object)[codes],
+        "Major": majors,
+        "Minor": minors,
+        "RSSI": strongest["rssi"].to_numpy(),
+        "Timestamp": epoch_seconds(strongest["timestamp"].to_numpy()),
+    }, columns=STRONGEST_READING_COLUMNS)
@@ -0,0 +1,112 @@
+# benchmarks/planner_stub.py
+
+"""Local stand-in for the planner API, serving synthetic site data with injected latency.
+
+    python -m benchmarks.planner_stub --port 8765 --latency-ms 80
+
+Point the app at it with OPSTOOLKIT_PLANNER_URL=http://127.0.0.1:8765. Any login
+succeeds with a fixed token.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from benchmarks.synthetic import site_hierarchy
+
+STUB_TOKEN = "benchmark-token"
+
+class PlannerStub(ThreadingHTTPServer):
+    """HTTP server answering planner GET paths from a {path: body} map.
+
+    Every response is delayed by latency seconds plus up to jitter seconds, and carries
+    an ETag so conditional revalidation is exercised like against the real planner.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, responses, latency=0.0, jitter=0.0):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._count_lock = threading.Lock()
+        self.bodies = {}
+        for path, body in responses.items():
+            encoded = json.dumps(body, separators=(",", ":")).encode()
+            self.bodies[path] = (encoded, f'"{hashlib.blake2b(encoded, digest_size=8).hexdigest()}"')
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self):
+        with self._count_lock:
+            self.requests += 1
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body=b"", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.delay()
+        if self.headers.get("Authorization") != f"Bearer {STUB_TOKEN}":
+            self._send(401, b'{"error":"unauthorized"}')
+            return
+        entry = self.server.bodies.get(self.path)
+        if entry is None:
+            self._send(404, b'{"error":"not found"}')
+            return
+        body, etag = entry
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers=[("ETag", etag)])
+        else:
+            self._send(200, body, headers=[("ETag", etag)])
+
+    def do_POST(self):
+        self.server.delay()
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self._send(200, json.dumps({"token": STUB_TOKEN}).encode())
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(responses, latency=0.0, jitter=0.0, port=0):
+    """Serve responses from a background thread and return the running PlannerStub."""
+    server = PlannerStub(("127.0.0.1", port), responses, latency, jitter)
+    threading.Thread(target=server.serve_forever, name="planner-stub", daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a synthetic planner API for benchmarks and local development.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="fixed delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="random extra delay per request")
+    parser.add_argument("--buildings", type=int, default=2)
+    parser.add_argument("--levels", type=int, default=3, help="levels per building")
+    parser.add_argument("--beacons", type=int, default=500, help="placed beacons per level")
+    args = parser.parse_args(argv)
+
+    responses = site_hierarchy(args.buildings, args.levels, args.beacons)
+    server = PlannerStub(("127.0.0.1", args.port), responses, args.latency_ms / 1000, args.jitter_ms / 1000)
+    print(f"Planner stub on {server.url} (token {STUB_TOKEN})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+# benchmarks/run.py
+
+"""Time the hot paths of the tool on synthetic data and save the results for comparison.
+
+    python -m benchmarks.run [--readings 1000000] [--latency-ms 50] [--compare benchmarks/results/baseline.json]
+
+Results are written as JSON to benchmarks/results/ (or --output). With --compare, each
+benchmark's median is compared with the baseline's and the run exits with status 1 if
+any is slower by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_TOLERANCE = 0.10
+
+def _time(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(args, workdir):
+    """Run every benchmark and return {name: result}, printing each result as it completes."""
+    # Imported here so OPSTOOLKIT_* settings made by main() apply to the modules
+    import api_cache
+    import api_utils
+    from audit_cli import fetch_scope
+    from beacon_stats import extract_signal_stats
+    from geometry import prepare_level_geometry
+    from ingest import ingest_recordings
+    from map_utils import build_unheard_map
+    from recording_reader import convert_recording, iter_records, read_recording
+    from timeseries import build_recording_streams
+    from spatial_index import PlacedBeaconIndex
+    from unheard_audit import extract_heard_key_set, find_unheard, index_placed_beacons, compare_heard, RunningAudit
+    from beacon_index import contains, to_global_keys
+    from utils import BEACON_ID_COLUMNS, group_and_sort_beacon_data
+    from benchmarks.planner_stub import STUB_TOKEN, start_stub
+    from benchmarks.synthetic import site_hierarchy, write_recording
+
+    results = {}
+
+    def record(name, function, repeat=args.repeat, **extra):
+        timings = _time(function, repeat)
+        results[name] = {"median": statistics.median(timings), "min": min(timings), "repeat": repeat, **extra}
+        print(f"{name:32s} median {results[name]['median'] * 1000:10.1f} ms   min {results[name]['min'] * 1000:10.1f} ms", flush=True)
+
+    site = site_hierarchy(args.buildings, args.levels, args.beacons, args.rooms)
+    levels = site["/api/building/building-0/levels"]
+    placed = [beacon for level in levels for beacon in level["placedBeacons"]]
+
+    json_path = workdir / "recording.json"
+    columnar_path = workdir / "recording.opsrec"
+    started = time.perf_counter()
+    write_recording(json_path, args.readings, placed=placed)
+    with open(json_path, "rb") as file:
+        convert_recording(file, columnar_path)
+    print(f"Generated {args.readings} readings ({json_path.stat().st_size / 1e6:.1f} MB JSON, "
+          f"{columnar_path.stat().st_size / 1e6:.1f} MB columnar) in {time.perf_counter() - started:.1f}s", flush=True)
+
+    # Recording parsing
+    with open(json_path, "rb") as file:
+        record("parse_header_json", lambda: read_recording(file, heads={"gpsData": 1}))
+        record("parse_beacons_json", lambda: sum(len(chunk) for chunk in iter_records(file, "beaconData")))
+        chunks = list(iter_records(file, "beaconData"))
+    with open(columnar_path, "rb") as file:
+        record("parse_header_columnar", lambda: read_recording(file, heads={"gpsData": 1}))
+        record("parse_beacons_columnar", lambda: sum(len(chunk) for chunk in iter_records(file, "beaconData", columns=BEACON_ID_COLUMNS)))
+        record("signal_stats_columnar", lambda: extract_signal_stats(file))
+    record("ingest_json", lambda: ingest_recordings([json_path]))
+
+    # Sensor and GPS streams: time index built once, then a chart's worth of points per window
+    with open(columnar_path, "rb") as file:
+        record("build_streams_columnar", lambda: build_recording_streams(file))
+        streams = build_recording_streams(file)
+    sensor = max(streams.values(), key=len)
+    record("downsample_lttb", lambda: sensor.downsample(method="lttb"), samples=len(sensor))
+    record("downsample_minmax", lambda: sensor.downsample(method="minmax"), samples=len(sensor))
+    del streams, sensor
+
+    # Grouping of already parsed readings
+    record("group_and_sort_beacon_data", lambda: group_and_sort_beacon_data(chunks))
+    del chunks
+
+    # Unheard set difference
+    with open(json_path, "rb") as file:
+        heard_keys = to_global_keys(*extract_heard_key_set(file))
+    level_pairs = [(level["shortName"], level["placedBeacons"]) for level in levels]
+    record("index_placed_beacons", lambda: index_placed_beacons(level_pairs))
+    placed_index = index_placed_beacons(level_pairs)
+    record("find_unheard", lambda: find_unheard(placed_index, heard_keys), placed=len(placed_index))
+
+    # One more recording added to, then removed from, an audit already holding this one
+    with open(json_path, "rb") as file:
+        part = extract_signal_stats(file)
+    audit = RunningAudit(placed_index)
+    audit.add("base", "base", part)
+
+    def add_and_remove():
+        audit.add("extra", "extra", part)
+        audit.unheard()
+        audit.remove("extra")
+        audit.unheard()
+
+    record("audit_add_remove", add_and_remove, placed=len(placed_index))
+
+    # Before/after comparison of two heard sets over the building
+    after_keys = heard_keys[::2]
+    record("compare_heard", lambda: compare_heard(placed_index, heard_keys, after_keys), placed=len(placed_index))
+
+    # Dead zones over every level of the building
+    record("spatial_index", lambda: PlacedBeaconIndex(placed_index), placed=len(placed_index))
+    spatial_index = PlacedBeaconIndex(placed_index)
+    unheard_mask = ~contains(heard_keys, placed_index["Key"].to_numpy())
+    record("dead_zones", lambda: spatial_index.dead_zones(unheard_mask), unheard=int(unheard_mask.sum()))
+
+    # Hierarchy fetching against the stub
+    stub = start_stub(site, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000)
+    api_utils.PLANNER_BASE_URL = stub.url
+
+    def fetch_cold():
+        api_cache.clear()
+        fetch_scope(STUB_TOKEN, "Benchmark Client")
+
+    requests_before = stub.requests
+    record("fetch_hierarchy_cold", fetch_cold, latency_ms=args.latency_ms)
+    results["fetch_hierarchy_cold"]["requests"] = (stub.requests - requests_before) // args.repeat
+    record("fetch_hierarchy_warm", lambda: fetch_scope(STUB_TOKEN, "Benchmark Client"), latency_ms=args.latency_ms)
+    stub.shutdown()
+
+    # Folium map building for every level of a building
+    missing = find_unheard(placed_index, heard_keys)
+    missing_by_level = dict(tuple(missing.groupby("Level", sort=False)))
+    geojsons = {level["_id"]: site[f"/api/level/{level['_id']}/geoJson"]["geoJson"] for level in levels}
+
+    def build_map():
+        level_results = [
+            (level["shortName"], prepare_level_geometry(level["_id"], geojsons[level["_id"]]), missing_by_level.get(level["shortName"], missing.iloc[:0]))
+            for level in levels
+        ]
+        m, _ = build_unheard_map(level_results)
+        return m.get_root().render()
+
+    record("build_map_first", build_map, repeat=1)
+    html = build_map()
+    record("build_map", build_map, html_bytes=len(html.encode()))
+    return results
+
+def compare(results, baseline, tolerance):
+    """Print each benchmark's change against a baseline and return the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':32s} {'baseline':>12s} {'current':>12s} {'change':>8s}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:32s} {'-':>12s} {result['median'] * 1000:10.1f}ms {'new':>8s}")
+            continue
+        change = result["median"] / before["median"] - 1 if before["median"] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:32s} {before['median'] * 1000:10.1f}ms {result['median'] * 1000:10.1f}ms {change:+8.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tool's hot paths on synthetic data.")
+    parser.add_argument("--readings", type=int, default=500000, help="beacon readings in the synthetic recording")
+    parser.add_argument("--buildings", type=int, default=4)
+    parser.add_argument("--levels", type=int, default=5, help="levels per building")
+    parser.add_argument("--beacons", type=int, default=400, help="placed beacons per level")
+    parser.add_argument("--rooms", type=int, default=150, help="rooms per level floor plan")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="planner stub delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="baseline results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown before a regression is reported")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="opstoolkit-bench-") as workdir:
+        # Never touch the user's planner cache
+        os.environ["OPSTOOLKIT_CACHE_DIR"] = str(Path(workdir) / "cache")
+        results = run_benchmarks(args, Path(workdir))
+
+    commit = _git_commit()
+    report = {
+        "meta": {
+            "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    output = args.output
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'unknown'}.json"
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        if baseline["meta"].get("parameters") != report["meta"]["parameters"]:
+            print("Warning: the baseline was run with different parameters.")
+        if compare(results, baseline["results"], args.tolerance):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
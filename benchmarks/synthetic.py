@@ -0,0 +1,178 @@
+# benchmarks/synthetic.py
+
+import json
+import math
+import numpy as np
+import pandas as pd
+
+# Readings are written in blocks of this many rows, so memory stays flat at any size
+WRITE_BLOCK_SIZE = 200000
+START_TIME = 1_700_000_000  # seconds
+SITE_ORIGIN = (51.5072, -0.1276)  # latitude, longitude
+LEVEL_SIZE_DEGREES = 0.002  # about 200 m across
+ROOM_VERTICES = 24
+
+def beacon_uuids(count, seed=0):
+    """Return count random, upper-case beacon UUID strings."""
+    rng = np.random.default_rng(seed)
+    return [
+        "-".join(part) for part in (
+            (digits[:8], digits[8:12], digits[12:16], digits[16:20], digits[20:])
+            for digits in (f"{value:032X}" for value in rng.integers(0, 2**62, count).tolist())
+        )
+    ]
+
+def placed_beacons(levels, beacons_per_level, uuid_count=3, seed=0):
+    """Return {level_index: [placed beacon dicts]} with unique uuid/major/minor per site."""
+    rng = np.random.default_rng(seed)
+    uuids = beacon_uuids(uuid_count, seed)
+    placed = {}
+    for level in range(levels):
+        minors = np.arange(beacons_per_level)
+        latitudes = SITE_ORIGIN[0] + rng.random(beacons_per_level) * LEVEL_SIZE_DEGREES
+        longitudes = SITE_ORIGIN[1] + rng.random(beacons_per_level) * LEVEL_SIZE_DEGREES
+        placed[level] = [
+            {
+                "uuid": uuids[int(minor) % uuid_count],
+                "major": level + 1,
+                "minor": int(minor),
+                "coordinates": [float(lon), float(lat)],
+            }
+            for minor, lat, lon in zip(minors, latitudes, longitudes)
+        ]
+    return placed
+
+def _room(center_lat, center_lon, radius):
+    angles = np.linspace(0, 2 * math.pi, ROOM_VERTICES, endpoint=False)
+    ring = [[center_lon + radius * math.cos(a), center_lat + radius * math.sin(a)] for a in angles]
+    return ring + [ring[0]]
+
+def level_geojson(rooms, seed=0):
+    """Return a FeatureCollection of rooms roughly filling one level, with detailed outlines."""
+    rng = np.random.default_rng(seed)
+    side = max(1, math.ceil(math.sqrt(rooms)))
+    step = LEVEL_SIZE_DEGREES / side
+    features = []
+    for index in range(rooms):
+        row, column = divmod(index, side)
+        center_lat = SITE_ORIGIN[0] + (row + 0.5) * step
+        center_lon = SITE_ORIGIN[1] + (column + 0.5) * step
+        radius = step * (0.3 + 0.15 * rng.random())
+        features.append({
+            "type": "Feature",
+            "properties": {"name": f"Room {index}"},
+            "geometry": {"type": "Polygon", "coordinates": [_room(center_lat, center_lon, radius)]},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def site_hierarchy(buildings=2, levels_per_building=3, beacons_per_level=500, rooms_per_level=100, seed=0):
+    """Return the planner data of one client with one site, as served by the planner stub.
+
+    The result maps planner API paths to JSON bodies: clients, sites, buildings, each
+    building's levels (with placedBeacons) and each level's GeoJSON.
+    """
+    client_id, site_id = "client-1", "site-1"
+    responses = {
+        "/api/clients": [{"_id": client_id, "name": "Benchmark Client"}],
+        f"/api/client/{client_id}/sites": [{"_id": site_id, "name": "Benchmark Site"}],
+        f"/api/site/{site_id}/buildings": [
+            {"_id": f"building-{b}", "name": f"Building {b}"} for b in range(buildings)
+        ],
+        f"/api/site/{site_id}/beacon-types": [],
+    }
+    placed = placed_beacons(buildings * levels_per_building, beacons_per_level, seed=seed)
+    for b in range(buildings):
+        levels = []
+        for l in range(levels_per_building):
+            index = b * levels_per_building + l
+            level_id = f"level-{b}-{l}"
+            levels.append({
+                "_id": level_id,
+                "shortName": f"B{b}L{l}",
+                "longName": f"Building {b} level {l}",
+                "placedBeacons": placed[index],
+            })
+            responses[f"/api/level/{level_id}/geoJson"] = {
+                "placedBeacons": placed[index],
+                "geoJson": level_geojson(rooms_per_level, seed=seed + index),
+            }
+        responses[f"/api/building/building-{b}/levels"] = levels
+    return responses
+
+def write_recording(path, beacon_readings, placed=None, heard_share=0.9, gps_points=None, sensor_samples=None, seed=0):
+    """Write a synthetic JSON recording in the recorder's schema.
+
+    beaconData holds beacon_readings readings of a heard_share sample of placed (a list
+    of placed beacon dicts; a single synthetic level when None). gpsData and
+    sensorData default to one point per second and 20 samples per second over the
+    recording's duration. Rows are generated with numpy and serialized in blocks.
+    """
+    rng = np.random.default_rng(seed)
+    placed = placed if placed is not None else placed_beacons(1, 1000, seed=seed)[0]
+    heard = rng.choice(len(placed), size=max(1, int(len(placed) * heard_share)), replace=False)
+    uuids = np.asarray([placed[i]["uuid"] for i in heard], dtype=object)
+    majors = np.asarray([placed[i]["major"] for i in heard])
+    minors = np.asarray([placed[i]["minor"] for i in heard])
+
+    # Ten readings per second, the rate of a typical scan
+    duration = max(1, beacon_readings // 10)
+    gps_points = duration if gps_points is None else gps_points
+    sensor_samples = duration * 20 if sensor_samples is None else sensor_samples
+    recording_info = {
+        "recordingStartTime": START_TIME,
+        "recordingEndTime": START_TIME + duration,
+        "recordingDuration": float(duration),
+        "deviceModel": "Synthetic",
+        "os": "Android",
+        "manufacturer": "Benchmark",
+        "osVersion": "14",
+        "recorderAppVersion": "0.0.0",
+        "uuids": sorted(set(uuids.tolist())),
+    }
+
+    def beacon_block(start, count):
+        picks = rng.integers(0, len(heard), count)
+        return pd.DataFrame({
+            "uuid": uuids[picks],
+            "major": majors[picks],
+            "minor": minors[picks],
+            "rssi": rng.integers(-100, -45, count),
+            "timestamp": (START_TIME * 1000 + (start + np.arange(count)) * 100),
+        })
+
+    def gps_block(start, count):
+        steps = start + np.arange(count)
+        return pd.DataFrame({
+            "latitude": SITE_ORIGIN[0] + LEVEL_SIZE_DEGREES * (0.5 + 0.4 * np.sin(steps / 300)),
+            "longitude": SITE_ORIGIN[1] + LEVEL_SIZE_DEGREES * (0.5 + 0.4 * np.cos(steps / 470)),
+            "accuracy": rng.uniform(3, 15, count).round(1),
+            "timestamp": START_TIME * 1000 + steps * 1000,
+        })
+
+    def sensor_block(start, count):
+        return pd.DataFrame({
+            "type": "accelerometer",
+            "x": rng.normal(0, 0.3, count).round(4),
+            "y": rng.normal(0, 0.3, count).round(4),
+            "z": rng.normal(9.81, 0.3, count).round(4),
+            "timestamp": START_TIME * 1000 + (start + np.arange(count)) * 50,
+        })
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write('{"recordingInfo": ')
+        file.write(json.dumps(recording_info))
+        file.write(', "optionalNotes": "Synthetic benchmark recording"')
+        for section, total, block in (
+            ("gpsData", gps_points, gps_block),
+            ("beaconData", beacon_readings, beacon_block),
+            ("sensorData", sensor_samples, sensor_block),
+        ):
+            file.write(f', "{section}": [')
+            for start in range(0, total, WRITE_BLOCK_SIZE):
+                if start:
+                    file.write(",")
+                # to_json(orient="records") writes "[...]"; the brackets are dropped to splice blocks
+                file.write(block(start, min(WRITE_BLOCK_SIZE, total - start)).to_json(orient="records")[1:-1])
+            file.write("]")
+        file.write("}")
+    return path
@@ -0,0 +1,183 @@
+# columnar_recording.py
+
+import io
+import json
+import struct
+import pyarrow as pa
+import pyarrow.compute as pc
+
+COLUMNAR_EXTENSION = "opsrec"
+COLUMNAR_MAGIC = b"OPSREC1\n"
+FORMAT_VERSION = 1
+# Section offsets are aligned so memory-mapped Arrow buffers stay aligned too
+SECTION_ALIGNMENT = 64
+# String columns with fewer distinct values than this share of rows are dictionary encoded
+DICTIONARY_RATIO = 0.5
+
+_FOOTER = struct.Struct("<Q")
+
+# Layout: magic | Arrow IPC file per record section (64-byte aligned) | JSON header |
+# header length (uint64 LE) | magic. The JSON header holds the header sections
+# (recordingInfo, optionalNotes), the counts of every top-level array and the
+# offset and length of each section.
+
+def _to_string(value):
+    """Text of one value of a mixed column, read back by pd.to_numeric like the JSON value.
+
+    Scalars keep their plain text ("2" stays 2 to pd.to_numeric rather than '"2"');
+    only nested lists and objects are JSON-encoded.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+def records_table(records):
+    """Build an Arrow table from a list of record dicts, storing columns of mixed type as strings."""
+    try:
+        return pa.Table.from_pylist(records)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    names = list(dict.fromkeys(name for record in records for name in record))
+    columns = []
+    for name in names:
+        values = [record.get(name) for record in records]
+        try:
+            columns.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            columns.append(pa.array([_to_string(value) for value in values], type=pa.string()))
+    return pa.table(columns, names=names)
+
+def _compact(table):
+    """Combine chunks and dictionary encode repetitive string columns (UUIDs, device names)."""
+    table = table.combine_chunks()
+    for index, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) and len(table):
+            column = table.column(index)
+            if pc.count_distinct(column).as_py() < DICTIONARY_RATIO * len(table):
+                table = table.set_column(index, field.name, pc.dictionary_encode(column))
+    return table
+
+def _as_strings(column):
+    try:
+        return pc.cast(column, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        return pa.array([_to_string(value) for value in column.to_pylist()], type=pa.string())
+
+def _concat(tables):
+    """Concatenate chunk tables; columns whose type differs between chunks become strings."""
+    try:
+        return pa.concat_tables(tables, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    types = {}
+    for table in tables:
+        for field in table.schema:
+            if not pa.types.is_null(field.type):
+                types.setdefault(field.name, set()).add(field.type)
+    mixed = {name for name, found in types.items() if len(found) > 1}
+    tables = [
+        pa.table(
+            [_as_strings(table[name]) if name in mixed else table[name] for name in table.column_names],
+            names=table.column_names,
+        )
+        for table in tables
+    ]
+    return pa.concat_tables(tables, promote_options="permissive")
+
+def section_table(chunks):
+    """Concatenate the Arrow tables of one section's record chunks into one compact table."""
+    tables = [records_table(chunk) for chunk in chunks if chunk]
+    if not tables:
+        return pa.table({})
+    return _compact(_concat(tables))
+
+def write_columnar(sink, header, counts, sections, chunk_size):
+    """Write a columnar recording to a path or binary file object.
+
+    header maps header section names to their JSON values, counts is the top-level
+    array counts of the source recording, and sections maps record section names
+    to Arrow tables, written uncompressed in batches of chunk_size rows.
+    """
+    if isinstance(sink, (str, bytes)) or hasattr(sink, "__fspath__"):
+        with open(sink, "wb") as file:
+            return write_columnar(file, header, counts, sections, chunk_size)
+
+    offsets = {}
+    position = sink.write(COLUMNAR_MAGIC)
+    for name, table in sections.items():
+        padding = -position % SECTION_ALIGNMENT
+        position += sink.write(b"\0" * padding)
+        buffer = io.BytesIO()
+        with pa.ipc.new_file(buffer, table.schema) as writer:
+            writer.write_table(table, max_chunksize=chunk_size)
+        offsets[name] = [position, buffer.tell()]
+        position += sink.write(buffer.getbuffer())
+
+    footer = json.dumps({
+        "version": FORMAT_VERSION,
+        "header": header,
+        "counts": counts,
+        "sections": offsets,
+    }).encode()
+    sink.write(footer)
+    sink.write(_FOOTER.pack(len(footer)))
+    sink.write(COLUMNAR_MAGIC)
+
+def is_columnar(file):
+    """True if a binary file object holds a columnar recording; the position is reset to 0."""
+    file.seek(0)
+    magic = file.read(len(COLUMNAR_MAGIC))
+    file.seek(0)
+    return magic == COLUMNAR_MAGIC
+
+def _buffer(file):
+    """Return the file's bytes as an Arrow buffer, memory-mapped when it is a file on disk."""
+    if isinstance(file, (io.BufferedReader, io.FileIO)):
+        return pa.memory_map(file.name).read_buffer()
+    return pa.py_buffer(file.getvalue())
+
+def _footer(buffer):
+    tail = len(COLUMNAR_MAGIC) + _FOOTER.size
+    if buffer.size < 2 * len(COLUMNAR_MAGIC) + _FOOTER.size or buffer.slice(buffer.size - len(COLUMNAR_MAGIC)).to_pybytes() != COLUMNAR_MAGIC:
+        raise ValueError("truncated columnar recording")
+    (length,) = _FOOTER.unpack(buffer.slice(buffer.size - tail, _FOOTER.size).to_pybytes())
+    footer = json.loads(buffer.slice(buffer.size - tail - length, length).to_pybytes())
+    if footer.get("version") != FORMAT_VERSION:
+        raise ValueError(f"unsupported columnar recording version {footer.get('version')}")
+    return footer
+
+def _section(buffer, footer, section, columns=None):
+    """Return a section as an Arrow table backed by buffer, or None if the recording lacks it."""
+    location = footer["sections"].get(section)
+    if location is None:
+        return None
+    table = pa.ipc.open_file(buffer.slice(*location)).read_all()
+    if columns is not None:
+        table = table.select([name for name in columns if name in table.column_names])
+    return table
+
+def read_columnar_recording(file, sections, heads=None):
+    """Columnar counterpart of recording_reader.read_recording: returns (data, counts)."""
+    buffer = _buffer(file)
+    footer = _footer(buffer)
+    data = {name: footer["header"][name] for name in sections if name in footer["header"]}
+    for name, limit in (heads or {}).items():
+        table = _section(buffer, footer, name)
+        if table is not None:
+            data[name] = table.slice(0, limit).to_pylist()
+    return data, footer["counts"]
+
+def iter_columnar_records(file, section, chunk_size, columns=None):
+    """Yield a section of a columnar recording as DataFrames of at most chunk_size rows.
+
+    Only the requested columns are read, and on-disk files are memory-mapped, so the
+    cost follows the columns used rather than the size of the recording.
+    """
+    buffer = _buffer(file)
+    table = _section(buffer, _footer(buffer), section, columns)
+    if table is None:
+        return
+    for batch in table.to_batches(max_chunksize=chunk_size):
+        yield batch.to_pandas()
@@ -0,0 +1,71 @@
+# convert_cli.py
+
+"""Convert JSON recordings into columnar .opsrec files.
+
+    python convert_cli.py recordings/ [more.json ...] [-o converted/]
+
+Each recording is written next to its source, or into the output directory, with
+the .opsrec extension. Converted files can be uploaded on every page and passed to
+audit_cli.py instead of the JSON originals.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from columnar_recording import COLUMNAR_EXTENSION
+from recording_reader import convert_recording
+
+CONVERT_MAX_WORKERS = os.cpu_count() or 1
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def _target(source, output_dir):
+    return (Path(output_dir) if output_dir else source.parent) / f"{source.stem}.{COLUMNAR_EXTENSION}"
+
+def convert_file(source, target):
+    """Convert one JSON recording at source into target and return (source bytes, target bytes)."""
+    partial = target.with_name(target.name + ".part")
+    with open(source, "rb") as file:
+        convert_recording(file, partial)
+    # Written under a temporary name so an interrupted run never leaves a truncated file
+    os.replace(partial, target)
+    return source.stat().st_size, target.stat().st_size
+
+def _sources(paths):
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(path.rglob("*.json"))
+        else:
+            yield path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert JSON recordings into columnar .opsrec files.")
+    parser.add_argument("paths", nargs="+", type=Path, help="JSON recordings or directories searched recursively")
+    parser.add_argument("-o", "--output-dir", type=Path, help="directory for the converted files (default: next to each source)")
+    parser.add_argument("-j", "--jobs", type=int, default=CONVERT_MAX_WORKERS, help="recordings converted in parallel")
+    args = parser.parse_args(argv)
+
+    sources = list(_sources(args.paths))
+    if args.output_dir:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = {pool.submit(convert_file, source, _target(source, args.output_dir)): source for source in sources}
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                source_size, target_size = future.result()
+                _log(f"Converted {source} ({source_size / 1e6:.1f} MB -> {target_size / 1e6:.1f} MB)")
+            except Exception as e:
+                failed += 1
+                _log(f"Failed {source}: {str(e).splitlines()[0] if str(e) else type(e).__name__}")
+    _log(f"Converted {len(sources) - failed} of {len(sources)} recordings in {time.perf_counter() - started:.1f}s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# geocoding.py
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import api_cache
+
+# Coordinates are rounded before lookup and caching; 3 decimals is roughly 100 m
+GEOCODE_PRECISION = 3
+GEOCODE_TTL = 30 * 24 * 3600
+# A failed lookup (timeout, throttling) is answered with LOCATION_ERROR for this long, then retried
+GEOCODE_FAILURE_TTL = 5 * 60
+# Nominatim usage policy allows at most one request per second
+NOMINATIM_MIN_DELAY = 1.0
+# Optional offline gazetteer: a CSV with name, country, latitude and longitude columns
+GAZETTEER_PATH = os.environ.get("OPSTOOLKIT_GAZETTEER")
+
+LOCATION_ERROR = "Error obtaining location"
+
+_memory = {}
+_failures = {}
+_pending = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocoder")
+_reverse = None
+_gazetteer = None
+
+def _rounded(lat, lon):
+    return round(float(lat), GEOCODE_PRECISION), round(float(lon), GEOCODE_PRECISION)
+
+def _cache_key(key):
+    return f"geocode/{key[0]:.{GEOCODE_PRECISION}f},{key[1]:.{GEOCODE_PRECISION}f}"
+
+def _cached(key):
+    """Return the cached location for a rounded coordinate from memory, then disk, or None.
+
+    A recent failure is returned as LOCATION_ERROR; once GEOCODE_FAILURE_TTL has passed
+    it is forgotten and None is returned, so the caller looks the coordinate up again.
+    """
+    with _lock:
+        location = _memory.get(key)
+        failed_at = _failures.get(key)
+        if location is None and failed_at is not None:
+            if time.monotonic() - failed_at < GEOCODE_FAILURE_TTL:
+                return LOCATION_ERROR
+            del _failures[key]
+    if location is None:
+        entry = api_cache.get(_cache_key(key))
+        if api_cache.is_fresh(entry):
+            location = json.loads(entry.body)
+            with _lock:
+                _memory[key] = location
+    return location
+
+def _store(key, location):
+    with _lock:
+        _memory[key] = location
+    api_cache.put(_cache_key(key), json.dumps(location).encode(), GEOCODE_TTL)
+
+def _nominatim_lookup(lat, lon):
+    global _reverse
+    with _lock:
+        if _reverse is None:
+            # geopy is only imported once a network lookup is actually needed
+            from geopy.extra.rate_limiter import RateLimiter
+            from geopy.geocoders import Nominatim
+            # One shared, rate limited geolocator for the whole process
+            geolocator = Nominatim(user_agent="beacon_data_viewer")
+            _reverse = RateLimiter(geolocator.reverse, min_delay_seconds=NOMINATIM_MIN_DELAY, max_retries=0, swallow_exceptions=False)
+    location = _reverse((lat, lon), language='en', exactly_one=True)
+    if location:
+        address = location.raw.get('address', {})
+        location_name = address.get('town', address.get('city', address.get('village', 'Unknown Location')))
+        country_name = address.get('country', 'Unknown Country')
+        return f"{location_name}, {country_name}"
+    return "Location not found"
+
+def _gazetteer_lookup(lat, lon):
+    """Resolve against the nearest place of the offline gazetteer (haversine over all rows)."""
+    global _gazetteer
+    with _lock:
+        if _gazetteer is None:
+            places = pd.read_csv(GAZETTEER_PATH, usecols=["name", "country", "latitude", "longitude"])
+            _gazetteer = (
+                places["name"].to_numpy(),
+                places["country"].to_numpy(),
+                np.radians(places["latitude"].to_numpy(dtype=float)),
+                np.radians(places["longitude"].to_numpy(dtype=float)),
+            )
+    names, countries, latitudes, longitudes = _gazetteer
+    if not len(names):
+        return "Location not found"
+    lat, lon = np.radians(lat), np.radians(lon)
+    distance = np.sin((latitudes - lat) / 2) ** 2 + np.cos(lat) * np.cos(latitudes) * np.sin((longitudes - lon) / 2) ** 2
+    nearest = int(np.argmin(distance))
+    return f"{names[nearest]}, {countries[nearest]}"
+
+def reverse_geocode(lat, lon):
+    """Return "place, country" for a coordinate, blocking on the lookup if it is not cached."""
+    key = _rounded(lat, lon)
+    location = _cached(key)
+    if location is not None:
+        return location
+    try:
+        location = _gazetteer_lookup(*key) if GAZETTEER_PATH else _nominatim_lookup(*key)
+    except Exception:
+        # Failures are usually transient, so they are never written to the cache
+        with _lock:
+            _failures[key] = time.monotonic()
+        return LOCATION_ERROR
+    _store(key, location)
+    return location
+
+def lookup_location(lat, lon):
+    """Return the cached location of a coordinate, or None while it is resolved in the background.
+
+    Network lookups run on a single background thread, so the page can render at once and
+    pick the result up on a later rerun. Offline gazetteer lookups are answered directly.
+    A failed lookup is reported as LOCATION_ERROR for GEOCODE_FAILURE_TTL and then retried.
+    """
+    key = _rounded(lat, lon)
+    location = _cached(key)
+    if location is not None or GAZETTEER_PATH:
+        return location if location is not None else reverse_geocode(lat, lon)
+
+    with _lock:
+        future = _pending.get(key)
+        if future is not None and future.done() and (key in _memory or key in _failures):
+            del _pending[key]
+            return future.result()
+        # No lookup yet, or an uncollected one whose failure has since expired
+        if future is None or future.done():
+            _pending[key] = _executor.submit(reverse_geocode, lat, lon)
+    return None
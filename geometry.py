@@ -0,0 +1,163 @@
+# geometry.py
+
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Web Mercator ground resolution at zoom 0 on the equator, in metres per pixel
+METRES_PER_PIXEL_Z0 = 156543.03392
+METRES_PER_DEGREE = 111320.0
+# Floor plans are viewed close in; simplify so no error is visible at this zoom
+DEFAULT_GEOMETRY_ZOOM = 20
+# Recorded walks are viewed at building scale
+DEFAULT_TRACK_ZOOM = 19
+COORDINATE_PRECISION = 6  # about 10 cm
+LEVEL_GEOMETRY_CACHE_SIZE = 128
+
+_level_geometry = OrderedDict()
+_level_geometry_lock = threading.Lock()
+
+def tolerance_for_zoom(zoom, latitude=0.0, pixels=0.5):
+    """Simplification tolerance in degrees that stays below `pixels` screen pixels at zoom."""
+    metres = METRES_PER_PIXEL_Z0 * math.cos(math.radians(latitude)) / (2 ** zoom) * pixels
+    return metres / METRES_PER_DEGREE
+
+def simplify_line(points, tolerance):
+    """Douglas-Peucker simplification of an (n, 2) array, keeping both end points.
+
+    The farthest point of each span is found with one vectorized distance computation,
+    and spans are processed from an explicit stack instead of by recursion.
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = math.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+def simplify_track(latitudes, longitudes, zoom=DEFAULT_TRACK_ZOOM):
+    """Simplify a GPS track for zoom, skipping positions with missing coordinates.
+
+    Returns an (n, 2) array of [latitude, longitude] rows, the order folium expects.
+    """
+    points = np.column_stack([np.asarray(longitudes, dtype=float), np.asarray(latitudes, dtype=float)])
+    points = points[np.isfinite(points).all(axis=1)]
+    if not len(points):
+        return np.empty((0, 2))
+    tolerance = tolerance_for_zoom(zoom, float(np.median(points[:, 1])))
+    return np.round(simplify_line(points, tolerance)[:, ::-1], COORDINATE_PRECISION)
+
+def _simplify_ring(ring, tolerance):
+    simplified = simplify_line(ring, tolerance)
+    # A closed ring needs at least four positions; tiny rings are kept as they are
+    return simplified if len(simplified) >= 4 else np.asarray(ring, dtype=float)
+
+def _rounded_list(points, precision):
+    return np.round(points, precision).tolist()
+
+def simplify_geometry(geometry, tolerance, precision=COORDINATE_PRECISION):
+    """Return a simplified, coordinate-rounded copy of a GeoJSON geometry of any type."""
+    if geometry is None:
+        return None
+    geometry_type = geometry.get("type")
+    coordinates = geometry.get("coordinates")
+    if geometry_type == "GeometryCollection":
+        return {"type": geometry_type, "geometries": [simplify_geometry(part, tolerance, precision) for part in geometry.get("geometries", [])]}
+    if not coordinates:
+        return geometry
+    if geometry_type in ("Point", "MultiPoint"):
+        simplified = _rounded_list(np.asarray(coordinates, dtype=float), precision)
+    elif geometry_type == "LineString":
+        simplified = _rounded_list(simplify_line(coordinates, tolerance), precision)
+    elif geometry_type == "MultiLineString":
+        simplified = [_rounded_list(simplify_line(line, tolerance), precision) for line in coordinates]
+    elif geometry_type == "Polygon":
+        simplified = [_rounded_list(_simplify_ring(ring, tolerance), precision) for ring in coordinates]
+    elif geometry_type == "MultiPolygon":
+        simplified = [[_rounded_list(_simplify_ring(ring, tolerance), precision) for ring in polygon] for polygon in coordinates]
+    else:
+        return geometry
+    return {"type": geometry_type, "coordinates": simplified}
+
+def _collect_positions(coordinates, positions):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        positions.append(coordinates[:2])
+    else:
+        for part in coordinates or []:
+            _collect_positions(part, positions)
+
+def _collect_geometry_positions(geometry, positions):
+    if geometry is None:
+        return
+    if geometry.get("type") == "GeometryCollection":
+        for part in geometry.get("geometries", []):
+            _collect_geometry_positions(part, positions)
+    else:
+        _collect_positions(geometry.get("coordinates"), positions)
+
+def geometry_bounds(features):
+    """Return [[south, west], [north, east]] over every feature and geometry type, or None."""
+    positions = []
+    for feature in features:
+        _collect_geometry_positions(feature.get("geometry"), positions)
+    if not positions:
+        return None
+    points = np.asarray(positions, dtype=float)
+    west, south = points.min(axis=0)
+    east, north = points.max(axis=0)
+    return [[float(south), float(west)], [float(north), float(east)]]
+
+def prepare_level_geometry(level_id, geojson_features, zoom=DEFAULT_GEOMETRY_ZOOM):
+    """Simplify a level's floor plan for zoom and compute its bounds, once per level.
+
+    Returns {"features": FeatureCollection, "bounds": [[s, w], [n, e]] or None}. Results
+    are kept in a small LRU keyed by level and zoom, and recomputed if the level's
+    GeoJSON object is replaced (e.g. after the planner cache refreshes it).
+    """
+    key = (level_id, zoom)
+    with _level_geometry_lock:
+        entry = _level_geometry.get(key)
+        if entry is not None and entry[0] is geojson_features:
+            _level_geometry.move_to_end(key)
+            return entry[1]
+
+    features = geojson_features.get("features", []) if geojson_features else []
+    bounds = geometry_bounds(features)
+    latitude = (bounds[0][0] + bounds[1][0]) / 2 if bounds else 0.0
+    tolerance = tolerance_for_zoom(zoom, latitude)
+    prepared = {
+        "features": {
+            "type": "FeatureCollection",
+            "features": [
+                {**feature, "geometry": simplify_geometry(feature.get("geometry"), tolerance)}
+                for feature in features
+            ],
+        },
+        "bounds": bounds,
+    }
+
+    with _level_geometry_lock:
+        _level_geometry[key] = (geojson_features, prepared)
+        _level_geometry.move_to_end(key)
+        while len(_level_geometry) > LEVEL_GEOMETRY_CACHE_SIZE:
+            _level_geometry.popitem(last=False)
+    return prepared
@@ -0,0 +1,181 @@
+# ingest.py
+
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import recording_cache
+import perf
+from beacon_stats import extract_signal_stats, merge_signal_stats, signal_stats_table
+
+INGEST_MAX_WORKERS = os.cpu_count() or 1
+SIGNAL_STATS_KIND = "signal_stats"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """Return the shared worker pool. Workers are spawned, not forked, since the Streamlit server is multithreaded."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=INGEST_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+def _source_name(source):
+    # Paths as given, since recordings in different directories may share a file name
+    return os.fspath(source) if isinstance(source, (str, os.PathLike)) else source.name
+
+def _source_size(source):
+    return os.path.getsize(source) if isinstance(source, (str, os.PathLike)) else getattr(source, "size", 0)
+
+def _payload(source):
+    return source if isinstance(source, (str, os.PathLike)) else source.getvalue()
+
+def _extract_stats(source):
+    """Worker: return the per-beacon (uuid_table, partial) signal aggregates of one recording (a path or raw bytes)."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            return extract_signal_stats(file)
+    return extract_signal_stats(io.BytesIO(source))
+
+def extract_recordings(sources, on_progress=None):
+    """Extract the signal aggregates of many recordings in parallel worker processes.
+
+    sources are file paths or uploaded files (anything with name and getvalue()).
+    on_progress(done, total, name, error) is called from the calling thread as each
+    file finishes; error is None on success. Returns (parts, errors): parts maps the
+    position of each readable source to its (uuid_table, partial) aggregates (see
+    beacon_stats.extract_signal_stats) and errors maps the position of each unreadable
+    source to its error message. Timed as the "ingest" stage.
+    """
+    sources = list(sources)
+    with perf.timed("ingest", label=f"{len(sources)} recordings") as span:
+        span.bytes = sum(_source_size(source) for source in sources)
+        parts, errors = _ingest(sources, on_progress, span)
+        span.rows = sum(len(partial) for _, partial in parts.values())
+        return parts, errors
+
+def ingest_recordings(sources, on_progress=None):
+    """Extract and merge the heard beacons of many recordings in parallel worker processes.
+
+    Takes the arguments of extract_recordings. Returns (heard_keys, signal_stats, errors):
+    the sorted packed keys of every heard beacon, their per-beacon signal statistics
+    (see beacon_stats.signal_stats_table) and the errors of extract_recordings.
+    """
+    parts, errors = extract_recordings(sources, on_progress)
+    signal_stats = signal_stats_table(*merge_signal_stats(parts.values()))
+    # The stats table is sorted by its unique keys, so its Key column is the heard set itself
+    return signal_stats["Key"].to_numpy(), signal_stats, errors
+
+def _ingest(sources, on_progress, span):
+    parts, errors = {}, {}
+    total = len(sources)
+    done = 0
+
+    def finish(position, result=None, error=None):
+        nonlocal done
+        done += 1
+        source = sources[position]
+        if error is None:
+            parts[position] = result
+            if not isinstance(source, (str, os.PathLike)):
+                recording_cache.put(source, SIGNAL_STATS_KIND, result)
+        else:
+            errors[position] = error
+        if on_progress is not None:
+            on_progress(done, total, _source_name(source), error)
+
+    # Uploads parsed before (on an earlier rerun or by another session) are not parsed again
+    pending = []
+    for position, source in enumerate(sources):
+        cached = None if isinstance(source, (str, os.PathLike)) else recording_cache.get(source, SIGNAL_STATS_KIND)
+        if cached is None:
+            pending.append(position)
+        else:
+            parts[position] = cached
+            span.cache = "hit"
+            done += 1
+            if on_progress is not None:
+                on_progress(done, total, _source_name(source), None)
+    if pending:
+        span.cache = "partial" if span.cache else "miss"
+
+    if len(pending) <= 1 or INGEST_MAX_WORKERS <= 1:
+        for position in pending:
+            try:
+                finish(position, _extract_stats(_payload(sources[position])))
+            except Exception as e:
+                finish(position, error=str(e))
+        return parts, errors
+
+    pool = _get_pool()
+    futures = {pool.submit(_extract_stats, _payload(sources[position])): position for position in pending}
+    for future in as_completed(futures):
+        try:
+            finish(futures[future], future.result())
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); start a fresh pool on the next call
+            _reset_pool()
+            finish(futures[future], error=f"worker process failed: {e}")
+        except Exception as e:
+            finish(futures[future], error=str(e))
+    return parts, errors
+
+def sync_audit(audit, uploaded_files, on_progress=None):
+    """Bring an unheard_audit.RunningAudit in line with the current uploads.
+
+    Only uploads the audit has not seen are parsed; recordings no longer uploaded are
+    removed. Uploads are told apart by content, so the same recording uploaded twice
+    counts once. Returns a list of (name, "added" or "removed", count) changes, count
+    being the placed beacons newly heard or newly unheard.
+    """
+    current = {}
+    for file in uploaded_files:
+        current.setdefault(recording_cache.content_hash(file), file)
+
+    changes = []
+    for recording_id in [recording_id for recording_id in audit.recording_ids if recording_id not in current]:
+        name = audit.recording_name(recording_id)
+        changes.append((name, "removed", audit.remove(recording_id)))
+    for recording_id in [recording_id for recording_id in audit.failed if recording_id not in current]:
+        del audit.failed[recording_id]
+
+    new_ids = [recording_id for recording_id in current if recording_id not in audit.recording_ids and recording_id not in audit.failed]
+    if new_ids:
+        files = [current[recording_id] for recording_id in new_ids]
+        parts, errors = extract_recordings(files, on_progress)
+        for position, (recording_id, file) in enumerate(zip(new_ids, files)):
+            if position in parts:
+                changes.append((file.name, "added", audit.add(recording_id, file.name, parts[position])))
+            else:
+                audit.failed[recording_id] = (file.name, errors.get(position, "could not be read"))
+    return changes
+
+def sync_audit_with_progress(audit, uploaded_files):
+    """sync_audit with a progress bar while new recordings are parsed, a notice per change and a warning per unreadable file."""
+    # Only the pages report progress; the CLI and the parsing workers never import Streamlit
+    import streamlit as st
+    progress = None
+
+    def report(done, total, name, error):
+        nonlocal progress
+        if progress is None:
+            progress = st.progress(0.0, text="Parsing recordings...")
+        progress.progress(done / total, text=f"Parsed {name} ({done}/{total})")
+
+    changes = sync_audit(audit, uploaded_files, on_progress=report)
+    if progress is not None:
+        progress.empty()
+    for name, change, count in changes:
+        st.toast(f"{change.capitalize()} {name}: {count} placed beacons newly {'heard' if change == 'added' else 'unheard'}")
+    for name, error in audit.failed.values():
+        st.warning(f"Skipped {name}: {error}")
+    return changes
@@ -0,0 +1,34 @@
+# lookups.py
+
+import threading
+from collections import OrderedDict
+
+LOOKUP_CACHE_SIZE = 256
+
+_lookups = OrderedDict()
+_lookups_lock = threading.Lock()
+
+def name_index(items, label="{name}", value="_id"):
+    """Return ({label: item[value]}, sorted labels) for a list of planner objects.
+
+    label is a format string over each item's fields, e.g. "{shortName} ({longName})".
+    The result is built once per list object: the lists kept in session state are
+    only replaced when their data is fetched again, so reruns reuse it.
+    """
+    key = (id(items), label, value)
+    with _lookups_lock:
+        entry = _lookups.get(key)
+        if entry is not None and entry[0] is items:
+            _lookups.move_to_end(key)
+            return entry[1]
+
+    mapping = {label.format(**item): item[value] for item in items}
+    result = (mapping, sorted(mapping))
+
+    with _lookups_lock:
+        # The list itself is kept so its id cannot be reused by another object
+        _lookups[key] = (items, result)
+        _lookups.move_to_end(key)
+        while len(_lookups) > LOOKUP_CACHE_SIZE:
+            _lookups.popitem(last=False)
+    return result
@@ -0,0 +1,246 @@
+# map_utils.py
+
+import json
+import os
+import threading
+import weakref
+import folium
+import numpy as np
+from folium.plugins import FastMarkerCluster
+from branca.element import MacroElement
+from jinja2 import Template
+import streamlit as st
+import streamlit.components.v1 as components
+import perf
+
+MAPBOX_TOKEN = "your_mapbox_token_here"
+# Levels with more unheard beacons than this are drawn as one client-side clustered layer
+MARKER_CLUSTER_THRESHOLD = int(os.environ.get("OPSTOOLKIT_MARKER_CLUSTER_THRESHOLD", "300"))
+
+_rendered_html = weakref.WeakKeyDictionary()
+_rendered_html_lock = threading.Lock()
+
+# Builds every marker in the browser from compact [lat, lon, uuid_index, major, minor]
+# rows with one shared style; popup HTML is only generated when a popup opens
+CLUSTER_MARKER_CALLBACK = """(function() {
+    var uuids = %s;
+    var style = %s;
+    return function(row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), style);
+        marker.bindPopup(function() {
+            return "UUID: " + uuids[row[2]] + "<br>Major: " + row[3] + "<br>Minor: " + row[4];
+        }, {maxWidth: 300});
+        return marker;
+    };
+})()"""
+UNHEARD_MARKER_STYLE = {"radius": 6, "color": "red", "weight": 2, "fillColor": "yellow", "fillOpacity": 1}
+HEARD_MARKER_STYLE = {"radius": 5, "color": "#1f4e9c", "weight": 1, "fillColor": "#4a90d9", "fillOpacity": 0.9}
+TRACK_STYLE = {"color": "#d9534f", "weight": 3, "opacity": 0.8}
+DEAD_ZONE_STYLE = {"color": "#5a1f1f", "weight": 2, "fill": True, "fill_color": "#8b0000", "fill_opacity": 0.25}
+
+
+class LazyGeoJson(MacroElement):
+    """Floor geometry that is only turned into Leaflet layers once its level layer is shown.
+
+    The GeoJSON travels with the page as an unparsed string literal, so hidden levels
+    cost neither JSON parsing nor SVG drawing in the browser.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this.map.get_name() }};
+            var group = {{ this.group.get_name() }};
+            var source = {{ this.source|tojson }};
+            var loaded = false;
+            function load() {
+                if (loaded) { return; }
+                loaded = true;
+                var floor = L.geoJson(JSON.parse(source));
+                group.addLayer(floor);
+                floor.bringToBack();
+            }
+            map.on("overlayadd", function(e) { if (e.layer === group) { load(); } });
+            if (map.hasLayer(group)) { load(); }
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, map, group, geojson):
+        super().__init__()
+        self._name = "LazyGeoJson"
+        self.map = map
+        self.group = group
+        self.source = json.dumps(geojson, separators=(",", ":"))
+
+
+def create_base_map():
+    return folium.Map(
+        location=[0, 0],
+        zoom_start=15,
+        tiles=f"https://api.mapbox.com/styles/v1/mapbox/streets-v11/tiles/{{z}}/{{x}}/{{y}}?access_token={MAPBOX_TOKEN}",
+        attr="Mapbox"
+    )
+
+def add_beacon_markers(layer, beacons):
+    """Add a marker per row of an unheard_audit table (UUID, Major, Minor, Coordinates)."""
+    for uuid, major, minor, coordinates in zip(beacons["UUID"], beacons["Major"], beacons["Minor"], beacons["Coordinates"]):
+        folium.Marker(
+            location=[coordinates[1], coordinates[0]],
+            icon=folium.DivIcon(
+                html=f"""
+                <div style="
+                    background-color: yellow;
+                    border-radius: 50%;
+                    width: 20px;
+                    height: 20px;
+                    border: 2px solid red;
+                "></div>
+                """,
+                icon_size=(10, 10)
+            ),
+            popup=folium.Popup(
+                f"UUID: {uuid}<br>Major: {major}<br>Minor: {minor}",
+                max_width=300
+            )
+        ).add_to(layer)
+
+def add_clustered_beacon_markers(layer, beacons, style=UNHEARD_MARKER_STYLE):
+    """Add every row of a table with UUID, Major, Minor and Coordinates as one client-side clustered marker layer."""
+    uuid_codes, uuids = beacons["UUID"].factorize()
+    coordinates = beacons["Coordinates"].tolist()
+    rows = [
+        [coordinate[1], coordinate[0], int(code), int(major), int(minor)]
+        for coordinate, code, major, minor in zip(coordinates, uuid_codes, beacons["Major"], beacons["Minor"])
+    ]
+    FastMarkerCluster(
+        rows,
+        callback=CLUSTER_MARKER_CALLBACK % (json.dumps(list(uuids)), json.dumps(style)),
+        control=False,
+        disableClusteringAtZoom=21,
+        chunkedLoading=True,
+    ).add_to(layer)
+
+def add_unheard_markers(layer, beacons, cluster_threshold):
+    if len(beacons) > cluster_threshold:
+        add_clustered_beacon_markers(layer, beacons)
+    else:
+        add_beacon_markers(layer, beacons)
+
+def add_dead_zones(layer, zones):
+    """Draw the hull of every row of a spatial_index dead zone table, with its size in the tooltip."""
+    for zone, beacons, area, hull in zip(zones["Zone"], zones["Beacons"], zones["Area m²"], zones["Hull"]):
+        tooltip = f"Dead zone {zone}: {beacons} unheard beacons, {area:.0f} m²"
+        if len(hull) >= 3:
+            folium.Polygon(hull, tooltip=tooltip, **DEAD_ZONE_STYLE).add_to(layer)
+        else:
+            folium.PolyLine(hull, tooltip=tooltip, color=DEAD_ZONE_STYLE["color"], weight=6).add_to(layer)
+
+def build_unheard_map(level_results, cluster_threshold=MARKER_CLUSTER_THRESHOLD, dead_zones=None):
+    """Build the unheard-beacon map for one or more levels.
+
+    level_results is a list of (level_name, level_geometry, unheard_beacons) where
+    level_geometry comes from geometry.prepare_level_geometry and unheard_beacons is an
+    unheard_audit table. A single level is drawn directly; several levels get one layer
+    each behind a layer switcher, with only the first shown and every level's floor
+    geometry loaded lazily. Levels with more than cluster_threshold unheard beacons
+    switch to a single clustered marker layer. dead_zones, a spatial_index dead zone
+    table, adds each level's zone hulls under its markers.
+    Returns (map, bounds) where bounds is None if no level had valid geometries.
+    """
+    with perf.timed("map build") as span:
+        span.rows = sum(len(unheard_beacons) for _, _, unheard_beacons in level_results)
+        return _build_unheard_map(level_results, cluster_threshold, dead_zones)
+
+def add_heard_markers(layer, beacons, cluster_threshold):
+    """Add a circle per row of a beacon_stats.strongest_readings table with Coordinates, clustered above cluster_threshold."""
+    if len(beacons) > cluster_threshold:
+        add_clustered_beacon_markers(layer, beacons, style=HEARD_MARKER_STYLE)
+        return
+    for uuid, major, minor, rssi, coordinates in zip(beacons["UUID"], beacons["Major"], beacons["Minor"], beacons["RSSI"], beacons["Coordinates"]):
+        folium.CircleMarker(
+            location=[coordinates[1], coordinates[0]],
+            popup=folium.Popup(f"UUID: {uuid}<br>Major: {major}<br>Minor: {minor}<br>Strongest RSSI: {rssi:.0f} dBm", max_width=300),
+            **HEARD_MARKER_STYLE,
+        ).add_to(layer)
+
+def build_track_map(track, heard_beacons, cluster_threshold=MARKER_CLUSTER_THRESHOLD):
+    """Build a map of a recording's path with the beacons it heard.
+
+    track is an (n, 2) array of [latitude, longitude] (see geometry.simplify_track);
+    heard_beacons a beacon_stats.strongest_readings table with a Coordinates column
+    ([longitude, latitude] where the beacon was heard best), drawn as its own layer.
+    Returns (map, bounds) where bounds is None if there is nothing to draw.
+    """
+    with perf.timed("map build", label="track") as span:
+        span.rows = len(track) + len(heard_beacons)
+        m = create_base_map()
+        positions = track.tolist() + [[lat, lon] for lon, lat in heard_beacons["Coordinates"]]
+        if len(track) >= 2:
+            folium.PolyLine(track.tolist(), tooltip="Recorded path", **TRACK_STYLE).add_to(m)
+            folium.CircleMarker(track[0].tolist(), radius=6, color="green", fill=True, fill_opacity=1, tooltip="Start").add_to(m)
+            folium.CircleMarker(track[-1].tolist(), radius=6, color="black", fill=True, fill_opacity=1, tooltip="End").add_to(m)
+        if len(heard_beacons):
+            group = folium.FeatureGroup(name=f"Heard beacons ({len(heard_beacons)})")
+            group.add_to(m)
+            add_heard_markers(group, heard_beacons, cluster_threshold)
+            folium.LayerControl(collapsed=False).add_to(m)
+
+        bounds = None
+        if positions:
+            points = np.asarray(positions, dtype=float)
+            bounds = [points.min(axis=0).tolist(), points.max(axis=0).tolist()]
+            m.fit_bounds(bounds)
+        return m, bounds
+
+def render_map(m, width, height):
+    """Show a folium map in the page, timed as the "map render" stage.
+
+    The HTML is generated once per map object, so maps kept in session state are not
+    rendered again on every rerun.
+    """
+    with perf.timed("map render") as span:
+        with _rendered_html_lock:
+            html = _rendered_html.get(m)
+        span.cache = "miss" if html is None else "hit"
+        if html is None:
+            html = folium.Figure().add_child(m).render()
+            with _rendered_html_lock:
+                _rendered_html[m] = html
+        span.bytes = len(html)
+        if hasattr(st, "iframe"):
+            # Newer Streamlit deprecates components.html, with a warning logged on every call
+            st.iframe(html, width=width, height=height + 10)
+        else:
+            components.html(html, height=height + 10, width=width)
+
+def _build_unheard_map(level_results, cluster_threshold, dead_zones):
+    m = create_base_map()
+    level_bounds = [level_geometry["bounds"] for _, level_geometry, _ in level_results if level_geometry["bounds"]]
+
+    if len(level_results) == 1:
+        level_name, level_geometry, unheard_beacons = level_results[0]
+        if level_geometry["features"]["features"]:
+            folium.GeoJson(level_geometry["features"]).add_to(m)
+        if dead_zones is not None:
+            add_dead_zones(m, dead_zones[dead_zones["Level"] == level_name])
+        add_unheard_markers(m, unheard_beacons, cluster_threshold)
+    else:
+        for index, (level_name, level_geometry, unheard_beacons) in enumerate(level_results):
+            group = folium.FeatureGroup(name=f"{level_name} ({len(unheard_beacons)} unheard)", show=(index == 0))
+            group.add_to(m)
+            if level_geometry["features"]["features"]:
+                LazyGeoJson(m, group, level_geometry["features"]).add_to(m)
+            if dead_zones is not None:
+                add_dead_zones(group, dead_zones[dead_zones["Level"] == level_name])
+            add_unheard_markers(group, unheard_beacons, cluster_threshold)
+        folium.LayerControl(collapsed=False).add_to(m)
+
+    bounds = None
+    if level_bounds:
+        bounds = [
+            [min(b[0][0] for b in level_bounds), min(b[0][1] for b in level_bounds)],
+            [max(b[1][0] for b in level_bounds), max(b[1][1] for b in level_bounds)],
+        ]
+        m.fit_bounds(bounds)
+    return m, bounds
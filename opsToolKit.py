@@ -1,25 +1,28 @@
 import streamlit as st
-from datetime import datetime, timedelta
-import requests
-from utils import (
- validate_email   
-)
+import auth
+import perf
+from styles import image_url
+from warmup import start_warmup
+
+# Heavy libraries (pandas, pyarrow, folium) are only imported by the pages using them;
+# a background thread preloads them on the first run of the server process
+start_warmup()
 
 
 if "role" not in st.session_state:
     st.session_state.role = None  
 
-if 'Token' not in st.session_state: 
-    st.session_state.Token="None" 
-
 if 'token_expiry' not in st.session_state: 
-    st.session_state.token_expiry="1970-01-10" 
+    st.session_state.token_expiry = None
 
-TOKEN_EXPIRY_TIME = timedelta(hours=1)  # Define token expiry time    
+# Ends the session once the token has lapsed, so pages never call the planner with it
+auth.current_token()
 
 def loginPage(): 
+    if st.session_state.get("auth_message"):
+        st.info(st.session_state.auth_message)
     # Input fields
-    email = st.text_input("Email")
+    email = st.text_input("Email", value=st.session_state.get("user_email", ""))
     password = st.text_input("Password", type="password") 
     st.markdown("###### Login using your BP Credentials")  
     # Validate email and password
@@ -30,12 +33,10 @@ def loginPage():
             st.error("Invalid email format. Please enter a valid email address.")
         else:
             try:
-                token = login(email, password)
+                token = auth.login(email, password)
                 if token:
-                    st.session_state.token = token
-                    st.session_state.token_expiry = datetime.now() + TOKEN_EXPIRY_TIME 
+                    auth.start_session(email, token)
                     st.success("Login successful!")
-                    st.session_state.role="Pointr"
                     st.rerun()  # Rerun to display the content of the next page 
                 else:
                     st.error("Login failed. Check your username/password.")
@@ -43,19 +44,6 @@ def loginPage():
                 st.error(f"An error occurred during the login process: {str(e)}")    
 
 
-def login(email, password):
-    payload = {"email": email, "password": password}
-    try:
-        LOGIN_API_URL = "https://planner.pointr.tech/login-api/login"
-        response = requests.post(LOGIN_API_URL, json=payload)
-        response.raise_for_status()  # Raise an error for bad responses
-        data = response.json()
-        token = data.get("token") 
-        return token
-    except requests.RequestException as e: 
-        return None
-
-
 def validate_email(email):
     """Validate the email format."""
     import re
@@ -65,7 +53,7 @@ def validate_email(email):
     return False
 
 def logout():
-    st.session_state.role = None
+    auth.end_session()
     st.rerun()
 
 role = st.session_state.role
@@ -93,7 +81,7 @@ account_pages = [logout_page]
 profiler_pages = [basicProfiler, unheardList,UnheardMapView]  
 
 st.markdown("#### OPS Tool kit")
-st.logo("images/horizontal_blue.png", icon_image="images/icon_blue.png")   
+st.logo(image_url("images/horizontal_blue.png"), icon_image=image_url("images/icon_blue.png"))   
 
 page_dict = {}
 
@@ -103,4 +91,15 @@ if len(page_dict) > 0:
     pg = st.navigation({"Account": account_pages} | page_dict)  
 else:
     pg = st.navigation([st.Page(loginPage)])  
-pg.run()
\ No newline at end of file
+
+# Prometheus scrape endpoint, only when OPSTOOLKIT_METRICS_PORT is set
+perf.start_metrics_server()
+show_perf_panel = st.sidebar.toggle("Show performance panel", key='show_perf_panel')
+if st.session_state.role is not None:
+    auth.render_session_status()
+    auth.watch_session()
+pg.run()
+# Rendered after the page so it includes this run's timings
+if show_perf_panel:
+    from perf_panel import render_perf_panel
+    render_perf_panel()
\ No newline at end of file
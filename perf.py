@@ -0,0 +1,158 @@
+# perf.py
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latest individual measurements kept for the performance panel
+RECENT_EVENTS = 200
+# Optional port for a Prometheus scrape endpoint at /metrics
+METRICS_PORT = os.environ.get("OPSTOOLKIT_METRICS_PORT")
+METRIC_PREFIX = "opstoolkit"
+
+_stages = {}
+_recent = deque(maxlen=RECENT_EVENTS)
+_lock = threading.Lock()
+_server = None
+
+class Span:
+    """One timed stage; code inside perf.timed() may set bytes, rows and cache."""
+
+    __slots__ = ("stage", "label", "bytes", "rows", "cache", "seconds")
+
+    def __init__(self, stage, label=None):
+        self.stage = stage
+        self.label = label
+        self.bytes = None
+        self.rows = None
+        self.cache = None
+        self.seconds = 0.0
+
+def _new_stats():
+    return {"calls": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0, "rows": 0, "cache": {}}
+
+def record(span, failed=False):
+    """Add a finished span to the stage totals and the recent events."""
+    with _lock:
+        stats = _stages.setdefault(span.stage, _new_stats())
+        stats["calls"] += 1
+        stats["errors"] += int(failed)
+        stats["seconds"] += span.seconds
+        stats["max_seconds"] = max(stats["max_seconds"], span.seconds)
+        stats["bytes"] += span.bytes or 0
+        stats["rows"] += span.rows or 0
+        if span.cache is not None:
+            stats["cache"][span.cache] = stats["cache"].get(span.cache, 0) + 1
+        _recent.append({
+            "time": time.time(),
+            "stage": span.stage,
+            "label": span.label,
+            "seconds": span.seconds,
+            "bytes": span.bytes,
+            "rows": span.rows,
+            "cache": span.cache,
+            "error": failed,
+        })
+
+@contextmanager
+def timed(stage, label=None):
+    """Time the enclosed block as one call of stage and yield its Span.
+
+    Also usable as a decorator when there is nothing to add to the span. Exceptions
+    are counted as errors of the stage and re-raised.
+    """
+    span = Span(stage, label)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        span.seconds = time.perf_counter() - started
+        record(span, failed=True)
+        raise
+    span.seconds = time.perf_counter() - started
+    record(span)
+
+def snapshot():
+    """Return a copy of the per-stage totals: {stage: stats}."""
+    with _lock:
+        return {stage: {**stats, "cache": dict(stats["cache"])} for stage, stats in _stages.items()}
+
+def recent_events(limit=RECENT_EVENTS):
+    """Return the latest measurements, newest first."""
+    with _lock:
+        return list(_recent)[::-1][:limit]
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _recent.clear()
+
+def to_json():
+    return json.dumps({"stages": snapshot(), "recent": recent_events()}, indent=2)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def to_prometheus():
+    """Render the per-stage totals in the Prometheus text exposition format."""
+    metrics = [
+        ("stage_seconds", "summary", "Time spent per stage."),
+        ("stage_errors_total", "counter", "Calls of a stage that raised."),
+        ("stage_max_seconds", "gauge", "Slowest call of a stage since start."),
+        ("stage_bytes_total", "counter", "Payload bytes handled per stage."),
+        ("stage_rows_total", "counter", "Rows produced per stage."),
+        ("stage_cache_total", "counter", "Calls per stage by cache outcome."),
+    ]
+    stages = snapshot()
+    lines = []
+    for name, kind, help_text in metrics:
+        metric = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for stage, stats in sorted(stages.items()):
+            labels = f'stage="{_escape(stage)}"'
+            if name == "stage_seconds":
+                lines.append(f"{metric}_count{{{labels}}} {stats['calls']}")
+                lines.append(f"{metric}_sum{{{labels}}} {stats['seconds']:.6f}")
+            elif name == "stage_errors_total":
+                lines.append(f"{metric}{{{labels}}} {stats['errors']}")
+            elif name == "stage_max_seconds":
+                lines.append(f"{metric}{{{labels}}} {stats['max_seconds']:.6f}")
+            elif name == "stage_bytes_total":
+                lines.append(f"{metric}{{{labels}}} {stats['bytes']}")
+            elif name == "stage_rows_total":
+                lines.append(f"{metric}{{{labels}}} {stats['rows']}")
+            else:
+                for outcome, count in sorted(stats["cache"].items()):
+                    lines.append(f'{metric}{{{labels},cache="{_escape(outcome)}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = to_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics for Prometheus on port from a background thread, once per process."""
+    global _server
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+        _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
@@ -0,0 +1,44 @@
+# perf_panel.py
+
+import pandas as pd
+import streamlit as st
+import perf
+
+def _stage_table(stages):
+    rows = []
+    for stage, stats in sorted(stages.items()):
+        lookups = sum(stats["cache"].values())
+        rows.append({
+            "Stage": stage,
+            "Calls": stats["calls"],
+            "Mean ms": round(stats["seconds"] / stats["calls"] * 1000, 1) if stats["calls"] else 0.0,
+            "Max ms": round(stats["max_seconds"] * 1000, 1),
+            "MB": round(stats["bytes"] / 1e6, 2),
+            "Rows": stats["rows"],
+            "Hit rate": f"{stats['cache'].get('hit', 0) / lookups:.0%}" if lookups else "",
+            "Errors": stats["errors"],
+        })
+    return pd.DataFrame(rows)
+
+def render_perf_panel():
+    """Sidebar panel with per-stage timings of this server process and their exports."""
+    with st.sidebar.expander("Performance", expanded=True):
+        stages = perf.snapshot()
+        if not stages:
+            st.caption("Nothing measured yet.")
+            return
+        st.dataframe(_stage_table(stages), hide_index=True, use_container_width=True)
+
+        recent = pd.DataFrame(perf.recent_events(20))
+        recent["ms"] = (recent["seconds"] * 1000).round(1)
+        st.caption("Latest calls")
+        st.dataframe(recent[["stage", "label", "ms", "bytes", "cache"]], hide_index=True, use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("JSON", data=perf.to_json(), file_name="opstoolkit_perf.json", mime="application/json")
+        with col2:
+            st.download_button("Prometheus", data=perf.to_prometheus(), file_name="opstoolkit_perf.prom", mime="text/plain")
+        if st.button("Reset timings"):
+            perf.reset()
+            st.rerun()
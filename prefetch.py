@@ -0,0 +1,149 @@
+# prefetch.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+import auth
+from api_utils import (
+    planner_get_sized,
+    cache_scope,
+    cache_ttl,
+    PlannerAuthError,
+    CLIENTS_PATH,
+    SITES_PATH,
+    BUILDINGS_PATH,
+    LEVELS_PATH,
+    GEOJSON_PATH,
+    BEACON_TYPES_PATH,
+    DEFAULT_TIMEOUT,
+    GEOJSON_TIMEOUT,
+)
+
+PREFETCH_MAX_WORKERS = 8
+PREFETCH_MAX_ENTRIES = 1024
+# Decoded responses kept in memory; repeats beyond it come from the api_cache disk copy
+PREFETCH_MAX_BYTES = int(os.environ.get("OPSTOOLKIT_PREFETCH_MB", "256")) * 1024 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="planner-prefetch")
+# (scope, path) -> [future, expires_at, response bytes], least recently used first
+_futures = OrderedDict()
+_futures_bytes = 0
+_futures_lock = threading.Lock()
+
+def _submit(path, token, timeout):
+    """Return the in-flight or finished fetch of path, starting one if there is none.
+
+    Fetches are shared per user (see api_utils.cache_scope), not per token, and a
+    finished fetch is only reused for its endpoint's cache lifetime. Finished fetches
+    are kept least recently used first within PREFETCH_MAX_BYTES of response bodies.
+    The future's result is (data, size).
+    """
+    key = (cache_scope(token), path)
+    now = time.monotonic()
+    with _futures_lock:
+        entry = _futures.get(key)
+        if entry is not None and not (entry[0].done() and entry[1] <= now):
+            _futures.move_to_end(key)
+            return entry[0]
+        _pop(key)
+        future = _executor.submit(planner_get_sized, path, token, timeout)
+        _futures[key] = [future, now + cache_ttl(path), 0]
+    # Outside the lock: the callback runs at once if the fetch has already finished
+    future.add_done_callback(lambda done: _account(key, done))
+    return future
+
+def _account(key, future):
+    """Count a finished fetch's response size and evict the least recently used finished fetches above the budgets."""
+    global _futures_bytes
+    with _futures_lock:
+        entry = _futures.get(key)
+        if entry is None or entry[0] is not future:
+            return
+        if future.exception() is None:
+            entry[2] = future.result()[1] or 0
+            _futures_bytes += entry[2]
+        if _futures_bytes > PREFETCH_MAX_BYTES or len(_futures) > PREFETCH_MAX_ENTRIES:
+            for stale in [k for k, (value, _, _) in _futures.items() if value.done() and k != key]:
+                if _futures_bytes <= PREFETCH_MAX_BYTES and len(_futures) <= PREFETCH_MAX_ENTRIES:
+                    break
+                _pop(stale)
+
+def _pop(key):
+    """Forget a fetch; the caller holds _futures_lock."""
+    global _futures_bytes
+    entry = _futures.pop(key, None)
+    if entry is not None:
+        _futures_bytes -= entry[2]
+
+def _discard(path, token, future):
+    key = (cache_scope(token), path)
+    with _futures_lock:
+        if _futures.get(key, (None,))[0] is future:
+            _pop(key)
+
+def _result(path, token, timeout, what):
+    """Wait for the fetch of path and return its JSON; failures are shown on the page and return []."""
+    future = _submit(path, token, timeout)
+    try:
+        return future.result()[0]
+    except PlannerAuthError:
+        _discard(path, token, future)
+        auth.expire_session()
+        return []
+    except Exception as e:
+        # Drop failed fetches so the next rerun tries again
+        _discard(path, token, future)
+        st.error(f"An error occurred while fetching {what}: {str(e)}")
+        return []
+
+def _prefetch_level_geojson(levels_future, token):
+    if levels_future.exception() is not None:
+        return
+    for level in levels_future.result()[0] or []:
+        _submit(GEOJSON_PATH.format(level_id=level["_id"]), token, GEOJSON_TIMEOUT)
+
+def prefetch_site(buildings, token, first_building_id=None, include_geojson=False):
+    """Start fetching the levels of every building of a site in the background.
+
+    At most PREFETCH_MAX_WORKERS requests run at once. first_building_id is queued
+    ahead of the others, and include_geojson also queues every level's GeoJSON as
+    soon as its building's levels arrive.
+    """
+    building_ids = [building["_id"] for building in buildings]
+    if first_building_id in building_ids:
+        building_ids.remove(first_building_id)
+        building_ids.insert(0, first_building_id)
+
+    for building_id in building_ids:
+        future = _submit(LEVELS_PATH.format(building_id=building_id), token, DEFAULT_TIMEOUT)
+        if include_geojson:
+            future.add_done_callback(lambda done: _prefetch_level_geojson(done, token))
+
+def get_levels(building_id, token):
+    """Return the levels of a building, served from memory once fetched or prefetched."""
+    return _result(LEVELS_PATH.format(building_id=building_id), token, DEFAULT_TIMEOUT, "levels")
+
+def get_geojson(level_id, token):
+    """Return the GeoJSON of a level, served from memory once fetched or prefetched."""
+    return _result(GEOJSON_PATH.format(level_id=level_id), token, GEOJSON_TIMEOUT, "level GeoJSON")
+
+def get_geojsons(level_ids, token):
+    """Fetch the GeoJSON of several levels concurrently and return them in the same order."""
+    for level_id in level_ids:
+        _submit(GEOJSON_PATH.format(level_id=level_id), token, GEOJSON_TIMEOUT)
+    return [get_geojson(level_id, token) for level_id in level_ids]
+
+def fetch_clients(token):
+    return _result(CLIENTS_PATH, token, DEFAULT_TIMEOUT, "clients")
+
+def fetch_sites(client_id, token):
+    return _result(SITES_PATH.format(client_id=client_id), token, DEFAULT_TIMEOUT, "sites")
+
+def fetch_building(site_id, token):
+    return _result(BUILDINGS_PATH.format(site_id=site_id), token, DEFAULT_TIMEOUT, "buildings")
+
+def fetch_beaconsType(site_id, token):
+    return _result(BEACON_TYPES_PATH.format(site_id=site_id), token, DEFAULT_TIMEOUT, "beacon types")
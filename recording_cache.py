@@ -0,0 +1,102 @@
+# recording_cache.py
+
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import perf
+
+RECORDING_CACHE_MAX_BYTES = int(os.environ.get("OPSTOOLKIT_RECORDING_CACHE_MB", "512")) * 1024 * 1024
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+MAX_REMEMBERED_UPLOADS = 4096
+
+_entries = OrderedDict()
+_entries_bytes = 0
+_hashes = {}
+_lock = threading.Lock()
+
+def content_hash(file):
+    """Return the BLAKE2b digest of an uploaded file's bytes.
+
+    The digest is remembered per upload (Streamlit's file_id) so reruns do not rehash
+    the same upload; identical bytes uploaded twice still share one digest.
+    """
+    upload_key = (getattr(file, "file_id", None), getattr(file, "size", None))
+    if upload_key[0] is not None:
+        with _lock:
+            digest = _hashes.get(upload_key)
+        if digest is not None:
+            return digest
+
+    hasher = hashlib.blake2b(digest_size=20)
+    with file.getbuffer() as buffer:
+        for start in range(0, len(buffer), HASH_BLOCK_SIZE):
+            hasher.update(buffer[start:start + HASH_BLOCK_SIZE])
+    digest = hasher.hexdigest()
+
+    if upload_key[0] is not None:
+        with _lock:
+            if len(_hashes) >= MAX_REMEMBERED_UPLOADS:
+                _hashes.clear()
+            _hashes[upload_key] = digest
+    return digest
+
+def estimate_size(value):
+    """Rough in-memory size in bytes of a cached value."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray) or isinstance(getattr(value, "nbytes", None), int):
+        # Arrays and array-backed containers such as timeseries.TimeSeries
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+def get(file, kind):
+    """Return the cached value of kind for this file's content, or None."""
+    key = (content_hash(file), kind)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        _entries.move_to_end(key)
+        return entry[0]
+
+def put(file, kind, value):
+    """Cache value under this file's content hash and evict least recently used entries above the budget."""
+    global _entries_bytes
+    key = (content_hash(file), kind)
+    size = estimate_size(value)
+    with _lock:
+        previous = _entries.pop(key, None)
+        if previous is not None:
+            _entries_bytes -= previous[1]
+        _entries[key] = (value, size)
+        _entries_bytes += size
+        while _entries_bytes > RECORDING_CACHE_MAX_BYTES and len(_entries) > 1:
+            _, (_, evicted_size) = _entries.popitem(last=False)
+            _entries_bytes -= evicted_size
+
+def _kind_name(kind):
+    return str(kind[0] if isinstance(kind, tuple) else kind)
+
+def cached(file, kind, compute):
+    """Return compute(file), memoized by the content hash of file and kind.
+
+    Timed as a "recording <kind>" stage with the file size and whether it was a cache hit.
+    """
+    with perf.timed(f"recording {_kind_name(kind)}", label=getattr(file, "name", None)) as span:
+        span.bytes = getattr(file, "size", None)
+        value = get(file, kind)
+        span.cache = "miss" if value is None else "hit"
+        if value is None:
+            value = compute(file)
+            put(file, kind, value)
+        return value
@@ -0,0 +1,102 @@
+# recording_reader.py
+
+import itertools
+import ijson
+from columnar_recording import (
+    COLUMNAR_EXTENSION,
+    is_columnar,
+    iter_columnar_records,
+    read_columnar_recording,
+    section_table,
+    write_columnar,
+)
+
+RECORDING_HEADER_SECTIONS = ("recordingInfo", "optionalNotes")
+RECORD_SECTIONS = ("beaconData", "gpsData", "sensorData")
+# File types accepted wherever a recording is uploaded
+RECORDING_FILE_TYPES = ["json", COLUMNAR_EXTENSION]
+DEFAULT_CHUNK_SIZE = 50000
+
+_VALUE_START_EVENTS = {"start_map", "start_array", "string", "number", "boolean", "null"}
+
+
+def iter_records(file, section, chunk_size=DEFAULT_CHUNK_SIZE, columns=None):
+    """Stream the records of a top-level array section in lists of at most chunk_size.
+
+    Only one chunk is held in memory at a time, so a recording with hundreds of MB
+    of readings can be walked without building the full JSON tree. Columnar
+    recordings yield DataFrames instead, holding only the requested columns;
+    JSON recordings ignore columns.
+    """
+    if is_columnar(file):
+        yield from iter_columnar_records(file, section, chunk_size, columns)
+        return
+    file.seek(0)
+    records = ijson.items(file, f"{section}.item", use_float=True)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_recording(file, sections=RECORDING_HEADER_SECTIONS, heads=None):
+    """Read selected top-level sections of a recording in a single streaming pass.
+
+    sections are built in full, heads maps an array section to the number of leading
+    records to keep (e.g. {"gpsData": 1}). Every top-level array is counted along the
+    way without being built. Returns (data, counts); counts holds the record count of
+    each top-level array and None for top-level values that are not arrays.
+    """
+    if is_columnar(file):
+        return read_columnar_recording(file, sections, heads)
+    heads = heads or {}
+    data, counts = {}, {}
+    key = item_prefix = builder = None
+    limit = count = 0
+
+    file.seek(0)
+    for prefix, event, value in ijson.parse(file, use_float=True):
+        if prefix == "":
+            if builder is not None:
+                data[key] = builder.value
+                builder = None
+            if event == "map_key":
+                key, item_prefix, count = value, f"{value}.item", 0
+                limit = heads.get(value, -1) if value not in sections else None
+                if value in sections or value in heads:
+                    builder = ijson.ObjectBuilder()
+            continue
+
+        if prefix == key:
+            if event == "start_array":
+                counts[key] = 0
+            elif event != "end_array":
+                counts[key] = None
+        elif prefix == item_prefix and event in _VALUE_START_EVENTS:
+            count += 1
+            counts[key] = count
+            if limit is not None and count > limit and builder is not None:
+                data[key] = builder.value
+                builder = None
+
+        if builder is not None:
+            builder.event(event, value)
+
+    return data, counts
+
+
+def convert_recording(file, sink, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Convert a JSON recording into the columnar format (see columnar_recording).
+
+    Header sections are kept as metadata and every top-level array becomes a typed
+    table, each streamed chunk by chunk. Returns the counts of the top-level arrays.
+    """
+    header, counts = read_recording(file, sections=RECORDING_HEADER_SECTIONS)
+    sections = {
+        name: section_table(iter_records(file, name, chunk_size))
+        for name, count in counts.items()
+        if count is not None
+    }
+    write_columnar(sink, header, counts, sections, chunk_size)
+    return counts
@@ -0,0 +1,254 @@
+# spatial_index.py
+
+import math
+import numpy as np
+import pandas as pd
+import perf
+from geometry import METRES_PER_DEGREE
+
+# Unheard beacons closer than this many typical beacon spacings belong to the same dead zone
+DEAD_ZONE_LINK_FACTOR = 2.0
+# Fewer unheard beacons than this together are reported as single failures, not a zone
+DEAD_ZONE_MIN_BEACONS = 3
+DEAD_ZONE_COLUMNS = ["Level", "Zone", "Beacons", "Area m²", "Latitude", "Longitude", "Hull"]
+
+def _cell_offsets(reach):
+    return [(dx, dy) for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)]
+
+_NEIGHBOUR_OFFSETS = _cell_offsets(1)
+
+
+def projection(longitudes, latitudes):
+    """Equirectangular projection around the points' mean position, fine at building scale: (origin, metres per degree)."""
+    latitude0 = float(np.nanmean(latitudes))
+    origin = np.array([np.nanmean(longitudes), latitude0])
+    return origin, np.array([METRES_PER_DEGREE * math.cos(math.radians(latitude0)), METRES_PER_DEGREE])
+
+def project(longitudes, latitudes, origin, scale):
+    """Positions in metres east and north of origin."""
+    return (np.column_stack([longitudes, latitudes]) - origin) * scale
+
+
+class GridIndex:
+    """Uniform grid over planar points for fixed-radius neighbour queries.
+
+    Points are sorted by cell once; the candidates of every point are the points in
+    the 3x3 cells around it, found with binary searches vectorized over all points,
+    so pairs within a radius up to the cell size are found without a tree. Neighbour
+    queries around arbitrary positions widen the block of cells for larger radii.
+    """
+
+    def __init__(self, xy, cell_size):
+        self.xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self.cell_size = float(cell_size)
+        cells = np.floor(self.xy / self.cell_size).astype(np.int64) if len(self.xy) else np.zeros((0, 2), dtype=np.int64)
+        # A margin of one cell keeps every neighbour cell of a point inside the key space
+        self._origin = cells.min(axis=0) - 1 if len(cells) else np.zeros(2, dtype=np.int64)
+        self._cells = cells - self._origin
+        self._width = int(self._cells[:, 1].max()) + 2 if len(cells) else 1
+        keys = self._cells[:, 0] * self._width + self._cells[:, 1]
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    def __len__(self):
+        return len(self.xy)
+
+    def _candidates(self, cells, offsets=_NEIGHBOUR_OFFSETS):
+        """(query, point) position pairs for every indexed point in the cells at offsets (3x3 by default) around each query cell."""
+        queries, points = [], []
+        for dx, dy in offsets:
+            column, row = cells[:, 0] + dx, cells[:, 1] + dy
+            inside = (column >= 0) & (row >= 0) & (row < self._width)
+            keys = np.where(inside, column * self._width + row, -1)
+            low = np.searchsorted(self._keys, keys, side="left")
+            counts = np.where(inside, np.searchsorted(self._keys, keys, side="right") - low, 0)
+            total = int(counts.sum())
+            if not total:
+                continue
+            run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+            queries.append(np.repeat(np.arange(len(cells)), counts))
+            points.append(self._order[np.repeat(low, counts) + np.arange(total) - run_starts])
+        if not queries:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(queries), np.concatenate(points)
+
+    def _distances(self, query_xy, queries, points):
+        offsets = self.xy[points] - query_xy[queries]
+        return np.hypot(offsets[:, 0], offsets[:, 1])
+
+    def neighbours(self, xy, radius):
+        """Return (query, point) positions of the indexed points within radius of each query point."""
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        cells = np.floor(xy / self.cell_size).astype(np.int64) - self._origin
+        reach = max(1, math.ceil(radius / self.cell_size))
+        queries, points = self._candidates(cells, _NEIGHBOUR_OFFSETS if reach == 1 else _cell_offsets(reach))
+        within = self._distances(xy, queries, points) <= radius
+        return queries[within], points[within]
+
+    def pairs_within(self, radius):
+        """Return (first, second) positions, first < second, of every pair of points within radius (<= cell size)."""
+        queries, points = self._candidates(self._cells)
+        keep = queries < points
+        queries, points = queries[keep], points[keep]
+        within = self._distances(self.xy, queries, points) <= radius
+        return queries[within], points[within]
+
+    def nearest_distances(self):
+        """Distance from each point to its nearest other point within the surrounding cells, inf if there is none."""
+        queries, points = self._candidates(self._cells)
+        other = queries != points
+        queries, points = queries[other], points[other]
+        nearest = np.full(len(self.xy), np.inf)
+        np.minimum.at(nearest, queries, self._distances(self.xy, queries, points))
+        return nearest
+
+
+def connected_components(count, first, second):
+    """Component label (its smallest member) of each of count nodes linked by the (first, second) edges."""
+    labels = np.arange(count)
+    while True:
+        linked = np.minimum(labels[first], labels[second])
+        updated = labels.copy()
+        np.minimum.at(updated, first, linked)
+        np.minimum.at(updated, second, linked)
+        # Pointer jumping: follow labels to their own label, halving chain lengths each pass
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels
+        labels = updated
+
+
+def convex_hull(xy):
+    """Positions of the convex hull of planar points, counter-clockwise (Andrew's monotone chain)."""
+    order = np.lexsort((xy[:, 1], xy[:, 0]))
+    if len(order) < 3:
+        return order
+
+    def cross(origin, a, b):
+        return (xy[a, 0] - xy[origin, 0]) * (xy[b, 1] - xy[origin, 1]) - (xy[a, 1] - xy[origin, 1]) * (xy[b, 0] - xy[origin, 0])
+
+    lower, upper = [], []
+    for position in order:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], position) <= 0:
+            lower.pop()
+        lower.append(position)
+    for position in order[::-1]:
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], position) <= 0:
+            upper.pop()
+        upper.append(position)
+    return np.asarray(lower[:-1] + upper[:-1], dtype=np.int64)
+
+
+def polygon_area(xy):
+    """Shoelace area of a closed ring given without its repeated first point."""
+    if len(xy) < 3:
+        return 0.0
+    x, y = xy[:, 0], xy[:, 1]
+    return float(abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2)
+
+
+class PlacedBeaconIndex:
+    """Spatial index over the placed beacons of every level of an unheard_audit placed index.
+
+    Each level gets its own GridIndex in metres. The typical beacon spacing of a level
+    (the median distance to the nearest neighbour) sets the link distance, and the
+    pairs of beacons within it are found once, so dead zones of any unheard set are a
+    connected-components pass over those precomputed pairs. The level grids also
+    answer which beacons lie near a position.
+    """
+
+    def __init__(self, placed_index, link_factor=DEAD_ZONE_LINK_FACTOR):
+        with perf.timed("spatial index") as span:
+            self.placed_index = placed_index
+            self.link_factor = link_factor
+            self.levels = {}
+            coordinates = placed_index["Coordinates"].tolist()
+            longitudes = np.array([_coordinate(point, 0) for point in coordinates], dtype=float)
+            latitudes = np.array([_coordinate(point, 1) for point in coordinates], dtype=float)
+            self.xy = np.full((len(placed_index), 2), np.nan)
+            first, second = [], []
+            for level, positions in placed_index.groupby("Level", sort=False).indices.items():
+                positions = positions[np.isfinite(longitudes[positions]) & np.isfinite(latitudes[positions])]
+                if not len(positions):
+                    continue
+                origin, scale = projection(longitudes[positions], latitudes[positions])
+                xy = project(longitudes[positions], latitudes[positions], origin, scale)
+                self.xy[positions] = xy
+                spacing = _typical_spacing(xy)
+                link = spacing * link_factor
+                grid = GridIndex(xy, link)
+                self.levels[level] = {"positions": positions, "grid": grid, "origin": origin, "scale": scale, "spacing": spacing, "link": link}
+                level_first, level_second = grid.pairs_within(link)
+                first.append(positions[level_first])
+                second.append(positions[level_second])
+            self.first = np.concatenate(first) if first else np.empty(0, dtype=np.int64)
+            self.second = np.concatenate(second) if second else np.empty(0, dtype=np.int64)
+            self.longitudes, self.latitudes = longitudes, latitudes
+            span.rows = len(placed_index)
+
+    def neighbours(self, level, longitude, latitude, radius):
+        """Rows of the placed index on level within radius metres of a position, nearest first, with their Distance m."""
+        entry = self.levels.get(level)
+        if entry is None:
+            return self.placed_index.iloc[:0].assign(**{"Distance m": pd.Series(dtype=float)})
+        xy = project([longitude], [latitude], entry["origin"], entry["scale"])
+        _, points = entry["grid"].neighbours(xy, radius)
+        distances = np.hypot(*(entry["grid"].xy[points] - xy).T)
+        order = np.argsort(distances, kind="stable")
+        rows = self.placed_index.iloc[entry["positions"][points[order]]]
+        return rows.assign(**{"Distance m": np.round(distances[order], 2)})
+
+    def dead_zones(self, unheard, min_beacons=DEAD_ZONE_MIN_BEACONS):
+        """Cluster unheard placed beacons into contiguous dead zones.
+
+        unheard is a boolean mask over the placed index rows. Unheard beacons within the
+        link distance of each other are joined; groups of at least min_beacons are zones.
+        Returns a table with DEAD_ZONE_COLUMNS, largest zone of each level first; Hull
+        is the zone's convex hull as [latitude, longitude] rows.
+        """
+        with perf.timed("dead zones") as span:
+            unheard = np.asarray(unheard, dtype=bool) & np.isfinite(self.xy[:, 0])
+            linked = unheard[self.first] & unheard[self.second]
+            labels = connected_components(len(unheard), self.first[linked], self.second[linked])
+            members = np.flatnonzero(unheard)
+            zone_labels, zone_sizes = np.unique(labels[members], return_counts=True)
+            large = zone_labels[zone_sizes >= min_beacons]
+            levels = self.placed_index["Level"].to_numpy()
+
+            rows = []
+            for label in large:
+                zone = members[labels[members] == label]
+                hull = zone[convex_hull(self.xy[zone])]
+                rows.append({
+                    "Level": levels[label],
+                    "Beacons": len(zone),
+                    "Area m²": round(polygon_area(self.xy[hull]), 1),
+                    "Latitude": float(self.latitudes[zone].mean()),
+                    "Longitude": float(self.longitudes[zone].mean()),
+                    "Hull": np.column_stack([self.latitudes[hull], self.longitudes[hull]]).tolist(),
+                })
+            span.rows = len(rows)
+            if not rows:
+                return pd.DataFrame(columns=DEAD_ZONE_COLUMNS)
+            zones = pd.DataFrame(rows).sort_values(["Level", "Beacons"], ascending=[True, False], kind="stable", ignore_index=True)
+            zones["Zone"] = zones.groupby("Level", sort=False).cumcount() + 1
+            return zones[DEAD_ZONE_COLUMNS]
+
+
+def _coordinate(point, axis):
+    try:
+        return float(point[axis])
+    except (TypeError, IndexError, ValueError):
+        return np.nan
+
+
+def _typical_spacing(xy):
+    """Median nearest-neighbour distance of a level's beacons in metres."""
+    if len(xy) < 2:
+        return 1.0
+    extent = np.ptp(xy, axis=0)
+    # A cell of about one beacon per cell finds most nearest neighbours in the 3x3 block
+    cell = max(math.sqrt(max(extent[0] * extent[1], 1.0) / len(xy)), 0.1)
+    nearest = GridIndex(xy, cell).nearest_distances()
+    nearest = nearest[np.isfinite(nearest) & (nearest > 0)]
+    return float(np.median(nearest)) if len(nearest) else cell
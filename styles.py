@@ -0,0 +1,25 @@
+# styles.py
+
+import base64
+import mimetypes
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def image_url(path):
+    """Data URL of a small image file, read once per process.
+
+    st.logo and st.image read and decode an image file on every rerun; a data URL
+    is passed through as is.
+    """
+    with open(path, "rb") as f:
+        data = base64.b64encode(f.read()).decode("ascii")
+    return f"data:{mimetypes.guess_type(path)[0] or 'image/png'};base64,{data}"
+
+def display_table(frame):
+    """A DataFrame converted once for st.dataframe / st.write.
+
+    Streamlit converts a pandas frame to Arrow on every call; a table kept in session
+    state in Arrow form is sent as is, so reruns that show it again skip the conversion.
+    """
+    import pyarrow as pa
+    return pa.Table.from_pandas(frame)
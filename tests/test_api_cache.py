@@ -0,0 +1,84 @@
+# tests/test_api_cache.py
+
+"""Expiry, revalidation and eviction of the on-disk planner response cache."""
+
+import hashlib
+import json
+from types import SimpleNamespace
+import pytest
+import api_cache
+import api_utils
+import perf
+from benchmarks.planner_stub import start_stub, STUB_TOKEN
+
+PATH = "/api/client/client-1/sites"
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    """A fresh cache under tmp_path whose clock the test moves forward."""
+    monkeypatch.setattr(api_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(api_cache, "API_CACHE_PATH", str(tmp_path / "planner_api.sqlite3"))
+    monkeypatch.setattr(api_cache, "_local", SimpleNamespace())
+    now = [1_000_000.0]
+    monkeypatch.setattr(api_cache, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def stub(clock, monkeypatch):
+    server = start_stub({PATH: [{"_id": "site-1", "name": "Site 1"}]})
+    monkeypatch.setattr(api_utils, "PLANNER_BASE_URL", server.url)
+    yield server
+    server.shutdown()
+
+
+def _set_body(server, path, body):
+    encoded = json.dumps(body).encode()
+    server.bodies[path] = (encoded, f'"{hashlib.blake2b(encoded, digest_size=8).hexdigest()}"')
+
+
+def test_entries_expire_after_their_ttl_and_refresh_extends_them(clock):
+    api_cache.put("key", b"body", 60, etag='"1"')
+    assert api_cache.is_fresh(api_cache.get("key"))
+    clock[0] += 61
+    stale = api_cache.get("key")
+    assert stale.body == b"body" and stale.etag == '"1"'
+    assert not api_cache.is_fresh(stale)
+    api_cache.refresh("key", 60)
+    assert api_cache.is_fresh(api_cache.get("key"))
+    assert api_cache.get("missing") is None
+
+
+def test_least_recently_used_entries_are_evicted_above_the_cap(clock, monkeypatch):
+    monkeypatch.setattr(api_cache, "API_CACHE_MAX_BYTES", 250)
+    for index in range(3):
+        api_cache.put(f"key{index}", b"x" * 100, 60)
+        clock[0] += api_cache.ACCESS_RESOLUTION + 1
+    assert api_cache.get("key0") is None
+    assert api_cache.get("key1") is not None and api_cache.get("key2") is not None
+
+
+def test_planner_get_serves_fresh_entries_and_revalidates_stale_ones(stub, clock):
+    ttl = api_utils.cache_ttl(PATH)
+    perf.reset()
+    first = api_utils.planner_get(PATH, STUB_TOKEN)
+    assert stub.requests == 1
+    # Fresh: answered from disk without a request
+    assert api_utils.planner_get(PATH, STUB_TOKEN) == first
+    assert stub.requests == 1
+
+    # Stale and unchanged: a conditional request, answered 304, extends the entry
+    clock[0] += ttl + 1
+    assert api_utils.planner_get(PATH, STUB_TOKEN) == first
+    assert stub.requests == 2
+    assert api_utils.planner_get(PATH, STUB_TOKEN) == first
+    assert stub.requests == 2
+
+    # Stale and changed: the new body replaces the entry
+    _set_body(stub, PATH, [{"_id": "site-2", "name": "Site 2"}])
+    clock[0] += ttl + 1
+    assert api_utils.planner_get(PATH, STUB_TOKEN) == [{"_id": "site-2", "name": "Site 2"}]
+    assert api_utils.planner_get(PATH, STUB_TOKEN) == [{"_id": "site-2", "name": "Site 2"}]
+    assert stub.requests == 3
+    assert perf.snapshot()[f"api GET {api_utils.endpoint(PATH)}"]["cache"] == {"miss": 2, "hit": 3, "revalidated": 1}
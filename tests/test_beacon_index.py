@@ -0,0 +1,27 @@
+# tests/test_beacon_index.py
+
+"""UUID factorization and key packing."""
+
+import numpy as np
+from beacon_index import factorize_uuids, local_key_set_from_records, pack_identities
+
+
+def test_factorize_uuids_ignores_case():
+    codes, table = factorize_uuids(["abc", "ABC", "def", "Abc"])
+    assert table == ["ABC", "DEF"]
+    assert codes.tolist() == [0, 0, 1, 0]
+
+
+def test_spellings_of_one_beacon_pack_to_one_key():
+    records = [
+        {"uuid": "abc", "major": 1, "minor": 2},
+        {"uuid": "ABC", "major": 1, "minor": 2},
+        {"uuid": "abc", "major": 1, "minor": 3},
+    ]
+    table, keys = local_key_set_from_records(records)
+    assert table == ["ABC"]
+    assert len(keys) == 2
+    assert np.array_equal(
+        pack_identities(np.asarray(["abc", "ABC"], dtype=object), [1, 1], [2, 2]),
+        pack_identities(np.asarray(["ABC", "ABC"], dtype=object), [1, 1], [2, 2]),
+    )
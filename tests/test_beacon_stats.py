@@ -0,0 +1,26 @@
+# tests/test_beacon_stats.py
+
+"""Per-beacon signal statistics across chunks and spellings."""
+
+from beacon_stats import chunk_signal_stats, merge_signal_stats, signal_stats_table
+
+
+def _reading(uuid, minor, rssi, timestamp):
+    return {"uuid": uuid, "major": 1, "minor": minor, "rssi": rssi, "timestamp": timestamp}
+
+
+def test_case_variants_of_one_beacon_are_one_row():
+    chunk = [_reading("abc", 2, -60, 1), _reading("ABC", 2, -80, 2), _reading("abc", 3, -70, 3)]
+    table = signal_stats_table(*merge_signal_stats([chunk_signal_stats(chunk)]))
+    assert table["Key"].is_unique
+    row = table[table["Minor"] == 2].iloc[0]
+    assert row["UUID"] == "ABC"
+    assert row["Readings"] == 2
+    assert row["Mean RSSI"] == -70.0
+
+
+def test_merging_chunks_matches_one_chunk():
+    readings = [_reading("abc", minor % 3, -50 - minor, minor) for minor in range(12)]
+    whole = signal_stats_table(*merge_signal_stats([chunk_signal_stats(readings)]))
+    parts = signal_stats_table(*merge_signal_stats(chunk_signal_stats(readings[i:i + 5]) for i in range(0, 12, 5)))
+    assert whole.equals(parts)
@@ -0,0 +1,34 @@
+# tests/test_ingest.py
+
+"""Parallel extraction of many recordings."""
+
+from benchmarks.synthetic import write_recording
+from ingest import extract_recordings, ingest_recordings
+
+
+def test_failures_with_the_same_file_name_are_counted_apart(tmp_path):
+    sources = []
+    for directory in ("a", "b"):
+        (tmp_path / directory).mkdir()
+        bad = tmp_path / directory / "recording.json"
+        bad.write_text('{"beaconData": [')
+        sources.append(bad)
+    good = tmp_path / "good.json"
+    write_recording(good, 200)
+    sources.append(good)
+
+    reported = []
+    parts, errors = extract_recordings(sources, on_progress=lambda done, total, name, error: reported.append((name, error)))
+    assert sorted(errors) == [0, 1]
+    assert list(parts) == [2]
+    assert {name for name, error in reported if error is not None} == {str(sources[0]), str(sources[1])}
+
+
+def test_heard_keys_are_unique_and_sorted(tmp_path):
+    paths = [tmp_path / f"recording{index}.json" for index in range(3)]
+    for index, path in enumerate(paths):
+        write_recording(path, 300, seed=index)
+    heard_keys, signal_stats, errors = ingest_recordings(paths)
+    assert not errors
+    assert (heard_keys[1:] > heard_keys[:-1]).all()
+    assert signal_stats["Readings"].sum() == 900
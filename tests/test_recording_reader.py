@@ -0,0 +1,43 @@
+# tests/test_recording_reader.py
+
+"""The streaming parser against loading the whole JSON with json.load."""
+
+import io
+import json
+import pytest
+from benchmarks.synthetic import write_recording
+from recording_reader import iter_records, read_recording, RECORD_SECTIONS
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = tmp_path / "recording.json"
+    write_recording(path, 1234, gps_points=77, sensor_samples=300)
+    with open(path, "rb") as file:
+        yield file, json.load(file)
+
+
+def test_records_match_json_load(recording):
+    file, loaded = recording
+    for section in RECORD_SECTIONS:
+        chunks = list(iter_records(file, section, chunk_size=100))
+        assert all(0 < len(chunk) <= 100 for chunk in chunks)
+        assert [record for chunk in chunks for record in chunk] == loaded[section]
+
+
+def test_header_counts_and_heads_match_json_load(recording):
+    file, loaded = recording
+    data, counts = read_recording(file, heads={"gpsData": 3})
+    assert data["recordingInfo"] == loaded["recordingInfo"]
+    assert data["gpsData"] == loaded["gpsData"][:3]
+    assert "beaconData" not in data
+    assert counts == {name: len(value) if isinstance(value, list) else None for name, value in loaded.items()}
+
+
+def test_non_array_sections_and_missing_sections():
+    recording = {"recordingInfo": {"os": "iOS"}, "optionalNotes": "note", "beaconData": "not a list", "gpsData": []}
+    file = io.BytesIO(json.dumps(recording).encode())
+    data, counts = read_recording(file, heads={"gpsData": 1})
+    assert data == {"recordingInfo": {"os": "iOS"}, "optionalNotes": "note", "gpsData": []}
+    assert counts == {"recordingInfo": None, "optionalNotes": None, "beaconData": None, "gpsData": 0}
+    assert list(iter_records(file, "sensorData")) == []
@@ -0,0 +1,142 @@
+# tests/test_spatial_index.py
+
+"""Vectorized grid, component and dead zone results against brute force."""
+
+import numpy as np
+from benchmarks.synthetic import placed_beacons
+from unheard_audit import index_placed_beacons
+from spatial_index import GridIndex, PlacedBeaconIndex, connected_components, DEAD_ZONE_MIN_BEACONS
+
+
+def _brute_pairs(xy, radius):
+    distances = np.hypot(xy[:, None, 0] - xy[None, :, 0], xy[:, None, 1] - xy[None, :, 1])
+    return set(zip(*(positions.tolist() for positions in np.nonzero(np.triu(distances <= radius, 1)))))
+
+
+def _brute_components(count, first, second):
+    """Sorted member lists of the components, found by depth-first search."""
+    adjacent = [[] for _ in range(count)]
+    for a, b in zip(first.tolist(), second.tolist()):
+        adjacent[a].append(b)
+        adjacent[b].append(a)
+    seen, components = set(), []
+    for start in range(count):
+        if start in seen:
+            continue
+        seen.add(start)
+        stack, members = [start], []
+        while stack:
+            node = stack.pop()
+            members.append(node)
+            for other in adjacent[node]:
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        components.append(sorted(members))
+    return sorted(components)
+
+
+def test_pairs_within_matches_brute_force():
+    rng = np.random.default_rng(1)
+    xy = rng.random((600, 2)) * 100
+    # Points on cell edges and duplicates are where a grid is easiest to get wrong
+    xy[:20] = np.floor(xy[:20] / 5) * 5
+    xy[20:30] = xy[30:40]
+    for radius in (1.0, 3.5, 5.0):
+        first, second = GridIndex(xy, 5.0).pairs_within(radius)
+        assert np.all(first < second)
+        assert set(zip(first.tolist(), second.tolist())) == _brute_pairs(xy, radius)
+
+
+def test_nearest_distances_matches_brute_force_within_cell():
+    rng = np.random.default_rng(2)
+    xy = rng.random((400, 2)) * 50
+    distances = np.hypot(xy[:, None, 0] - xy[None, :, 0], xy[:, None, 1] - xy[None, :, 1])
+    np.fill_diagonal(distances, np.inf)
+    nearest = GridIndex(xy, 5.0).nearest_distances()
+    expected = distances.min(axis=1)
+    # Neighbours further than a cell may be missed, and are then reported as inf or a farther candidate
+    close = expected <= 5.0
+    assert np.allclose(nearest[close], expected[close])
+
+
+def test_connected_components_matches_depth_first_search():
+    rng = np.random.default_rng(3)
+    count = 500
+    first = rng.integers(0, count, 400)
+    second = rng.integers(0, count, 400)
+    labels = connected_components(count, first, second)
+    components = {}
+    for node, label in enumerate(labels.tolist()):
+        components.setdefault(label, []).append(node)
+    # Each label is the smallest member of its component
+    assert all(label == members[0] for label, members in components.items())
+    assert sorted(components.values()) == _brute_components(count, first, second)
+
+
+def test_connected_components_without_edges():
+    empty = np.empty(0, dtype=np.int64)
+    assert connected_components(4, empty, empty).tolist() == [0, 1, 2, 3]
+
+
+def test_dead_zones_match_brute_force():
+    placed_index = index_placed_beacons(placed_beacons(5, 400).items())
+    index = PlacedBeaconIndex(placed_index)
+    rng = np.random.default_rng(4)
+    unheard = rng.random(len(placed_index)) < 0.3
+    levels = placed_index["Level"].to_numpy()
+
+    expected = []
+    for level, entry in index.levels.items():
+        positions = entry["positions"]
+        # The index's link pairs are exactly the beacon pairs within the link distance
+        pairs = _brute_pairs(index.xy[positions], entry["link"])
+        level_first = np.array([a for a, _ in pairs], dtype=np.int64)
+        level_second = np.array([b for _, b in pairs], dtype=np.int64)
+        on_level = levels[index.first] == level
+        assert set(zip(np.searchsorted(positions, index.first[on_level]).tolist(),
+                       np.searchsorted(positions, index.second[on_level]).tolist())) == pairs
+
+        dark = unheard[positions]
+        linked = dark[level_first] & dark[level_second]
+        for members in _brute_components(len(positions), level_first[linked], level_second[linked]):
+            if dark[members[0]] and len(members) >= DEAD_ZONE_MIN_BEACONS:
+                expected.append((level, len(members)))
+
+    zones = index.dead_zones(unheard)
+    assert sorted(zip(zones["Level"], zones["Beacons"])) == sorted(expected)
+    assert expected
+    # Largest zone first on each level, numbered from 1
+    for _, level_zones in zones.groupby("Level"):
+        assert level_zones["Beacons"].is_monotonic_decreasing
+        assert level_zones["Zone"].tolist() == list(range(1, len(level_zones) + 1))
+    assert (zones["Area m²"] >= 0).all()
+
+
+def test_grid_neighbours_match_brute_force_for_any_radius():
+    rng = np.random.default_rng(5)
+    xy = rng.random((500, 2)) * 100
+    queries = np.vstack([rng.random((40, 2)) * 120 - 10, xy[:10]])
+    grid = GridIndex(xy, 5.0)
+    for radius in (2.0, 5.0, 12.5):
+        query, point = grid.neighbours(queries, radius)
+        distances = np.hypot(queries[:, None, 0] - xy[None, :, 0], queries[:, None, 1] - xy[None, :, 1])
+        assert set(zip(query.tolist(), point.tolist())) == set(zip(*(p.tolist() for p in np.nonzero(distances <= radius))))
+
+
+def test_placed_beacon_neighbours_are_the_level_beacons_within_radius():
+    placed_index = index_placed_beacons(placed_beacons(2, 200).items())
+    index = PlacedBeaconIndex(placed_index)
+    level, entry = next(iter(index.levels.items()))
+    centre = entry["positions"][0]
+    longitude, latitude = index.longitudes[centre], index.latitudes[centre]
+    radius = entry["spacing"] * 3
+
+    near = index.neighbours(level, longitude, latitude, radius)
+    distances = np.hypot(*(index.xy[entry["positions"]] - index.xy[centre]).T)
+    expected = entry["positions"][distances <= radius]
+    assert sorted(near.index.tolist()) == sorted(placed_index.index[expected].tolist())
+    assert (near["Level"] == level).all()
+    assert near["Distance m"].is_monotonic_increasing
+    assert near.index[0] == placed_index.index[centre]
+    assert index.neighbours("no such level", longitude, latitude, radius).empty
@@ -0,0 +1,65 @@
+# tests/test_unheard_audit.py
+
+"""The running audit against recomputing from every current recording."""
+
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import placed_beacons, write_recording
+from beacon_index import to_global_keys
+from beacon_stats import extract_signal_stats, merge_signal_stats, signal_stats_table
+from unheard_audit import index_placed_beacons, find_unheard, RunningAudit
+
+
+def _recompute(placed_index, parts):
+    uuid_table, partial = merge_signal_stats(parts)
+    heard_keys = to_global_keys(uuid_table, partial.index.to_numpy())
+    return heard_keys, find_unheard(placed_index, heard_keys), signal_stats_table(uuid_table, partial)
+
+
+def test_adds_and_removes_match_a_full_recompute(tmp_path):
+    levels = placed_beacons(2, 150)
+    placed_index = index_placed_beacons(levels.items())
+    placed = [beacon for beacons in levels.values() for beacon in beacons]
+    parts = {}
+    for index in range(6):
+        path = tmp_path / f"recording{index}.json"
+        write_recording(path, 400, placed=placed, heard_share=0.3, seed=index)
+        with open(path, "rb") as file:
+            parts[f"r{index}"] = extract_signal_stats(file)
+
+    audit = RunningAudit(placed_index)
+    current = {}
+    steps = ["add r0", "add r1", "add r2", "remove r1", "add r3", "remove r0", "add r1", "add r4", "remove r3", "add r5", "remove r2"]
+    for position, step in enumerate(steps):
+        change, recording_id = step.split()
+        version = audit.version
+        if change == "add":
+            audit.add(recording_id, recording_id, parts[recording_id])
+            current[recording_id] = parts[recording_id]
+        else:
+            audit.remove(recording_id)
+            del current[recording_id]
+        assert audit.version > version
+
+        heard_keys, unheard, signal_stats = _recompute(placed_index, current.values())
+        assert np.array_equal(audit.heard_keys, heard_keys), step
+        pd.testing.assert_frame_equal(audit.unheard(), unheard)
+        # Every other step, so changes apply both to merged aggregates and to ones merged lazily
+        if position % 2:
+            pd.testing.assert_frame_equal(audit.signal_stats(), signal_stats)
+
+
+def test_switching_the_placed_index_keeps_the_heard_set(tmp_path):
+    levels = placed_beacons(2, 100)
+    path = tmp_path / "recording.json"
+    write_recording(path, 300, placed=[beacon for beacons in levels.values() for beacon in beacons], heard_share=0.5)
+    with open(path, "rb") as file:
+        part = extract_signal_stats(file)
+    audit = RunningAudit(index_placed_beacons(levels.items()))
+    audit.add("r", "recording.json", part)
+
+    level_index = index_placed_beacons([(0, levels[0])])
+    audit.set_placed_index(level_index)
+    _, unheard, _ = _recompute(level_index, [part])
+    pd.testing.assert_frame_equal(audit.unheard(), unheard)
+    assert set(audit.unheard()["Level"]) <= {0}
@@ -0,0 +1,203 @@
+# timeseries.py
+
+import numpy as np
+import pandas as pd
+import perf
+from recording_reader import iter_records
+
+TIMESTAMP_FIELD = "timestamp"
+SENSOR_TYPE_FIELD = "type"
+GPS_STREAM = "GPS"
+SENSOR_STREAM = "Sensor"
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+# Points drawn per chart by default, about one per horizontal pixel of a page-wide chart
+DEFAULT_CHART_POINTS = 1000
+
+
+def epoch_seconds(timestamps):
+    """Recorder timestamps as float epoch seconds; anything past 1e11 can only be milliseconds."""
+    timestamps = np.asarray(timestamps, dtype=float)
+    return timestamps / 1000 if np.nanmax(timestamps, initial=0) > 1e11 else timestamps
+
+
+class TimeSeries:
+    """Samples of one stream sorted by time: epoch seconds and one float array per channel.
+
+    Range queries are binary searches on the sorted times, so a window of a stream with
+    millions of samples is a pair of array views.
+    """
+
+    def __init__(self, times, channels):
+        order = None if np.all(times[1:] >= times[:-1]) else np.argsort(times, kind="stable")
+        self.times = times if order is None else times[order]
+        self.channels = {name: values if order is None else values[order] for name, values in channels.items()}
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + sum(values.nbytes for values in self.channels.values())
+
+    @property
+    def start(self):
+        return float(self.times[0]) if len(self.times) else 0.0
+
+    @property
+    def end(self):
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+    def window(self, start=None, end=None):
+        """Return the slice of positions with start <= time <= end."""
+        first = 0 if start is None else int(np.searchsorted(self.times, start, side="left"))
+        last = len(self.times) if end is None else int(np.searchsorted(self.times, end, side="right"))
+        return slice(first, last)
+
+    def interpolate(self, times, channel):
+        """Values of channel at times, linear between samples and NaN outside the recorded range."""
+        values = self.channels[channel]
+        known = np.isfinite(values)
+        known_times, known_values = self.times[known], values[known]
+        times = np.asarray(times, dtype=float)
+        if not len(known_times):
+            return np.full(len(times), np.nan)
+        result = np.interp(times, known_times, known_values)
+        result[(times < known_times[0]) | (times > known_times[-1])] = np.nan
+        return result
+
+    def downsample(self, start=None, end=None, points=DEFAULT_CHART_POINTS, channels=None, method="lttb"):
+        """Return at most points samples per channel of the window as a long Time / Channel / Value table.
+
+        method is "lttb" (Largest-Triangle-Three-Buckets, keeps the visual shape) or
+        "minmax" (the extremes of each bucket, keeps every spike). Each channel is
+        reduced on its own, skipping missing values.
+        """
+        with perf.timed("downsample", label=method) as span:
+            positions = self.window(start, end)
+            times = self.times[positions]
+            frames = []
+            for name in channels or list(self.channels):
+                values = self.channels[name][positions]
+                valid = np.isfinite(values)
+                channel_times, channel_values = times[valid], values[valid]
+                picked = _PICKERS[method](channel_times, channel_values, points)
+                frames.append(pd.DataFrame({
+                    "Time": pd.to_datetime(channel_times[picked], unit="s"),
+                    "Channel": name,
+                    "Value": channel_values[picked],
+                }))
+            span.rows = positions.stop - positions.start
+            if not frames:
+                return pd.DataFrame(columns=["Time", "Channel", "Value"])
+            return pd.concat(frames, ignore_index=True)
+
+
+def lttb_indices(times, values, points):
+    """Positions kept by Largest-Triangle-Three-Buckets when reducing a series to points samples.
+
+    The first and last samples are kept; of every bucket in between, the sample forming
+    the largest triangle with the previously kept sample and the next bucket's mean.
+    """
+    count = len(times)
+    if points >= count or points < 3:
+        return np.arange(count)
+    edges = np.linspace(1, count - 1, points - 1).astype(np.int64)
+    # Bucket means of every bucket in one pass, plus the last sample as the final "bucket"
+    sizes = np.diff(edges)
+    time_means = np.append(np.add.reduceat(times[1:count - 1], edges[:-1] - 1) / sizes, times[-1])
+    value_means = np.append(np.add.reduceat(values[1:count - 1], edges[:-1] - 1) / sizes, values[-1])
+
+    picked = np.empty(points, dtype=np.int64)
+    picked[0], picked[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(points - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        bucket_times, bucket_values = times[low:high], values[low:high]
+        areas = np.abs(
+            (times[previous] - time_means[bucket + 1]) * (bucket_values - values[previous])
+            - (times[previous] - bucket_times) * (value_means[bucket + 1] - values[previous])
+        )
+        previous = low + int(np.argmax(areas))
+        picked[bucket + 1] = previous
+    return picked
+
+
+def minmax_indices(times, values, points):
+    """Positions of the minimum and maximum of each of points // 2 equal-count buckets, in order."""
+    count = len(values)
+    if points >= count or points < 2:
+        return np.arange(count)
+    buckets = points // 2
+    size = -(-count // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:count] = values
+    padded = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = offsets + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1)
+    highs = offsets + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1)
+    picked = np.unique(np.concatenate([lows, highs]))
+    return picked[picked < count]
+
+
+_PICKERS = {"lttb": lttb_indices, "minmax": minmax_indices}
+
+
+def _numeric_columns(frame):
+    """Float arrays of the numeric fields of a chunk; list fields such as values: [x, y, z] are split per element."""
+    columns = {}
+    for name in frame.columns:
+        if name in (TIMESTAMP_FIELD, SENSOR_TYPE_FIELD):
+            continue
+        column = frame[name]
+        first = column.dropna().iloc[0] if column.notna().any() else None
+        if isinstance(first, (list, tuple, np.ndarray)):
+            expanded = pd.DataFrame(column.map(lambda value: value if isinstance(value, (list, tuple, np.ndarray)) else []).tolist(), index=frame.index)
+            for position in expanded.columns:
+                columns[f"{name}[{position}]"] = pd.to_numeric(expanded[position], errors="coerce").to_numpy(dtype=float)
+            continue
+        values = pd.to_numeric(column, errors="coerce")
+        if values.notna().any():
+            columns[name] = values.to_numpy(dtype=float)
+    return columns
+
+
+def build_streams(file, section, name):
+    """Stream one record section into {stream name: TimeSeries}.
+
+    Records are split into one stream per value of their type field (e.g. one per
+    sensor), named "<name>: <type>", or kept as a single stream called name. Records
+    without a timestamp are skipped.
+    """
+    with perf.timed("build streams", label=section) as span:
+        parts = {}
+        for chunk in iter_records(file, section):
+            frame = chunk if isinstance(chunk, pd.DataFrame) else pd.DataFrame(chunk)
+            if TIMESTAMP_FIELD not in frame.columns or frame.empty:
+                continue
+            times = pd.to_numeric(frame[TIMESTAMP_FIELD], errors="coerce")
+            frame = frame[times.notna()]
+            if SENSOR_TYPE_FIELD in frame.columns:
+                groups = frame.groupby(frame[SENSOR_TYPE_FIELD].astype(str), sort=False)
+            else:
+                groups = [(None, frame)]
+            for stream_type, group in groups:
+                stream = name if stream_type is None else f"{name}: {stream_type}"
+                parts.setdefault(stream, []).append((times[group.index].to_numpy(dtype=float), _numeric_columns(group)))
+
+        streams = {}
+        span.rows = 0
+        for stream, chunks in parts.items():
+            channel_names = list(dict.fromkeys(channel for _, channels in chunks for channel in channels))
+            # A channel missing from a chunk is filled with NaN so positions stay aligned with times
+            channels = {
+                channel: np.concatenate([chunk_channels.get(channel, np.full(len(chunk_times), np.nan)) for chunk_times, chunk_channels in chunks])
+                for channel in channel_names
+            }
+            streams[stream] = TimeSeries(epoch_seconds(np.concatenate([chunk_times for chunk_times, _ in chunks])), channels)
+            span.rows += len(streams[stream])
+        return streams
+
+
+def build_recording_streams(file):
+    """Time-indexed GPS and sensor streams of a recording, GPS first."""
+    return build_streams(file, "gpsData", GPS_STREAM) | build_streams(file, "sensorData", SENSOR_STREAM)
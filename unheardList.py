@@ -1,24 +1,94 @@
 import streamlit as st
-import pandas as pd
-import json
-from api_utils import fetch_clients, fetch_sites, fetch_building, fetch_levels
-from datetime import datetime
-
-def extract_beacons_from_json(data):
-    """Extract beacons from uploaded JSON data."""
-    return [
-        {
-            "uuid": beacon["uuid"].upper(),
-            "major": int(beacon["major"]),
-            "minor": int(beacon["minor"])
-        }
-        for beacon in data.get("beaconData", [])
-    ]
+import auth
+from lookups import name_index
+from prefetch import fetch_clients, fetch_sites, fetch_building, prefetch_site, get_levels
+from ingest import sync_audit_with_progress
+from recording_reader import RECORDING_FILE_TYPES
+from unheard_audit import (
+    index_placed_beacons,
+    compare_heard,
+    comparison_summary,
+    RunningAudit,
+    BEACON_KEY_COLUMNS,
+    NEWLY_UNHEARD,
+    STILL_UNHEARD,
+    NEWLY_HEARD,
+    STILL_HEARD,
+)
+from beacon_stats import WEAK_RSSI_THRESHOLD
+from styles import display_table
 
 #st.markdown("#### Advanced Profiler") 
 
+def recording_set(label, key):
+    """Uploader of one side of a comparison and its running audit; returns (uploaded_files, audit)."""
+    uploaded_files = st.file_uploader(label, type=RECORDING_FILE_TYPES, accept_multiple_files=True, key=f"{key}_files")
+    if key not in st.session_state:
+        st.session_state[key] = RunningAudit()
+    audit = st.session_state[key]
+    audit.set_placed_index(st.session_state.placed_index)
+    return uploaded_files, audit
+
+def comparison_view(selected_level_name):
+    """Newly heard, newly unheard and still unheard beacons per level between two recording sets.
+
+    Each side is a running audit, so adding a recording to either side parses only that
+    recording, and recordings parsed before (on this or another page) come from the
+    recording cache.
+    """
+    st.markdown("##### Upload Before and After Recordings")
+    col1, col2 = st.columns(2)
+    with col1:
+        before_files, before = recording_set("Before, e.g. ahead of the maintenance visit", 'before_audit')
+    with col2:
+        after_files, after = recording_set("After", 'after_audit')
+
+    if st.button("Compare"):
+        st.session_state.comparison_started = True
+    if not st.session_state.get('comparison_started'):
+        return
+    sync_audit_with_progress(before, before_files or [])
+    sync_audit_with_progress(after, after_files or [])
+    if not before_files or not after_files:
+        st.write("Please upload recordings for both sides.")
+        return
+
+    # Derived tables are rebuilt only when either side or the level changes
+    comparison_key = (before.version, after.version, selected_level_name)
+    if st.session_state.get('comparison_key') != comparison_key:
+        compared = compare_heard(st.session_state.placed_index, before.heard_keys, after.heard_keys)
+        if selected_level_name != "All":
+            compared = compared[compared["Level"] == selected_level_name]
+        status_tables = []
+        for status in (NEWLY_UNHEARD, STILL_UNHEARD, NEWLY_HEARD):
+            beacons = compared[compared["Status"] == status]
+            if not beacons.empty:
+                status_tables.append((status, display_table(beacons[["Level"] + BEACON_KEY_COLUMNS].reset_index(drop=True))))
+        changed = compared[compared["Status"] != STILL_HEARD]
+        st.session_state.comparison = (
+            display_table(comparison_summary(compared)),
+            status_tables,
+            changed[["Level"] + BEACON_KEY_COLUMNS + ["Status", "Coordinates"]].to_csv(index=False),
+        )
+        st.session_state.comparison_key = comparison_key
+    summary, status_tables, comparison_csv = st.session_state.comparison
+
+    st.caption(f"{len(before.recording_ids)} recordings before, {len(after.recording_ids)} after")
+    st.dataframe(summary, hide_index=True)
+
+    for status, beacons in status_tables:
+        st.markdown(f"##### {status} ({beacons.num_rows})")
+        st.dataframe(beacons, hide_index=True)
+
+    st.download_button(
+        label="Download Comparison",
+        data=comparison_csv,
+        file_name="beacon_comparison.csv",
+        mime="text/csv"
+    )
+
 # Check if the token is set and valid
-token = st.session_state.get('token')
+token = auth.current_token()
 if not token:
     st.write("Please log in to access the list.")
 
@@ -29,8 +99,7 @@ if 'clients' not in st.session_state:
 
 clients = st.session_state.clients
 if clients:
-    client_id_name = {client["name"]: client["_id"] for client in clients}
-    client_names = sorted(client_id_name.keys())
+    client_id_name, client_names = name_index(clients)
     
     # Create columns for dropdowns
     col1, col2, col3 = st.columns(3)
@@ -48,8 +117,7 @@ if clients:
     
     sites = st.session_state.sites
     if sites:
-        site_id_name = {site["name"]: site["_id"] for site in sites}
-        site_names = sorted(site_id_name.keys())
+        site_id_name, site_names = name_index(sites)
         
         # Dropdown for sites
         with col2:
@@ -64,83 +132,87 @@ if clients:
         
         buildings = st.session_state.buildings
         if buildings:
-            building_id_name = {building["name"]: building["_id"] for building in buildings}
-            building_names = sorted(building_id_name.keys())
+            building_id_name, building_names = name_index(buildings)
             
             # Dropdown for buildings
             with col3:
                 selected_building_name = st.selectbox("Select Building", building_names, key='client_selectbox_building')
                 selected_building_id = building_id_name[selected_building_name]
             
+            # Fetch every building's levels in the background so switching buildings is served from memory
+            prefetch_site(buildings, token, first_building_id=selected_building_id)
+
             # Fetch or cache levels
             if 'levels' not in st.session_state or st.session_state.selected_building_id != selected_building_id:
                 with st.spinner("Loading levels..."):
                     st.session_state.selected_building_id = selected_building_id
-                    st.session_state.levels = fetch_levels(selected_building_id, token)
+                    st.session_state.levels = get_levels(selected_building_id, token)
             
             levels = st.session_state.levels
             if levels:
-                level_id_name = {level["shortName"]: level["_id"] for level in levels}
-                level_names = sorted(level_id_name.keys())
-                level_names.insert(0, "All")
+                # Index every level's placed beacons once per building, not per button press
+                if st.session_state.get('placed_index_building_id') != selected_building_id:
+                    st.session_state.placed_index = index_placed_beacons(
+                        (level["shortName"], level.get("placedBeacons", [])) for level in levels
+                    )
+                    st.session_state.placed_index_building_id = selected_building_id
+
+                _, level_short_names = name_index(levels, "{shortName}")
+                level_names = ["All"] + level_short_names
                 
                 # Dropdown for levels
                 selected_level_name = st.selectbox("Select Level", level_names, key='client_selectbox_level')
                 
-                # Upload recordings
-                st.markdown("##### Upload Recordings")
-                uploaded_files = st.file_uploader("Choose Multiple JSON Recordings if you have:", type="json", accept_multiple_files=True)
+                weak_threshold = st.sidebar.number_input(
+                    "Flag heard beacons with a mean RSSI below (dBm)",
+                    max_value=0, value=WEAK_RSSI_THRESHOLD, step=1, key='weak_rssi_threshold'
+                )
+
+                # Before/after comparison of two recording sets, e.g. around a maintenance visit
+                if st.toggle("Compare a before and an after recording set", key='compare_mode'):
+                    comparison_view(selected_level_name)
+                else:
+                    # Upload recordings
+                    st.markdown("##### Upload Recordings")
+                    uploaded_files = st.file_uploader("Choose Multiple Recordings (JSON or converted .opsrec) if you have:", type=RECORDING_FILE_TYPES, accept_multiple_files=True)
                 
-                # Start Analyze button
-                if st.button("Unheard List"):
-                    if uploaded_files:
-                        # Create a set of beacon identifiers from uploaded files
-                        uploaded_beacons_set = set(
-                            (beacon["uuid"], beacon["major"], beacon["minor"])
-                            for uploaded_file in uploaded_files
-                            for beacon in extract_beacons_from_json(json.loads(uploaded_file.read()))
-                        )
-
-                        # Store missing beacons by level in a DataFrame
-                        missing_beacons_df = pd.DataFrame(columns=["Level", "UUID", "Major", "Minor"])
-
-                        # Process selected level
-                        if selected_level_name == "All":
-                            # Check across all levels
-                            for level in levels:
-                                level_beacons_set = set(
-                                    (beacon["uuid"].upper(), int(beacon["major"]), int(beacon["minor"]))
-                                    for beacon in level.get("placedBeacons", [])
-                                )
-                                missing_beacons = level_beacons_set - uploaded_beacons_set
-                                for beacon in missing_beacons:
-                                    missing_beacons_df.loc[len(missing_beacons_df)] = {
-                                        "Level": level["shortName"],
-                                        "UUID": beacon[0],
-                                        "Major": beacon[1],
-                                        "Minor": beacon[2]
-                                    }
+                    # The audit keeps its heard set across reruns: once started, adding or removing
+                    # a recording only processes that recording
+                    if 'list_audit' not in st.session_state:
+                        st.session_state.list_audit = RunningAudit()
+                    audit = st.session_state.list_audit
+                    audit.set_placed_index(st.session_state.placed_index)
+
+                    # Start Analyze button
+                    if st.button("Unheard List"):
+                        st.session_state.list_audit_started = True
+                    if st.session_state.get('list_audit_started'):
+                        sync_audit_with_progress(audit, uploaded_files or [])
+                        if uploaded_files:
+                            st.caption(f"{len(audit.recording_ids)} recordings, {len(audit.heard_keys)} beacons heard")
+
+                            # Tables are rebuilt only when the recordings, the level or the threshold change
+                            tables_key = (audit.version, selected_level_name, weak_threshold)
+                            if st.session_state.get('list_tables_key') != tables_key:
+                                # Process selected level, or check across all levels
+                                missing_beacons_df = audit.unheard()[["Level"] + BEACON_KEY_COLUMNS]
+                                # Heard, but so faintly that the beacon is likely failing or obstructed
+                                weak_beacons_df = audit.weak(weak_threshold).drop(columns=["Key"])
+                                if selected_level_name != "All":
+                                    missing_beacons_df = missing_beacons_df[missing_beacons_df["Level"] == selected_level_name].reset_index(drop=True)
+                                    weak_beacons_df = weak_beacons_df[weak_beacons_df["Level"] == selected_level_name].reset_index(drop=True)
+                                st.session_state.list_tables = (display_table(missing_beacons_df), display_table(weak_beacons_df))
+                                st.session_state.list_tables_key = tables_key
+                            missing_beacons_df, weak_beacons_df = st.session_state.list_tables
+
+                            # Display the missing beacons DataFrame
+                            st.write(missing_beacons_df)
+
+                            if weak_beacons_df.num_rows:
+                                st.markdown(f"##### Heard but Weak (mean RSSI below {weak_threshold} dBm)")
+                                st.write(weak_beacons_df)
                         else:
-                            # Check for the specific level
-                            selected_level_id = level_id_name[selected_level_name]
-                            selected_level = next((level for level in levels if level["_id"] == selected_level_id), {})
-                            level_beacons_set = set(
-                                (beacon["uuid"].upper(), int(beacon["major"]), int(beacon["minor"]))
-                                for beacon in selected_level.get("placedBeacons", [])
-                            )
-                            missing_beacons = level_beacons_set - uploaded_beacons_set
-                            for beacon in missing_beacons:
-                                missing_beacons_df.loc[len(missing_beacons_df)] = {
-                                    "Level": selected_level_name,
-                                    "UUID": beacon[0],
-                                    "Major": beacon[1],
-                                    "Minor": beacon[2]
-                                }
-
-                        # Display the missing beacons DataFrame
-                        st.write(missing_beacons_df)
-                    else:
-                        st.write("Please upload beacon JSON files.")
+                            st.write("Please upload beacon JSON files.")
             else:
                 st.write("No levels found for the selected building.")
         else:
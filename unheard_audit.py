@@ -0,0 +1,222 @@
+# unheard_audit.py
+
+import numpy as np
+import pandas as pd
+import perf
+from recording_reader import iter_records
+from beacon_index import (
+    local_key_set_from_records,
+    merge_local_key_sets,
+    to_global_keys,
+    pack_identities,
+    contains,
+    EMPTY_KEYS,
+)
+from beacon_stats import merge_signal_stats, signal_stats_table, flag_weak, WEAK_RSSI_THRESHOLD
+
+BEACON_KEY_COLUMNS = ["UUID", "Major", "Minor"]
+UNHEARD_COLUMNS = ["Level"] + BEACON_KEY_COLUMNS + ["Coordinates"]
+
+# Status of a placed beacon between a before and an after recording set
+NEWLY_HEARD = "Newly heard"
+NEWLY_UNHEARD = "Newly unheard"
+STILL_UNHEARD = "Still unheard"
+STILL_HEARD = "Still heard"
+COMPARISON_STATUSES = [NEWLY_UNHEARD, STILL_UNHEARD, NEWLY_HEARD, STILL_HEARD]
+
+def extract_heard_key_set(file):
+    """Return the heard identities of one recording as a portable (uuid_table, keys) pair."""
+    return merge_local_key_sets(
+        local_key_set_from_records(chunk) for chunk in iter_records(file, "beaconData", columns=["uuid", "major", "minor"])
+    )
+
+def index_placed_beacons(levels):
+    """Index the placed beacons of each level once into a single table.
+
+    levels is an iterable of (level_name, placed_beacons). The result has one row per
+    distinct beacon per level with the UNHEARD_COLUMNS plus its packed Key, and can be
+    kept across button presses and shared by every audit of the same levels.
+    """
+    with perf.timed("index placed beacons") as span:
+        placed_index = _index_placed_beacons(levels)
+        span.rows = len(placed_index)
+        return placed_index
+
+def _index_placed_beacons(levels):
+    frames = []
+    for level_name, placed_beacons in levels:
+        placed = pd.DataFrame(placed_beacons, columns=["uuid", "major", "minor", "coordinates"])
+        frames.append(pd.DataFrame({
+            "Level": level_name,
+            "UUID": placed["uuid"].astype(str).str.upper(),
+            "Major": placed["major"].astype("int64"),
+            "Minor": placed["minor"].astype("int64"),
+            "Coordinates": placed["coordinates"],
+        }, columns=UNHEARD_COLUMNS))
+
+    if not frames:
+        return pd.DataFrame(columns=UNHEARD_COLUMNS + ["Key"]).astype({"Key": "int64"})
+    placed_index = pd.concat(frames, ignore_index=True)
+    placed_index["Key"] = pack_identities(placed_index["UUID"], placed_index["Major"], placed_index["Minor"])
+    return placed_index.drop_duplicates(subset=["Level", "Key"], ignore_index=True)
+
+def find_unheard(placed_index, heard_keys):
+    """Return the rows of placed_index whose beacon is not among the sorted heard keys.
+
+    The difference is a vectorized sorted-array lookup over the whole index and the
+    result table is allocated once, whatever the number of levels or unheard beacons.
+    """
+    with perf.timed("match unheard") as span:
+        heard = contains(heard_keys, placed_index["Key"].to_numpy())
+        unheard = placed_index[~heard].reset_index(drop=True)
+        span.rows = len(unheard)
+        return unheard
+
+def compare_heard(placed_index, before_keys, after_keys):
+    """Classify every placed beacon by whether a before and an after recording set heard it.
+
+    before_keys and after_keys are sorted heard-key arrays, e.g. RunningAudit.heard_keys
+    or the first result of ingest.ingest_recordings; each side is one vectorized
+    sorted-array lookup over the whole index. Returns placed_index with a categorical
+    Status column of COMPARISON_STATUSES.
+    """
+    with perf.timed("compare heard") as span:
+        keys = placed_index["Key"].to_numpy()
+        before = contains(before_keys, keys)
+        after = contains(after_keys, keys)
+        status = np.select(
+            [before & ~after, ~before & ~after, ~before & after],
+            [NEWLY_UNHEARD, STILL_UNHEARD, NEWLY_HEARD],
+            STILL_HEARD,
+        )
+        compared = placed_index.assign(Status=pd.Categorical(status, categories=COMPARISON_STATUSES))
+        span.rows = len(compared)
+        return compared
+
+def comparison_summary(compared):
+    """Per-level count of each comparison status of a compare_heard table."""
+    counts = compared.groupby(["Level", "Status"], observed=False, sort=False).size().unstack("Status", fill_value=0)
+    return counts.reindex(columns=COMPARISON_STATUSES, fill_value=0).reset_index().rename_axis(columns=None)
+
+def _count_keys(keys, counts, changed_keys, step):
+    """Add step to the counts of changed_keys in a sorted (keys, counts) multiset, dropping keys counted zero times."""
+    merged, inverse = np.unique(np.concatenate([keys, changed_keys]), return_inverse=True)
+    weights = np.concatenate([counts, np.full(len(changed_keys), step, dtype=np.int64)])
+    merged_counts = np.bincount(inverse, weights=weights, minlength=len(merged)).astype(np.int64)
+    kept = merged_counts > 0
+    return merged[kept], merged_counts[kept]
+
+
+class RunningAudit:
+    """Heard set and unheard result of a set of recordings that changes one recording at a time.
+
+    Recordings are added with their (uuid_table, partial) aggregates from
+    ingest.extract_recordings and removed by id. Each change only matches that
+    recording's keys against the placed beacons, so a survey uploading one recording at
+    a time never re-reads or re-matches the earlier ones. A count of the recordings
+    that heard each beacon keeps removals exact. The object lives in session state;
+    version changes whenever the unheard result does.
+    """
+
+    def __init__(self, placed_index=None):
+        self.version = 0
+        # recording id -> (name, error) of recordings that could not be read, so they are not retried
+        self.failed = {}
+        self._recordings = {}
+        self._keys = EMPTY_KEYS
+        self._counts = np.empty(0, dtype=np.int64)
+        self._signal = None
+        self._signal_stats = None
+        self._unheard = None
+        self._weak = {}
+        self.placed_index = None
+        self.set_placed_index(_index_placed_beacons([]) if placed_index is None else placed_index)
+
+    @property
+    def recording_ids(self):
+        return self._recordings.keys()
+
+    @property
+    def heard_keys(self):
+        """Sorted packed keys heard by at least one recording."""
+        return self._keys
+
+    @property
+    def unheard_mask(self):
+        """Boolean mask over the placed index rows of the beacons no recording heard."""
+        return ~self._heard
+
+    def recording_name(self, recording_id):
+        return self._recordings[recording_id][0]
+
+    def set_placed_index(self, placed_index):
+        """Audit another table from index_placed_beacons, e.g. after switching building or level."""
+        if placed_index is self.placed_index:
+            return
+        self.placed_index = placed_index
+        self._placed_keys = placed_index["Key"].to_numpy()
+        self._heard = contains(self._keys, self._placed_keys)
+        self._unheard = None
+        self._weak = {}
+        self.version += 1
+
+    def add(self, recording_id, name, part):
+        """Add one recording's aggregates; returns how many placed beacons it newly heard."""
+        with perf.timed("audit add", label=name) as span:
+            uuid_table, partial = part
+            keys = to_global_keys(uuid_table, partial.index.to_numpy())
+            self._recordings[recording_id] = (name, keys, part)
+            self._keys, self._counts = _count_keys(self._keys, self._counts, keys, 1)
+
+            newly_heard = ~self._heard & contains(keys, self._placed_keys)
+            self._heard |= newly_heard
+            if self._signal is not None:
+                self._signal = merge_signal_stats([self._signal, part])
+            self._changed()
+            span.rows = int(newly_heard.sum())
+            return span.rows
+
+    def remove(self, recording_id):
+        """Remove a recording; returns how many placed beacons no other recording heard."""
+        name, keys, _ = self._recordings.pop(recording_id)
+        with perf.timed("audit remove", label=name) as span:
+            self._keys, self._counts = _count_keys(self._keys, self._counts, keys, -1)
+
+            lost = keys[~contains(self._keys, keys)]
+            newly_unheard = self._heard & contains(lost, self._placed_keys)
+            self._heard &= ~newly_unheard
+            # Minimum and maximum RSSI cannot be taken back, so the kept aggregates are merged
+            # again when next needed; the recordings themselves are not re-read
+            self._signal = None
+            self._changed()
+            span.rows = int(newly_unheard.sum())
+            return span.rows
+
+    def unheard(self):
+        """Rows of the placed index not heard by any recording (see find_unheard)."""
+        if self._unheard is None:
+            with perf.timed("match unheard") as span:
+                self._unheard = self.placed_index[~self._heard].reset_index(drop=True)
+                span.rows = len(self._unheard)
+        return self._unheard
+
+    def signal_stats(self):
+        """Per-beacon signal statistics of all recordings (see beacon_stats.signal_stats_table)."""
+        if self._signal_stats is None:
+            if self._signal is None:
+                self._signal = merge_signal_stats(part for _, _, part in self._recordings.values())
+            self._signal_stats = signal_stats_table(*self._signal)
+        return self._signal_stats
+
+    def weak(self, threshold=WEAK_RSSI_THRESHOLD):
+        """Placed beacons heard only weakly (see beacon_stats.flag_weak), kept per threshold until the next change."""
+        table = self._weak.get(threshold)
+        if table is None:
+            table = self._weak[threshold] = flag_weak(self.placed_index, self.signal_stats(), threshold)
+        return table
+
+    def _changed(self):
+        self._unheard = None
+        self._signal_stats = None
+        self._weak = {}
+        self.version += 1
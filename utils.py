@@ -1,53 +1,102 @@
-import json
+import ijson
+import numpy as np
 import pandas as pd
-from collections import defaultdict
 from io import StringIO
 from datetime import datetime, timezone
-from geopy.geocoders import Nominatim
 import streamlit as st
+from recording_reader import read_recording, RECORDING_HEADER_SECTIONS, RECORDING_FILE_TYPES
+import recording_cache
+import perf
 
-def upload_file():
-    """Display the file uploader widget and return the uploaded JSON data."""
+BEACON_ID_COLUMNS = ["uuid", "major", "minor"]
+UINT16_RANGE = 65536
+
+def upload_file(sections=RECORDING_HEADER_SECTIONS, heads=None):
+    """Display the file uploader widget and stream the requested sections of the recording.
+
+    Returns (uploaded_file, data, counts) so large record sections can be streamed
+    from uploaded_file afterwards with iter_records, or (None, None, None).
+    """
     
     st.markdown("### Upload Your Recording File")
-    uploaded_file = st.file_uploader("Choose a recording", type="json")
+    uploaded_file = st.file_uploader("Choose a recording", type=RECORDING_FILE_TYPES)
    
     if uploaded_file is not None:
         try:
-            # Read and parse the JSON file
-            file_contents = uploaded_file.read()
-            data = json.loads(file_contents)
-            return data
-        except json.JSONDecodeError:
+            # Parse only the requested sections, counting the record arrays on the way;
+            # reruns and re-uploads of the same bytes are served from the recording cache
+            heads_key = tuple(sorted((heads or {}).items()))
+            data, counts = recording_cache.cached(
+                uploaded_file,
+                ("header", tuple(sections), heads_key),
+                lambda file: read_recording(file, sections=sections, heads=heads),
+            )
+            return uploaded_file, data, counts
+        except ijson.JSONError:
             st.error("The file is not a valid JSON.")
         except Exception as e:
             st.error(f"An error occurred: {e}")
     
     st.markdown('</div>', unsafe_allow_html=True)
-    return None
+    return None, None, None
 
-def group_and_sort_beacon_data(beacon_data):
-    grouped_data = defaultdict(lambda: defaultdict(set))
+def load_beacon_columns(chunks):
+    """Load uuid/major/minor of beaconData record chunks into deduplicated, sorted columns.
 
-    for entry in beacon_data:
-        try:
-            uuid = entry.get("uuid")
-            major = entry.get("major")
-            minor = entry.get("minor")
-
-            if uuid is not None and major is not None and minor is not None:
-                if minor < 0:
-                    minor += 65336
-                if major <0:
-                    major +=65336
-                grouped_data[uuid][major].add(minor)
-            else:
-                st.warning(f"Skipping invalid entry (missing key): {entry}")
+    Each chunk is reduced to its unique identities before being concatenated, so memory
+    follows the number of distinct beacons rather than the number of readings.
+    Returns (beacon_ids, invalid_count).
+    """
+    frames = []
+    invalid_count = 0
 
-        except Exception as e:
-            st.error(f"Error processing entry {entry}: {e}")
+    for chunk in chunks:
+        frame = pd.DataFrame(chunk, columns=BEACON_ID_COLUMNS)
+        major = pd.to_numeric(frame["major"], errors="coerce")
+        minor = pd.to_numeric(frame["minor"], errors="coerce")
+        valid = frame["uuid"].notna() & major.notna() & minor.notna()
+        invalid_count += int((~valid).sum())
+
+        major = major[valid].to_numpy(dtype=np.int64)
+        minor = minor[valid].to_numpy(dtype=np.int64)
+        frames.append(pd.DataFrame({
+            "uuid": frame["uuid"][valid].astype(str).to_numpy(),
+            # Recorders report values above 32767 as negative signed 16-bit integers
+            "major": np.where(major < 0, major + UINT16_RANGE, major),
+            "minor": np.where(minor < 0, minor + UINT16_RANGE, minor),
+        }).drop_duplicates())
+
+    if not frames:
+        return pd.DataFrame(columns=BEACON_ID_COLUMNS), invalid_count
 
-    return grouped_data
+    beacon_ids = pd.concat(frames, ignore_index=True).drop_duplicates()
+    beacon_ids = beacon_ids.sort_values(BEACON_ID_COLUMNS, ignore_index=True)
+    return beacon_ids, invalid_count
+
+def build_beacon_table(chunks):
+    """Return (grouped, invalid_count): the UUID / Major / Minors table of beaconData record chunks."""
+    with perf.timed("group beacon table") as span:
+        beacon_ids, invalid_count = load_beacon_columns(chunks)
+        grouped = beacon_ids.groupby(["uuid", "major"])["minor"].agg(lambda minors: ", ".join(map(str, minors)))
+        grouped = grouped.reset_index()
+        grouped.columns = ["UUID", "Major", "Minors"]
+        span.rows = len(beacon_ids)
+        return grouped, invalid_count
+
+def warn_invalid_readings(invalid_count):
+    if invalid_count:
+        st.warning(f"Skipped {invalid_count} invalid beacon readings (missing or non-numeric uuid/major/minor).")
+
+def group_and_sort_beacon_data(chunks):
+    """Group heard beacons into a UUID / Major / Minors table.
+
+    chunks is an iterable of beaconData record lists or DataFrames (see recording_reader.iter_records).
+    Invalid readings are counted and reported in a single warning. The returned table
+    is meant to be built once and shared by the on-screen view and the CSV export.
+    """
+    grouped, invalid_count = build_beacon_table(chunks)
+    warn_invalid_readings(invalid_count)
+    return grouped
 
 def create_csv_download_link(df, filename="beacon_data.csv"):
     """Create a CSV download link."""
@@ -69,19 +118,9 @@ def format_timestamp(ts):
         return datetime.fromtimestamp(ts / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
 
 def get_location_from_coordinates(lat, lon):
-    """Get a location and country name from latitude and longitude."""
-    geolocator = Nominatim(user_agent="beacon_data_viewer")
-    try:
-        location = geolocator.reverse((lat, lon), language='en', exactly_one=True)
-        if location:
-            address = location.raw.get('address', {})
-            location_name = address.get('town', address.get('city', address.get('village', 'Unknown Location')))
-            country_name = address.get('country', 'Unknown Country')
-            return f"{location_name}, {country_name}"
-        else:
-            return "Location not found"
-    except Exception as e:
-        return "Error obtaining location"
+    """Get a location and country name from latitude and longitude (cached, rate limited)."""
+    from geocoding import reverse_geocode
+    return reverse_geocode(lat, lon)
 
 
 def get_styles():
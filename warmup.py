@@ -0,0 +1,53 @@
+# warmup.py
+
+import importlib
+import logging
+import threading
+import perf
+
+# In the order pages need them: the login page needs none of these, the default page
+# (basic profiler) the recording readers, the unheard pages ingest and folium
+WARMUP_MODULES = (
+    "pandas",
+    "ijson",
+    "pyarrow",
+    "utils",
+    "recording_reader",
+    "beacon_stats",
+    "timeseries",
+    "geocoding",
+    "prefetch",
+    "ingest",
+    "unheard_audit",
+    "geometry",
+    "spatial_index",
+    "map_utils",
+    "perf_panel",
+)
+
+_started = False
+_lock = threading.Lock()
+_log = logging.getLogger(__name__)
+
+def _import_all():
+    for name in WARMUP_MODULES:
+        try:
+            # Timed per module; a failed import is counted as an error of the stage
+            with perf.timed("warmup import", label=name):
+                importlib.import_module(name)
+        except Exception:
+            # Keep warming the other modules; the page importing this one fails with the same error
+            _log.warning("Warmup could not import %s; it will be imported by the first page using it", name, exc_info=True)
+
+def start_warmup():
+    """Import the heavy modules on a background thread, once per server process.
+
+    Called from the entry script, so while a user is still on the login page the
+    imports of the first pages are already done when they get there.
+    """
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_import_all, name="warmup", daemon=True).start()